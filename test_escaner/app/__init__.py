@@ -1,3 +1,4 @@
+import multiprocessing
 import time
 from datetime import datetime
 
@@ -8,46 +9,77 @@ from flask_cors import CORS
 db = SQLAlchemy()
 
 
-def _ensure_sqlite_columns(app):
-    try:
-        import sqlite3
-        from flask import current_app
-
-        db_uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
-        if not db_uri.startswith("sqlite:///"):
-            return
-        db_file = db_uri.replace("sqlite:///", "", 1)
-        if not os.path.isabs(db_file):
-            db_path = os.path.join(app.instance_path, os.path.basename(db_file))
-        else:
-            db_path = db_file
-
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-
-        def has_col(table, col):
-            cur.execute(f"PRAGMA table_info({table})")
-            cols = [r[1] for r in cur.fetchall()]
-            return col in cols
-
-        table = "dispositivo_escaneo"
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
-        if cur.fetchone():
-            for col, ddl in [
-                ("consumo_upload_mb", "ALTER TABLE dispositivo_escaneo ADD COLUMN consumo_upload_mb REAL DEFAULT 0.0"),
-                ("consumo_download_mb", "ALTER TABLE dispositivo_escaneo ADD COLUMN consumo_download_mb REAL DEFAULT 0.0"),
-                ("consumo_total_mb", "ALTER TABLE dispositivo_escaneo ADD COLUMN consumo_total_mb REAL DEFAULT 0.0"),
-            ]:
-                if not has_col(table, col):
-                    cur.execute(ddl)
-                    conn.commit()
-
-        conn.close()
-    except Exception:
-        pass
-
-
-def create_app():
+def _pragmas_sqlite(app):
+    busy_ms = int(app.config.get("DB_BUSY_TIMEOUT_MS", 5000))
+    mmap = int(app.config.get("SQLITE_MMAP_SIZE", 0))
+
+    def _al_conectar(conexion, _registro):
+        cur = conexion.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute(f"PRAGMA busy_timeout={busy_ms}")
+        if mmap > 0:
+            cur.execute(f"PRAGMA mmap_size={mmap}")
+        cur.close()
+
+    return _al_conectar
+
+
+def _opciones_motor(app) -> dict:
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    opciones = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+
+    if uri.startswith("sqlite"):
+        connect_args = opciones.setdefault("connect_args", {})
+        connect_args.setdefault("timeout", int(app.config.get("DB_BUSY_TIMEOUT_MS", 5000)) / 1000.0)
+        connect_args.setdefault("check_same_thread", False)
+        return opciones
+
+    opciones.setdefault("pool_size", int(app.config.get("DB_POOL_SIZE", 5)))
+    opciones.setdefault("max_overflow", int(app.config.get("DB_MAX_OVERFLOW", 10)))
+    opciones.setdefault("pool_timeout", float(app.config.get("DB_POOL_TIMEOUT", 30)))
+    opciones.setdefault("pool_recycle", int(app.config.get("DB_POOL_RECYCLE", 1800)))
+    opciones.setdefault("pool_pre_ping", True)
+    return opciones
+
+
+def _migrar_esquema():
+    # Añade las columnas del modelo que falten en tablas ya existentes (create_all no altera tablas).
+    from sqlalchemy import inspect, literal
+
+    motor = db.engine
+    inspector = inspect(motor)
+    tablas_existentes = set(inspector.get_table_names())
+
+    with motor.begin() as conn:
+        for tabla in db.metadata.sorted_tables:
+            if tabla.name not in tablas_existentes:
+                continue
+            actuales = {c["name"] for c in inspector.get_columns(tabla.name)}
+            for columna in tabla.columns:
+                if columna.name in actuales:
+                    continue
+
+                ddl = f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {columna.type.compile(dialect=motor.dialect)}"
+                default = getattr(columna.default, "arg", None)
+                if default is not None and not callable(default):
+                    valor = literal(default, columna.type).compile(dialect=motor.dialect, compile_kwargs={"literal_binds": True})
+                    ddl += f" DEFAULT {valor}"
+                elif not columna.nullable:
+                    print(f"[WARN] No se puede añadir {tabla.name}.{columna.name}: NOT NULL sin valor por defecto")
+                    continue
+
+                conn.exec_driver_sql(ddl)
+                print(f"[INFO] Migración: columna {tabla.name}.{columna.name} añadida")
+
+            indices = {i["name"] for i in inspector.get_indexes(tabla.name)}
+            for indice in tabla.indexes:
+                if indice.name not in indices:
+                    indice.create(conn)
+                    print(f"[INFO] Migración: índice {indice.name} creado")
+
+
+def create_app(servicios: bool = True):
     app = Flask(__name__)
     CORS(app)
 
@@ -55,6 +87,34 @@ def create_app():
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///iot_monitor.db"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["JSON_AS_ASCII"] = False
+    # El analizador abre un sniffer promiscuo (requiere root): solo arranca si se activa expresamente.
+    app.config["TRAFFIC_ANALYZER_ENABLED"] = False
+    app.config["SCAN_INCREMENTAL_TTL_HORAS"] = 24
+    app.config["SCAN_PROGRAMADO_ACTIVO"] = False
+    app.config["SCAN_INCREMENTAL_INTERVALO_MIN"] = 15
+    app.config["SCAN_COMPLETO_INTERVALO_MIN"] = 360
+    app.config["SCAN_JITTER"] = 0.1
+    app.config["SCAN_LOTE_PERSISTENCIA"] = 500
+    app.config["SCAN_REDES"] = None
+    app.config["SCAN_INTERFACES"] = None
+    app.config["SCAN_TASA_PPS"] = 200
+    app.config["SCAN_TAM_SHARD"] = 1024
+    app.config["SCAN_MAX_HOSTS_RED"] = 65536
+    # Barrido en un pool de procesos (0 = uno por núcleo); con 1 se hace en este proceso.
+    app.config["SCAN_PROCESOS"] = 1
+    app.config["SCAN_BLOQUEO_TTL_MIN"] = 30
+    app.config["SCAN_ARP_RAPIDO"] = True
+    app.config["DB_POOL_SIZE"] = 5
+    app.config["DB_MAX_OVERFLOW"] = 10
+    app.config["DB_POOL_TIMEOUT"] = 30
+    app.config["DB_POOL_RECYCLE"] = 1800
+    app.config["DB_BUSY_TIMEOUT_MS"] = 5000
+    app.config["SQLITE_MMAP_SIZE"] = 256 * 1024 * 1024
+    app.config["RETENCION_CRUDOS_DIAS"] = 30
+    app.config["RETENCION_HORARIOS_DIAS"] = 180
+    app.config["RETENCION_DIARIOS_DIAS"] = 0
+    app.config.from_prefixed_env("IOT_MONITOR")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = _opciones_motor(app)
 
     db.init_app(app)
 
@@ -67,8 +127,29 @@ def create_app():
 
     
     with app.app_context():
+        if db.engine.dialect.name == "sqlite":
+            from sqlalchemy import event
+            event.listen(db.engine, "connect", _pragmas_sqlite(app))
         db.create_all()
-        _ensure_sqlite_columns(app)
-
+        _migrar_esquema()
+        from .sync import sembrar_contador_versiones
+        sembrar_contador_versiones()
+
+    # Los procesos del pool de escaneo no arrancan servicios propios si algo los lleva a crear la app.
+    if not servicios or multiprocessing.parent_process() is not None:
+        return app
+
+    if app.config.get("TRAFFIC_ANALYZER_ENABLED"):
+        from .traffic_analyzer import iniciar_analizador
+        iniciar_analizador(
+            red_cidr=app.config.get("SCAN_REDES"),
+            interfaces=app.config.get("SCAN_INTERFACES"),
+            en_segundo_plano=True,
+        )
+
+    if app.config.get("SCAN_PROGRAMADO_ACTIVO"):
+        from .routes import ejecutar_scan
+        from .scheduler import iniciar_programador
+        iniciar_programador(app, ejecutar_scan)
 
     return app
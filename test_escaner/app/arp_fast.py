@@ -0,0 +1,131 @@
+import select
+import socket
+import struct
+import sys
+import time
+
+from .objetivos import ControlTasa
+
+ETH_P_ARP = 0x0806
+SIOCGIFADDR = 0x8915
+
+# Ethernet (14 bytes) + ARP IPv4 (28 bytes). Solo cambia la IP destino, en el offset 38.
+_TRAMA = struct.Struct("!6s6sH HHBBH 6s4s6s4s")
+_OFFSET_TPA = 38
+_LOTE_ENVIO = 64
+
+
+_desactivado = None
+
+
+def disponible() -> bool:
+    return _desactivado is None and sys.platform.startswith("linux") and hasattr(socket, "AF_PACKET")
+
+
+def desactivar(motivo) -> None:
+    # Sin CAP_NET_RAW no tiene sentido reintentarlo en cada shard.
+    global _desactivado
+    if _desactivado is None:
+        print(f"[WARN] Motor ARP rápido desactivado ({motivo}); se usa scapy")
+    _desactivado = motivo
+
+
+def interfaz_por_defecto():
+    # Interfaz de la ruta por defecto según /proc/net/route.
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for linea in f:
+                campos = linea.split()
+                if len(campos) > 7 and campos[1] == "00000000" and campos[7] == "00000000":
+                    return campos[0]
+    except OSError:
+        pass
+    return None
+
+
+def _mac_interfaz(iface: str) -> bytes:
+    with open(f"/sys/class/net/{iface}/address") as f:
+        return bytes.fromhex(f.read().strip().replace(":", ""))
+
+
+def _ip_interfaz(iface: str) -> bytes:
+    import fcntl
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        datos = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack("256s", iface.encode()[:15]))
+    return datos[20:24]
+
+
+class MotorArp:
+    def __init__(self, iface=None):
+        self.iface = iface or interfaz_por_defecto()
+        if not self.iface:
+            raise OSError("no se encontró una interfaz para ARP")
+
+        mac = _mac_interfaz(self.iface)
+        ip = _ip_interfaz(self.iface)
+        self.plantilla = bytearray(_TRAMA.pack(
+            b"\xff" * 6, mac, ETH_P_ARP,
+            1, 0x0800, 6, 4, 1,
+            mac, ip, b"\x00" * 6, b"\x00" * 4,
+        ))
+
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        self.sock.bind((self.iface, ETH_P_ARP))
+        self.sock.setblocking(False)
+
+    def cerrar(self) -> None:
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        self.cerrar()
+
+    def _recoger(self, pendientes: set, respuestas: dict, espera: float) -> None:
+        fin = time.monotonic() + espera
+        while True:
+            try:
+                trama = self.sock.recv(128)
+            except BlockingIOError:
+                restante = fin - time.monotonic()
+                if restante <= 0 or not pendientes:
+                    return
+                select.select([self.sock], [], [], restante)
+                continue
+            if len(trama) < _TRAMA.size:
+                continue
+            _dst, _src, tipo, _ht, _pt, _hl, _pl, op, sha, spa, _tha, _tpa = _TRAMA.unpack_from(trama)
+            if tipo != ETH_P_ARP or op != 2 or spa not in pendientes:
+                continue
+            pendientes.discard(spa)
+            respuestas[socket.inet_ntoa(spa)] = sha.hex(":")
+
+    def barrer(self, ips, tasa=None, timeout: float = 1.0) -> dict:
+        control = ControlTasa(tasa, rafaga=_LOTE_ENVIO)
+        trama = self.plantilla
+        pendientes = set()
+        respuestas = {}
+
+        for n, ip in enumerate(ips, start=1):
+            destino = socket.inet_aton(str(ip))
+            pendientes.add(destino)
+            trama[_OFFSET_TPA:_OFFSET_TPA + 4] = destino
+            control.esperar()
+            try:
+                self.sock.send(trama)
+            except BlockingIOError:
+                select.select([], [self.sock], [], 0.05)
+                self.sock.send(trama)
+            if n % _LOTE_ENVIO == 0:
+                self._recoger(pendientes, respuestas, 0)
+
+        self._recoger(pendientes, respuestas, timeout)
+        return respuestas
+
+
+def barrer(ips, iface=None, tasa=None, timeout: float = 1.0) -> dict:
+    with MotorArp(iface) as motor:
+        return motor.barrer(ips, tasa=tasa, timeout=timeout)
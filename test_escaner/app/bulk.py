@@ -0,0 +1,78 @@
+from itertools import islice
+
+from sqlalchemy import and_, bindparam, select
+
+from . import db
+
+TAM_LOTE_DEFAULT = 500
+
+
+def trozos(filas, tam: int = TAM_LOTE_DEFAULT):
+    it = iter(filas)
+    while True:
+        bloque = list(islice(it, tam))
+        if not bloque:
+            return
+        yield bloque
+
+
+def _dialecto() -> str:
+    return db.session.get_bind().dialect.name
+
+
+def _insert_on_conflict(dialecto: str):
+    if dialecto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialecto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+
+def insertar(tabla, filas, tam: int = TAM_LOTE_DEFAULT) -> int:
+    total = 0
+    for bloque in trozos(filas, tam):
+        db.session.execute(tabla.insert(), bloque)
+        total += len(bloque)
+    return total
+
+
+def upsert(tabla, filas, claves, tam: int = TAM_LOTE_DEFAULT) -> int:
+    filas = list(filas)
+    if not filas:
+        return 0
+
+    columnas = [c for c in filas[0] if c not in claves]
+    insert = _insert_on_conflict(_dialecto())
+
+    if insert is not None:
+        for bloque in trozos(filas, tam):
+            stmt = insert(tabla)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[tabla.c[c] for c in claves],
+                set_={c: stmt.excluded[c] for c in columnas},
+            )
+            db.session.execute(stmt, bloque)
+        return len(filas)
+
+    for bloque in trozos(filas, tam):
+        condicion = and_(*(tabla.c[c].in_({f[c] for f in bloque}) for c in claves))
+        existentes = {
+            tuple(row) for row in db.session.execute(select(*(tabla.c[c] for c in claves)).where(condicion))
+        }
+        nuevas = [f for f in bloque if tuple(f[c] for c in claves) not in existentes]
+        actualizadas = [
+            {**{f"_k_{c}": f[c] for c in claves}, **{c: f[c] for c in columnas}}
+            for f in bloque if tuple(f[c] for c in claves) in existentes
+        ]
+        if actualizadas and columnas:
+            stmt = (
+                tabla.update()
+                .where(and_(*(tabla.c[c] == bindparam(f"_k_{c}") for c in claves)))
+                .values({c: bindparam(c) for c in columnas})
+            )
+            db.session.execute(stmt, actualizadas)
+        if nuevas:
+            db.session.execute(tabla.insert(), nuevas)
+    return len(filas)
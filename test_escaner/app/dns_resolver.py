@@ -0,0 +1,115 @@
+import math
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CacheTTL:
+    def __init__(self, max_entradas: int = 4096, ttl: float = 3600.0, ttl_negativo: float = 300.0):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._datos: "OrderedDict[str, tuple[float, str | None]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def get(self, clave: str) -> tuple[bool, str | None]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] < ahora:
+                if entrada is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return False, None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return True, entrada[1]
+
+    def set(self, clave: str, valor: str | None) -> None:
+        ttl = self.ttl if valor else self.ttl_negativo
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+
+class ResolverInverso:
+    def __init__(self, max_workers: int = 32, timeout: float = 1.0, cache: CacheTTL | None = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cache = cache or CacheTTL()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dns-ptr")
+        self._pendientes: dict = {}
+        self._inicios: dict = {}
+        self._lock = threading.Lock()
+
+    def _consultar(self, ip: str) -> str | None:
+        with self._lock:
+            self._inicios[ip] = time.monotonic()
+        try:
+            nombre = socket.gethostbyaddr(ip)[0]
+        except Exception:
+            nombre = None
+        self.cache.set(ip, nombre)
+        with self._lock:
+            self._pendientes.pop(ip, None)
+            self._inicios.pop(ip, None)
+        return nombre
+
+    def _esperar(self, futuros: dict) -> None:
+        # Cada consulta dispone de `timeout` desde que empieza a ejecutarse, no desde que entra en la cola. Las que
+        # siguen encoladas tras un pool lleno esperan turno con un tope de timeout × rondas para todo el lote.
+        tope = time.monotonic() + self.timeout * math.ceil(len(futuros) / self.max_workers)
+        pendientes = set(futuros)
+        while pendientes:
+            with self._lock:
+                inicios = [self._inicios.get(futuros[f]) for f in pendientes]
+            limite = tope if None in inicios else min(tope, max(inicios) + self.timeout)
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                return
+            _, pendientes = wait(pendientes, timeout=restante, return_when=FIRST_COMPLETED)
+
+    def resolver(self, ips) -> dict:
+        resultado: dict = {}
+        futuros = {}
+
+        for ip in dict.fromkeys(str(i) for i in ips if i):
+            encontrado, nombre = self.cache.get(ip)
+            if encontrado:
+                resultado[ip] = nombre
+                continue
+            with self._lock:
+                futuro = self._pendientes.get(ip)
+                if futuro is None:
+                    futuro = self._pool.submit(self._consultar, ip)
+                    self._pendientes[ip] = futuro
+            futuros[futuro] = ip
+
+        if futuros:
+            self._esperar(futuros)
+
+        for futuro, ip in futuros.items():
+            if futuro.done():
+                resultado[ip] = futuro.result()
+            else:
+                resultado[ip] = None
+                self.cache.set(ip, None)
+
+        return resultado
+
+
+resolver = ResolverInverso()
+
+
+def resolver_nombres(ips) -> dict:
+    return resolver.resolver(ips)
+
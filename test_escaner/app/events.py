@@ -0,0 +1,104 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+from . import db
+
+TAM_HISTORIAL = 256
+TAM_COLA_SUSCRIPTOR = 512
+KEEPALIVE_SEGUNDOS = 15.0
+
+
+class Suscripcion:
+    def __init__(self):
+        self.cola: queue.Queue = queue.Queue(maxsize=TAM_COLA_SUSCRIPTOR)
+        self.desbordada = False
+
+
+class BusEventos:
+    def __init__(self, tam_historial: int = TAM_HISTORIAL):
+        self._lock = threading.Lock()
+        self._suscriptores: set = set()
+        self._historial: deque = deque(maxlen=tam_historial)
+        self._ultimo_id = 0
+
+    def publicar(self, tipo: str, datos: dict) -> int:
+        with self._lock:
+            self._ultimo_id += 1
+            evento = (self._ultimo_id, tipo, datos, time.time())
+            self._historial.append(evento)
+            suscriptores = list(self._suscriptores)
+
+        for s in suscriptores:
+            try:
+                s.cola.put_nowait(evento)
+            except queue.Full:
+                # Un cliente lento no frena al resto: se le cierra el stream y reconecta con Last-Event-ID.
+                s.desbordada = True
+        return evento[0]
+
+    def suscribir(self, ultimo_id: int = None) -> Suscripcion:
+        s = Suscripcion()
+        with self._lock:
+            if ultimo_id is not None:
+                for evento in self._historial:
+                    if evento[0] > ultimo_id:
+                        s.cola.put_nowait(evento)
+            self._suscriptores.add(s)
+        return s
+
+    def cancelar(self, s: Suscripcion) -> None:
+        with self._lock:
+            self._suscriptores.discard(s)
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {"suscriptores": len(self._suscriptores), "ultimo_id": self._ultimo_id}
+
+
+bus = BusEventos()
+
+
+def publicar(tipo: str, datos: dict) -> int:
+    return bus.publicar(tipo, datos)
+
+
+def publicar_al_confirmar(tipo: str, datos: dict, sesion=None) -> None:
+    # Los eventos ligados a escrituras en BD solo salen si la transacción se confirma.
+    sesion = sesion or db.session
+    sesion.info.setdefault("eventos_pendientes", []).append((tipo, datos))
+
+
+@event.listens_for(db.session, "after_commit")
+def _emitir_pendientes(sesion):
+    for tipo, datos in sesion.info.pop("eventos_pendientes", []):
+        bus.publicar(tipo, datos)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _descartar_pendientes(sesion):
+    sesion.info.pop("eventos_pendientes", None)
+
+
+def formatear_sse(evento) -> str:
+    ident, tipo, datos, _ts = evento
+    return f"id: {ident}\nevent: {tipo}\ndata: {json.dumps(datos, ensure_ascii=False, default=str)}\n\n"
+
+
+def stream_sse(ultimo_id: int = None):
+    s = bus.suscribir(ultimo_id)
+    try:
+        yield "retry: 3000\n\n"
+        while not s.desbordada:
+            try:
+                evento = s.cola.get(timeout=KEEPALIVE_SEGUNDOS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield formatear_sse(evento)
+    finally:
+        bus.cancelar(s)
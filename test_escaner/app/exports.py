@@ -0,0 +1,253 @@
+import csv
+import io
+import json
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+from . import db
+from .models import Dispositivo, DispositivoEscaneo, Escaneo
+from .oui_lookup import vendor_from_mac
+
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+TAM_LOTE_LECTURA = 1000
+TAM_BLOQUE_SALIDA = 64 * 1024
+
+
+def _fecha(valor):
+    return valor.strftime("%d-%m-%Y %H:%M") if valor else ""
+
+
+def _filas_dispositivos():
+    consulta = select(
+        Dispositivo.ip, Dispositivo.mac, Dispositivo.fabricante, Dispositivo.nombre, Dispositivo.tipo,
+        Dispositivo.riesgo, Dispositivo.estado, Dispositivo.fecha_ultima_visto,
+    ).order_by(Dispositivo.id)
+    for d in db.session.execute(consulta.execution_options(yield_per=TAM_LOTE_LECTURA)):
+        yield (
+            d.ip,
+            d.mac or "No registrada",
+            d.fabricante or vendor_from_mac(d.mac) or "Desconocido",
+            d.nombre or "Desconocido",
+            d.tipo or "Desconocido",
+            d.riesgo or "Desconocido",
+            d.estado or "desconocido",
+            _fecha(d.fecha_ultima_visto),
+        )
+
+
+def _filas_escaneos():
+    consulta = select(
+        Escaneo.id, Escaneo.fecha, Escaneo.tipo, Escaneo.total_dispositivos,
+        Escaneo.dispositivos_vulnerables, Escaneo.duracion_segundos,
+    ).order_by(Escaneo.fecha)
+    for e in db.session.execute(consulta.execution_options(yield_per=TAM_LOTE_LECTURA)):
+        yield (e.id, _fecha(e.fecha), e.tipo or "completo", e.total_dispositivos, e.dispositivos_vulnerables,
+               e.duracion_segundos)
+
+
+def _filas_historial(dispositivo_id=None):
+    h = DispositivoEscaneo
+    consulta = (
+        select(
+            Dispositivo.ip, h.fecha, h.estado, h.riesgo, h.actividad_score, h.rtt_ms, h.packet_loss,
+            h.puertos_abiertos, h.consumo_upload_mb, h.consumo_download_mb, h.consumo_total_mb, h.sondeo_completo,
+        )
+        .join(Dispositivo, Dispositivo.id == h.dispositivo_id)
+        .order_by(h.dispositivo_id, h.fecha)
+    )
+    if dispositivo_id is not None:
+        consulta = consulta.where(h.dispositivo_id == dispositivo_id)
+    for r in db.session.execute(consulta.execution_options(yield_per=TAM_LOTE_LECTURA)):
+        yield (r.ip, _fecha(r.fecha), r.estado, r.riesgo, r.actividad_score, r.rtt_ms, r.packet_loss,
+               r.puertos_abiertos, r.consumo_upload_mb, r.consumo_download_mb, r.consumo_total_mb,
+               bool(r.sondeo_completo))
+
+
+CONJUNTOS = {
+    "dispositivos": (
+        "Dispositivos NetGuard",
+        ("Dirección IP", "Dirección MAC", "Fabricante", "Hostname", "Tipo", "Riesgo", "Estado", "Último escaneo"),
+        _filas_dispositivos,
+    ),
+    "escaneos": (
+        "Escaneos",
+        ("ID", "Fecha", "Tipo", "Total dispositivos", "Vulnerables", "Duración (s)"),
+        _filas_escaneos,
+    ),
+    "historial": (
+        "Historial",
+        ("Dirección IP", "Fecha", "Estado", "Riesgo", "Actividad", "RTT (ms)", "Pérdida (%)", "Puertos abiertos",
+         "Subida (MB)", "Bajada (MB)", "Total (MB)", "Sondeo completo"),
+        _filas_historial,
+    ),
+}
+
+
+def _agrupar(partes):
+    # Junta fragmentos pequeños en bloques de ~64 KiB para no emitir un chunk HTTP por fila.
+    buffer, tam = [], 0
+    for parte in partes:
+        buffer.append(parte)
+        tam += len(parte)
+        if tam >= TAM_BLOQUE_SALIDA:
+            yield b"".join(buffer)
+            buffer, tam = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def stream_csv(cabecera, filas):
+    def partes():
+        salida = io.StringIO()
+        escritor = csv.writer(salida)
+        yield "\ufeff".encode("utf-8")  # BOM para que Excel detecte UTF-8
+        escritor.writerow(cabecera)
+        for fila in filas:
+            escritor.writerow(fila)
+            if salida.tell() >= TAM_BLOQUE_SALIDA:
+                yield salida.getvalue().encode("utf-8")
+                salida.seek(0)
+                salida.truncate()
+        yield salida.getvalue().encode("utf-8")
+
+    return _agrupar(partes())
+
+
+def stream_jsonl(cabecera, filas):
+    return _agrupar(
+        (json.dumps(dict(zip(cabecera, fila)), ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        for fila in filas
+    )
+
+
+_XML_INVALIDO = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _columna(i: int) -> str:
+    letras = ""
+    i += 1
+    while i:
+        i, resto = divmod(i - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def _celda(ref: str, valor) -> str:
+    if valor is None or valor == "":
+        return ""
+    if isinstance(valor, bool):
+        return f'<c r="{ref}" t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f'<c r="{ref}"><v>{valor}</v></c>'
+    if isinstance(valor, datetime):
+        valor = _fecha(valor)
+    texto = escape(_XML_INVALIDO.sub("", str(valor)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+_XLSX_ESTATICOS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+class _Sumidero:
+    # Objeto tipo archivo sin seek: zipfile escribe con descriptores de datos y aquí se recogen los bytes.
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self.partes)
+        self.partes = []
+        return datos
+
+
+def stream_xlsx(cabecera, filas, hoja: str = "Hoja1"):
+    sumidero = _Sumidero()
+    with zipfile.ZipFile(sumidero, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, contenido in _XLSX_ESTATICOS.items():
+            zf.writestr(nombre, contenido)
+        zf.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(hoja[:31])}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+        yield sumidero.vaciar()
+
+        columnas = [_columna(i) for i in range(len(cabecera))]
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as hoja_xml:
+            hoja_xml.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            pendiente = []
+            for n, fila in enumerate(_con_cabecera(cabecera, filas), start=1):
+                celdas = "".join(_celda(f"{c}{n}", v) for c, v in zip(columnas, fila))
+                pendiente.append(f'<row r="{n}">{celdas}</row>')
+                if len(pendiente) >= 500:
+                    hoja_xml.write("".join(pendiente).encode("utf-8"))
+                    pendiente = []
+                    datos = sumidero.vaciar()
+                    if datos:
+                        yield datos
+            hoja_xml.write("".join(pendiente).encode("utf-8"))
+            hoja_xml.write(b"</sheetData></worksheet>")
+    yield sumidero.vaciar()
+
+
+def _con_cabecera(cabecera, filas):
+    yield cabecera
+    yield from filas
+
+
+def exportar(conjunto: str, formato: str, **filtros):
+    hoja, cabecera, fuente = CONJUNTOS[conjunto]
+    filas = fuente(**filtros)
+    if formato == "csv":
+        return stream_csv(cabecera, filas)
+    if formato == "jsonl":
+        return stream_jsonl(cabecera, filas)
+    return stream_xlsx(cabecera, filas, hoja=hoja)
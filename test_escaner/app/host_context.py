@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import Counter
+
+FRESCURA_DEFAULT = 300.0
+
+
+class Host:
+    __slots__ = ("mac", "nombre", "rtt_ms", "puertos", "marcas")
+
+    def __init__(self):
+        self.mac = None
+        self.nombre = None
+        self.rtt_ms = None
+        self.puertos = {}   # puerto -> abierto
+        self.marcas = {}    # campo -> instante (monotonic) en que se supo
+
+
+class ContextoEscaneo:
+    # Tabla de hosts compartida por las etapas de un escaneo: lo que una etapa averigua no lo vuelve a sondear otra.
+    def __init__(self, frescura: float = FRESCURA_DEFAULT):
+        self.frescura = frescura
+        self._hosts: dict = {}
+        self._lock = threading.Lock()
+        self.sondeados = Counter()
+        self.evitados = Counter()
+
+    def __len__(self) -> int:
+        return len(self._hosts)
+
+    def registrar(self, campo: str, valores: dict) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            for ip, valor in valores.items():
+                h = self._hosts.get(ip)
+                if h is None:
+                    h = self._hosts[ip] = Host()
+                if campo == "puertos":
+                    h.puertos.update(valor)
+                else:
+                    setattr(h, campo, valor)
+                h.marcas[campo] = ahora
+
+    def conocidos(self, ips, campo: str, sondeo: str, puertos=None):
+        # Devuelve (valores ya sabidos y frescos, IPs que hay que sondear) y lleva la cuenta de lo evitado.
+        ahora = time.monotonic()
+        sabidos, pendientes = {}, []
+        with self._lock:
+            for ip in ips:
+                h = self._hosts.get(ip)
+                marca = h.marcas.get(campo) if h is not None else None
+                if marca is None or ahora - marca > self.frescura:
+                    pendientes.append(ip)
+                elif campo == "puertos":
+                    if all(p in h.puertos for p in puertos):
+                        sabidos[ip] = [p for p in puertos if h.puertos[p]]
+                    else:
+                        pendientes.append(ip)
+                else:
+                    sabidos[ip] = getattr(h, campo)
+            self.evitados[sondeo] += len(sabidos)
+            self.sondeados[sondeo] += len(pendientes)
+        return sabidos, pendientes
+
+    def resumen(self) -> dict:
+        with self._lock:
+            return {
+                "hosts": len(self._hosts),
+                "sondeados": dict(self.sondeados),
+                "evitados": dict(self.evitados),
+                "evitados_total": sum(self.evitados.values()),
+            }
@@ -16,6 +16,14 @@ class Dispositivo(db.Model):
     ultimo_escaneo = synonym("fecha_ultima_visto")
 
     estado = db.Column(db.String(20), default="activo")
+    fabricante = db.Column(db.String(100), nullable=True)
+    version = db.Column(db.Integer, default=0, index=True)
+
+    __table_args__ = (
+        db.Index("ix_dispositivo_visto_id", "fecha_ultima_visto", "id"),
+        db.Index("ix_dispositivo_estado", "estado"),
+        db.Index("ix_dispositivo_mac", "mac"),
+    )
 
     def __repr__(self):
         return f"<Dispositivo {self.ip} ({self.mac})>"
@@ -32,12 +40,19 @@ class EstadoDispositivoLog(db.Model):
 
     dispositivo = db.relationship("Dispositivo", backref=db.backref("historial_estados", lazy=True))
 
+    __table_args__ = (
+        db.Index("ix_estado_log_dispositivo_fecha", "dispositivo_id", "fecha_cambio"),
+    )
+
 class Escaneo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     fecha = db.Column(db.DateTime, default=datetime.utcnow)
     total_dispositivos = db.Column(db.Integer, default=0)
     dispositivos_vulnerables = db.Column(db.Integer, default=0)
     duracion_segundos = db.Column(db.Float, nullable=True)
+    tipo = db.Column(db.String(20), default="completo")
+    estado = db.Column(db.String(20), default="completado")  # completado, cancelado o error
+    version = db.Column(db.Integer, default=0, index=True)
 
     def __repr__(self):
         return (
@@ -77,11 +92,79 @@ class DispositivoEscaneo(db.Model):
     packet_loss = db.Column(db.Float, nullable=True)
 
     puertos_abiertos = db.Column(db.Integer, default=0)
+    sondeo_completo = db.Column(db.Boolean, default=True)
 
     estado = db.Column(db.String(20), default="desconocido")
     riesgo = db.Column(db.String(20), default="Desconocido")
 
     dispositivo = db.relationship("Dispositivo", backref=db.backref("escaneos_dispositivo", lazy=True))
 
+    __table_args__ = (
+        db.Index("ix_dispositivo_escaneo_dispositivo_fecha", "dispositivo_id", "fecha"),
+        db.Index("ix_dispositivo_escaneo_fecha", "fecha"),
+    )
+
     def __repr__(self):
         return f"<DispositivoEscaneo {self.dispositivo_id} {self.fecha} act={getattr(self,"actividad_score",None)} puertos={self.puertos_abiertos}>"
+
+
+class DispositivoEscaneoResumen(db.Model):
+    __tablename__ = "dispositivo_escaneo_resumen"
+
+    id = db.Column(db.Integer, primary_key=True)
+    dispositivo_id = db.Column(db.Integer, db.ForeignKey("dispositivo.id"), nullable=False)
+    granularidad = db.Column(db.String(10), nullable=False)  # "hora" | "dia"
+    periodo = db.Column(db.DateTime, nullable=False)
+    muestras = db.Column(db.Integer, default=0)
+
+    actividad_min = db.Column(db.Float, nullable=True)
+    actividad_avg = db.Column(db.Float, nullable=True)
+    actividad_max = db.Column(db.Float, nullable=True)
+    rtt_min = db.Column(db.Float, nullable=True)
+    rtt_avg = db.Column(db.Float, nullable=True)
+    rtt_max = db.Column(db.Float, nullable=True)
+    loss_min = db.Column(db.Float, nullable=True)
+    loss_avg = db.Column(db.Float, nullable=True)
+    loss_max = db.Column(db.Float, nullable=True)
+
+    consumo_upload_mb = db.Column(db.Float, default=0.0)
+    consumo_download_mb = db.Column(db.Float, default=0.0)
+    consumo_total_mb = db.Column(db.Float, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint("dispositivo_id", "granularidad", "periodo", name="uq_resumen_dispositivo_periodo"),
+    )
+
+    def __repr__(self):
+        return f"<DispositivoEscaneoResumen {self.dispositivo_id} {self.granularidad} {self.periodo}>"
+
+
+class ContadorVersion(db.Model):
+    __tablename__ = "contador_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DispositivoEliminado(db.Model):
+    __tablename__ = "dispositivo_eliminado"
+
+    id = db.Column(db.Integer, primary_key=True)
+    dispositivo_id = db.Column(db.Integer, nullable=False)
+    ip = db.Column(db.String(50))
+    version = db.Column(db.Integer, nullable=False, index=True)
+    fecha = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DispositivoEliminado {self.dispositivo_id} v{self.version}>"
+
+
+class BloqueoEscaneo(db.Model):
+    __tablename__ = "bloqueo_escaneo"
+
+    id = db.Column(db.Integer, primary_key=True)
+    propietario = db.Column(db.String(64))
+    expira = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"<BloqueoEscaneo {self.propietario} hasta {self.expira}>"
@@ -0,0 +1,219 @@
+import ipaddress
+import itertools
+import socket
+import threading
+import time
+
+TAM_SHARD_DEFAULT = 1024
+MAX_HOSTS_SEGMENTO = 1 << 16
+
+_EXCLUIDAS = tuple(ipaddress.ip_network(r) for r in ("127.0.0.0/8", "169.254.0.0/16", "224.0.0.0/4"))
+
+
+def _ntoa(n: int) -> str:
+    return socket.inet_ntoa(n.to_bytes(4, "big"))
+
+
+class Segmento:
+    __slots__ = ("red", "iface", "primero", "ultimo")
+
+    def __init__(self, red, iface=None, max_hosts=MAX_HOSTS_SEGMENTO):
+        self.red = ipaddress.IPv4Network(red, strict=False)
+        self.iface = iface or None
+
+        base = int(self.red.network_address)
+        if self.red.prefixlen >= 31:
+            self.primero, self.ultimo = base, base + self.red.num_addresses - 1
+        else:
+            self.primero, self.ultimo = base + 1, base + self.red.num_addresses - 2
+
+        if max_hosts and len(self) > max_hosts:
+            print(f"[WARN] La red {self.red} tiene {len(self)} hosts; se limitan a los primeros {max_hosts}")
+            self.ultimo = self.primero + max_hosts - 1
+
+    def __len__(self) -> int:
+        return max(0, self.ultimo - self.primero + 1)
+
+    def __str__(self) -> str:
+        return f"{self.red}@{self.iface}" if self.iface else str(self.red)
+
+    def __repr__(self) -> str:
+        return f"Segmento({self})"
+
+    def contiene(self, ip) -> bool:
+        try:
+            n = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return False
+        return self.primero <= n <= self.ultimo
+
+    def hosts(self):
+        return (_ntoa(n) for n in range(self.primero, self.ultimo + 1))
+
+    def shards(self, tam: int = TAM_SHARD_DEFAULT):
+        # Alineados a múltiplos de `tam` desde la dirección de red, como subredes de la original.
+        base = int(self.red.network_address)
+        for inicio in range(base, self.ultimo + 1, tam):
+            yield Shard(self, max(inicio, self.primero), min(inicio + tam, self.ultimo + 1))
+
+
+class Shard:
+    # Rango contiguo de un segmento (o lista explícita de IPs) que se barre como una unidad.
+    __slots__ = ("segmento", "inicio", "fin", "ips")
+
+    def __init__(self, segmento=None, inicio=0, fin=0, ips=None):
+        self.segmento = segmento
+        self.inicio = inicio
+        self.fin = fin
+        self.ips = ips
+
+    @property
+    def iface(self):
+        return self.segmento.iface if self.segmento is not None else None
+
+    def __len__(self) -> int:
+        return len(self.ips) if self.ips is not None else self.fin - self.inicio
+
+    def __iter__(self):
+        if self.ips is not None:
+            return iter(self.ips)
+        return (_ntoa(n) for n in range(self.inicio, self.fin))
+
+    def __str__(self) -> str:
+        if self.ips is not None:
+            return f"{len(self.ips)} hosts"
+        return f"{_ntoa(self.inicio)}-{_ntoa(self.fin - 1)}"
+
+
+def _partir(ips, segmento, tam):
+    for i in range(0, len(ips), tam):
+        yield Shard(segmento, ips=ips[i:i + tam])
+
+
+def como_shards(objetivo, tam: int = TAM_SHARD_DEFAULT, segmentos=()):
+    # Acepta un CIDR, un Segmento, un Shard o un iterable de ellos o de IPs sueltas.
+    if isinstance(objetivo, (str, Segmento, Shard)):
+        objetivo = [objetivo]
+
+    sueltas = {}
+    for o in objetivo:
+        if isinstance(o, Shard):
+            yield o
+        elif isinstance(o, Segmento):
+            yield from o.shards(tam)
+        elif isinstance(o, str) and "/" in o:
+            yield from Segmento(o).shards(tam)
+        else:
+            ip = str(o)
+            segmento = next((s for s in segmentos if s.contiene(ip)), None)
+            sueltas.setdefault(segmento, []).append(ip)
+
+    for segmento, ips in sueltas.items():
+        yield from _partir(ips, segmento, tam)
+
+
+def intercalar(shards):
+    # Reparte el trabajo entre segmentos: el primer shard de cada uno, luego el segundo, etc.
+    grupos = {}
+    for s in shards:
+        grupos.setdefault(id(s.segmento), []).append(s)
+    return [s for ronda in itertools.zip_longest(*grupos.values()) for s in ronda if s is not None]
+
+
+def total_hosts(objetivo) -> int:
+    return sum(len(s) for s in como_shards(objetivo))
+
+
+def _parsear_lista(valor):
+    if not valor:
+        return []
+    if isinstance(valor, str):
+        return [v.strip() for v in valor.split(",") if v.strip()]
+    return list(valor)
+
+
+def detectar_redes(interfaces=None):
+    # Redes conectadas directamente según la tabla de rutas, con su prefijo real.
+    interfaces = set(_parsear_lista(interfaces))
+    segmentos = []
+    try:
+        from scapy.all import conf
+        rutas = list(conf.route.routes)
+    except Exception as e:
+        print(f"[WARN] No se pudo leer la tabla de rutas: {e}")
+        rutas = []
+
+    vistas = set()
+    for red, mascara, gateway, iface, _direccion, _metrica in rutas:
+        if gateway != "0.0.0.0" or mascara in (0, 0xFFFFFFFF):
+            continue
+        iface = getattr(iface, "name", iface)
+        if interfaces and iface not in interfaces:
+            continue
+        try:
+            cidr = ipaddress.IPv4Network((red, bin(mascara).count("1")))
+        except ValueError:
+            continue
+        if any(cidr.subnet_of(e) for e in _EXCLUIDAS) or (cidr, iface) in vistas:
+            continue
+        vistas.add((cidr, iface))
+        segmentos.append(Segmento(cidr, iface))
+    return segmentos
+
+
+def resolver_segmentos(redes=None, interfaces=None, max_hosts=MAX_HOSTS_SEGMENTO, prefijo_default=24):
+    # redes: lista de CIDR ("10.0.0.0/20" o "10.0.0.0/20@eth1") o Segmentos; sin redes se autodetectan.
+    segmentos = []
+    for r in _parsear_lista(redes):
+        if isinstance(r, Segmento):
+            segmentos.append(r)
+            continue
+        cidr, _, iface = str(r).partition("@")
+        try:
+            segmentos.append(Segmento(cidr, iface or None, max_hosts=max_hosts))
+        except ValueError as e:
+            print(f"[ERROR] Red inválida '{r}': {e}")
+    if segmentos or redes:
+        return segmentos
+
+    segmentos = detectar_redes(interfaces)
+    if segmentos:
+        return segmentos
+
+    from .scanner import obtener_ip_local
+    ip_local = obtener_ip_local()
+    if not ip_local:
+        return []
+    return [Segmento(ipaddress.ip_interface(f"{ip_local}/{prefijo_default}").network)]
+
+
+def interfaces_de(segmentos):
+    ifaces = sorted({s.iface for s in segmentos if s.iface})
+    return ifaces or None
+
+
+def filtro_bpf(segmentos) -> str:
+    redes = sorted({str(s.red) for s in segmentos})
+    return " or ".join(f"net {r}" for r in redes) if redes else "ip"
+
+
+class ControlTasa:
+    # Cubeta de tokens: permite ráfagas cortas pero mantiene la media en `tasa` envíos por segundo.
+    def __init__(self, tasa: float, rafaga: int = 32):
+        self.tasa = float(tasa or 0)
+        self.rafaga = max(1, rafaga)
+        self._tokens = float(self.rafaga)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self, n: int = 1) -> None:
+        if self.tasa <= 0:
+            return
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(self.rafaga, self._tokens + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            self._tokens -= n
+            espera = -self._tokens / self.tasa if self._tokens < 0 else 0.0
+        if espera:
+            time.sleep(espera)
@@ -0,0 +1,175 @@
+ORIGENES = ["ARP", "ICMP", "UPnP", "mDNS", "NetBIOS"]
+_BITS = {o: 1 << i for i, o in enumerate(ORIGENES)}
+
+_VACIOS = frozenset({None, "", "Desconocido"})
+_SIN_PUERTOS = frozenset()
+
+
+def bit_origen(origen: str) -> int:
+    bit = _BITS.get(origen)
+    if bit is None:
+        bit = _BITS[origen] = 1 << len(ORIGENES)
+        ORIGENES.append(origen)
+    return bit
+
+
+def clave_mac(mac):
+    if not mac:
+        return None
+    clave = mac.strip().lower().replace("-", ":").replace(".", ":")
+    return mac if clave == mac else clave
+
+
+class Observacion:
+    __slots__ = ("ip", "mac", "nombre", "tipo", "puertos", "origenes", "rtt_ms", "fabricante",
+                 "consumo_upload_mb", "consumo_download_mb", "consumo_total_mb")
+
+    def __init__(self, ip, mac=None, nombre=None, tipo=None, puertos=None, origenes=0, rtt_ms=None):
+        self.ip = ip
+        self.mac = mac or None
+        self.nombre = nombre
+        self.tipo = tipo
+        self.puertos = set(puertos) if puertos else _SIN_PUERTOS
+        self.origenes = origenes
+        self.rtt_ms = rtt_ms
+        self.fabricante = None
+        self.consumo_upload_mb = 0.0
+        self.consumo_download_mb = 0.0
+        self.consumo_total_mb = 0.0
+
+    @classmethod
+    def desde_dict(cls, d: dict) -> "Observacion":
+        return cls(
+            d.get("ip"), d.get("mac"), d.get("nombre"), d.get("tipo"), d.get("puertos"),
+            bit_origen(d.get("origen", "desconocido")), d.get("rtt_ms"),
+        )
+
+    def actualizar(self, mac=None, nombre=None, tipo=None, puertos=None, origenes=0, rtt_ms=None) -> None:
+        if mac and not self.mac:
+            self.mac = mac
+        if self.rtt_ms is None:
+            self.rtt_ms = rtt_ms
+        # Nombre y tipo: gana el primero informativo, o uno más largo (más específico) que llegue después.
+        if nombre not in _VACIOS and (self.nombre in _VACIOS or len(nombre) > len(self.nombre)):
+            self.nombre = nombre
+        if tipo not in _VACIOS and (self.tipo in _VACIOS or len(tipo) > len(self.tipo)):
+            self.tipo = tipo
+        if puertos:
+            if self.puertos is _SIN_PUERTOS:
+                self.puertos = set(puertos)
+            else:
+                self.puertos.update(puertos)
+        self.origenes |= origenes
+
+    def fundir(self, o: "Observacion") -> None:
+        self.actualizar(o.mac, o.nombre, o.tipo, o.puertos, o.origenes, o.rtt_ms)
+        if o.fabricante and not self.fabricante:
+            self.fabricante = o.fabricante
+
+    def lista_origenes(self) -> list:
+        return [nombre for nombre in ORIGENES if self.origenes & _BITS[nombre]]
+
+    def to_dict(self) -> dict:
+        d = {
+            "ip": self.ip,
+            "mac": self.mac,
+            "nombre": self.nombre or "Desconocido",
+            "tipo": self.tipo or "Desconocido",
+            "puertos": sorted(self.puertos),
+            "origenes": self.lista_origenes(),
+            "rtt_ms": self.rtt_ms,
+            "consumo_upload_mb": self.consumo_upload_mb,
+            "consumo_download_mb": self.consumo_download_mb,
+            "consumo_total_mb": self.consumo_total_mb,
+        }
+        if self.fabricante:
+            d["fabricante"] = self.fabricante
+        return d
+
+
+class MotorFusion:
+    # Un registro por dispositivo. Con por_mac la MAC es la identidad y la IP el respaldo para lo visto sin MAC
+    # (ICMP, UPnP...); así un host que cambia de IP por DHCP durante el escaneo no sale duplicado.
+    def __init__(self, por_mac: bool = True):
+        self.por_mac = por_mac
+        self._por_ip: dict = {}
+        self._por_mac: dict = {}
+        self._registros: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._registros)
+
+    def __iter__(self):
+        return iter(self._registros.values())
+
+    def ips(self) -> list:
+        return [o.ip for o in self._registros.values()]
+
+    def _ubicar(self, ip, clave):
+        # Registro al que va una observación (ip, MAC normalizada), o None si es un dispositivo nuevo.
+        por_ip = self._por_ip.get(ip)
+        if clave is None:
+            return por_ip
+        por_mac = self._por_mac.get(clave)
+        if por_mac is None:
+            # MAC nueva: solo hereda el registro de su IP si este no tenía MAC; si tenía otra, es otro equipo
+            # (reasignación DHCP, dos interfaces respondiendo en la misma IP) y va en un registro aparte.
+            if por_ip is not None and not por_ip.mac:
+                self._por_mac[clave] = por_ip
+                return por_ip
+            return None
+
+        if por_ip is None:
+            # La misma MAC en otra IP: se conserva la primera y esta queda como alias.
+            self._por_ip[ip] = por_mac
+        elif por_ip is not por_mac and not por_ip.mac:
+            # Lo visto sin MAC en esa IP era este mismo equipo: se absorbe.
+            por_mac.fundir(por_ip)
+            del self._registros[id(por_ip)]
+            self._por_ip[por_ip.ip] = por_mac
+        return por_mac
+
+    def _nuevo(self, o: Observacion, clave) -> None:
+        self._registros[id(o)] = o
+        self._por_ip[o.ip] = o
+        if clave:
+            self._por_mac[clave] = o
+
+    def agregar(self, o: Observacion) -> None:
+        if not o.ip:
+            return
+        clave = clave_mac(o.mac) if self.por_mac else None
+        destino = self._ubicar(o.ip, clave)
+        if destino is None:
+            self._nuevo(o, clave)
+        else:
+            destino.fundir(o)
+
+    def agregar_dicts(self, lista) -> None:
+        # Camino rápido para los resultados de las etapas: solo se crea un registro por dispositivo nuevo.
+        bits = {}
+        por_ip = self._por_ip
+        por_mac = self.por_mac
+        for d in lista or ():
+            ip = d.get("ip")
+            if not ip:
+                continue
+            origen = d.get("origen", "desconocido")
+            bit = bits.get(origen)
+            if bit is None:
+                bit = bits[origen] = bit_origen(origen)
+            mac = d.get("mac")
+            if mac and por_mac:
+                clave = clave_mac(mac)
+                destino = self._ubicar(ip, clave)
+            else:
+                clave = None
+                destino = por_ip.get(ip)
+            if destino is None:
+                self._nuevo(Observacion(ip, mac, d.get("nombre"), d.get("tipo"), d.get("puertos"), bit,
+                                        d.get("rtt_ms")), clave)
+            else:
+                destino.actualizar(mac, d.get("nombre"), d.get("tipo"), d.get("puertos"), bit, d.get("rtt_ms"))
+
+    def resultados(self) -> list:
+        return [o.to_dict() for o in self._registros.values()]
@@ -1,38 +1,191 @@
 import csv
 import os
-from functools import lru_cache
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+
+_HERE = os.path.dirname(__file__)
+DATA_DIRS = (os.path.join(_HERE, "data__"), os.path.join(_HERE, "data"))
+
+# Registros IEEE: prefijos MA-L (24 bits), MA-M (28 bits) y MA-S (36 bits).
+SOURCES = ("oui.csv", "mam.csv", "oui36.csv")
+PREFIX_BITS = (36, 28, 24)
+
+INDEX_FILE = "oui_index.bin"
+_MAGIC = b"OUIX1\0"
+_HEADER = struct.Struct("<6sQ3I I")
 
 
 def _normalize_mac(mac: str) -> str:
     if not mac:
         return ""
-    mac = mac.strip().upper().replace("-", ":")
+    mac = mac.strip().upper().replace("-", ":").replace(".", ":")
     mac = mac.replace(":", "")
     return mac
 
 
-@lru_cache(maxsize=1)
-def _load_oui_map() -> dict:
-    here = os.path.dirname(__file__)
-    path = os.path.join(here, "data", "oui.csv")
-    oui_map: dict[str, str] = {}
-    if not os.path.exists(path):
-        return oui_map
+def _data_dir():
+    for d in DATA_DIRS:
+        if any(os.path.exists(os.path.join(d, s)) for s in SOURCES):
+            return d
+    return None
+
+
+def _fingerprint(data_dir: str) -> int:
+    fp = 0
+    for i, name in enumerate(SOURCES):
+        path = os.path.join(data_dir, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            fp ^= (st.st_size * 1_000_003 + int(st.st_mtime)) << i
+    return fp & 0xFFFFFFFFFFFFFFFF
+
+
+class OuiIndex:
+    def __init__(self, prefixes: dict, vendor_ids: dict, vendors: list):
+        self.prefixes = prefixes      # bits -> array('Q') ordenado
+        self.vendor_ids = vendor_ids  # bits -> array('I') paralelo
+        self.vendors = vendors
 
-    with open(path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            assignment = (row.get("Assignment") or "").strip().upper()
-            org = (row.get("Organization Name") or "").strip()
-            if assignment and org:
-                oui_map[assignment] = org
+    def __len__(self):
+        return sum(len(a) for a in self.prefixes.values())
 
-    return oui_map
+    @classmethod
+    def from_csv(cls, data_dir: str) -> "OuiIndex":
+        entries = {bits: {} for bits in PREFIX_BITS}
+        vendors: list = []
+        vendor_pos: dict = {}
+
+        for name in SOURCES:
+            path = os.path.join(data_dir, name)
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    assignment = (row.get("Assignment") or "").strip().upper()
+                    org = (row.get("Organization Name") or "").strip()
+                    bits = len(assignment) * 4
+                    if not org or bits not in entries:
+                        continue
+                    try:
+                        prefix = int(assignment, 16)
+                    except ValueError:
+                        continue
+                    if org not in vendor_pos:
+                        vendor_pos[org] = len(vendors)
+                        vendors.append(org)
+                    entries[bits][prefix] = vendor_pos[org]
+
+        prefixes, vendor_ids = {}, {}
+        for bits, mapping in entries.items():
+            keys = sorted(mapping)
+            prefixes[bits] = array("Q", keys)
+            vendor_ids[bits] = array("I", (mapping[k] for k in keys))
+        return cls(prefixes, vendor_ids, vendors)
+
+    def to_bytes(self, fingerprint: int) -> bytes:
+        names = "\n".join(self.vendors).encode("utf-8")
+        parts = [_HEADER.pack(_MAGIC, fingerprint, *(len(self.prefixes[b]) for b in PREFIX_BITS), len(names))]
+        for bits in PREFIX_BITS:
+            parts.append(self.prefixes[bits].tobytes())
+            parts.append(self.vendor_ids[bits].tobytes())
+        parts.append(names)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes, fingerprint: int):
+        if len(blob) < _HEADER.size:
+            return None
+        magic, fp, *counts, names_len = _HEADER.unpack_from(blob)
+        if magic != _MAGIC or fp != fingerprint:
+            return None
+
+        pos = _HEADER.size
+        prefixes, vendor_ids = {}, {}
+        for bits, n in zip(PREFIX_BITS, counts):
+            p, v = array("Q"), array("I")
+            p.frombytes(blob[pos:pos + n * p.itemsize])
+            pos += n * p.itemsize
+            v.frombytes(blob[pos:pos + n * v.itemsize])
+            pos += n * v.itemsize
+            prefixes[bits], vendor_ids[bits] = p, v
+        names = blob[pos:pos + names_len].decode("utf-8")
+        return cls(prefixes, vendor_ids, names.split("\n") if names else [])
+
+    def lookup(self, mac: str):
+        hexmac = _normalize_mac(mac)[:12]
+        if len(hexmac) < 6:
+            return None
+        try:
+            value = int(hexmac, 16)
+        except ValueError:
+            return None
+        available = len(hexmac) * 4
+
+        # Prefijo más largo primero: un bloque MA-S/MA-M dentro de un MA-L reasignado gana al MA-L.
+        for bits in PREFIX_BITS:
+            if bits > available:
+                continue
+            keys = self.prefixes[bits]
+            key = value >> (available - bits)
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                return self.vendors[self.vendor_ids[bits][i]]
+        return None
+
+    def lookup_many(self, macs) -> dict:
+        result = {}
+        for mac in macs:
+            if mac and mac not in result:
+                result[mac] = self.lookup(mac)
+        return result
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _build_index() -> OuiIndex:
+    data_dir = _data_dir()
+    if data_dir is None:
+        return OuiIndex({b: array("Q") for b in PREFIX_BITS}, {b: array("I") for b in PREFIX_BITS}, [])
+
+    fingerprint = _fingerprint(data_dir)
+    cache = os.path.join(data_dir, INDEX_FILE)
+    try:
+        with open(cache, "rb") as f:
+            index = OuiIndex.from_bytes(f.read(), fingerprint)
+        if index is not None:
+            return index
+    except OSError:
+        pass
+
+    index = OuiIndex.from_csv(data_dir)
+    try:
+        tmp = f"{cache}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(index.to_bytes(fingerprint))
+        os.replace(tmp, cache)
+    except OSError as e:
+        print(f"[WARN] No se pudo guardar el índice OUI compilado: {e}")
+    return index
+
+
+def get_index() -> OuiIndex:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = _build_index()
+    return _index
 
 
 def vendor_from_mac(mac: str) -> str | None:
-    mac_norm = _normalize_mac(mac)
-    if len(mac_norm) < 6:
+    if not mac:
         return None
-    prefix = mac_norm[:6]
-    return _load_oui_map().get(prefix)
+    return get_index().lookup(mac)
+
+
+def vendors_from_macs(macs) -> dict:
+    return get_index().lookup_many(macs)
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import select
+import socket
+import struct
+import time
+
+PUERTOS_TCP_FALLBACK = (80, 443, 53, 22)
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+def _checksum(datos: bytes) -> int:
+    if len(datos) % 2:
+        datos += b"\x00"
+    total = sum(struct.unpack(f"!{len(datos) // 2}H", datos))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _paquete_echo(ident: int, seq: int) -> bytes:
+    carga = struct.pack("!d", time.time()).ljust(16, b"\x00")
+    cabecera = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    check = _checksum(cabecera + carga)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, check, ident, seq) + carga
+
+
+def _abrir_socket_icmp():
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+    except (PermissionError, OSError):
+        pass
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except (PermissionError, OSError):
+        return None, False
+
+
+def ping_lote(ips, intentos=2, timeout=0.7, intervalo=0.002, intentos_por_ip=None):
+    ips = [str(ip) for ip in ips]
+    rtts = {ip: [] for ip in ips}
+    if not ips:
+        return rtts, False
+
+    sock, raw = _abrir_socket_icmp()
+    if sock is None:
+        return rtts, False
+
+    ident = os.getpid() & 0xFFFF
+    enviados = {}
+    seq = 0
+
+    def recibir(espera):
+        listos, _, _ = select.select([sock], [], [], espera)
+        while listos:
+            try:
+                datos, addr = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            recibido = time.perf_counter()
+
+            if raw:
+                datos = datos[(datos[0] & 0x0F) * 4:]
+            if len(datos) >= 8:
+                tipo, _, _, r_ident, r_seq = struct.unpack("!BBHHH", datos[:8])
+                envio = enviados.get(r_seq)
+                if (tipo == ICMP_ECHO_REPLY and (not raw or r_ident == ident)
+                        and envio is not None and envio[0] == addr[0]):
+                    del enviados[r_seq]
+                    rtts[envio[0]].append((recibido - envio[1]) * 1000.0)
+            listos, _, _ = select.select([sock], [], [], 0)
+
+    try:
+        sock.setblocking(False)
+        for ronda in range(intentos):
+            for ip in ips:
+                if intentos_por_ip and ronda >= intentos_por_ip.get(ip, intentos):
+                    continue
+                seq = (seq + 1) & 0xFFFF
+                try:
+                    sock.sendto(_paquete_echo(ident, seq), (ip, 0))
+                    enviados[seq] = (ip, time.perf_counter())
+                except OSError:
+                    pass
+                recibir(0)
+                if intervalo:
+                    time.sleep(intervalo)
+
+        fin = time.perf_counter() + timeout
+        while enviados:
+            restante = fin - time.perf_counter()
+            if restante <= 0:
+                break
+            recibir(restante)
+    finally:
+        sock.close()
+
+    return rtts, True
+
+
+async def _conectar(ip, puerto, timeout):
+    inicio = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, puerto), timeout)
+        writer.close()
+        return (time.perf_counter() - inicio) * 1000.0
+    except ConnectionRefusedError:
+        return (time.perf_counter() - inicio) * 1000.0
+    except Exception:
+        return None
+
+
+async def _tcp_lote(ips, puertos, timeout, concurrencia):
+    limite = asyncio.Semaphore(concurrencia)
+
+    async def probar(ip):
+        async with limite:
+            tareas = [asyncio.ensure_future(_conectar(ip, p, timeout)) for p in puertos]
+            try:
+                for completada in asyncio.as_completed(tareas):
+                    rtt = await completada
+                    if rtt is not None:
+                        return ip, rtt
+            finally:
+                for t in tareas:
+                    t.cancel()
+            return ip, None
+
+    return dict(await asyncio.gather(*(probar(ip) for ip in ips)))
+
+
+def tcp_lote(ips, puertos=PUERTOS_TCP_FALLBACK, timeout=0.6, concurrencia=64):
+    ips = [str(ip) for ip in ips]
+    if not ips:
+        return {}
+    return asyncio.run(_tcp_lote(ips, puertos, timeout, concurrencia))
+
+
+def sondear_alcance(ips, intentos=2, timeout=0.7, puertos_tcp=PUERTOS_TCP_FALLBACK, timeout_tcp=0.6, contexto=None):
+    ips = list(dict.fromkeys(str(ip) for ip in ips if ip))
+
+    # El eco que ya respondió en el barrido ICMP de este escaneo cuenta como primer intento.
+    previos = {}
+    if contexto is not None:
+        previos, _ = contexto.conocidos(ips, "rtt_ms", "alcance")
+        previos = {ip: rtt for ip, rtt in previos.items() if rtt is not None}
+    rtts, icmp_ok = ping_lote(ips, intentos=intentos, timeout=timeout,
+                              intentos_por_ip={ip: intentos - 1 for ip in previos})
+
+    resultado = {}
+    sin_respuesta = []
+    for ip in ips:
+        muestras = ([previos[ip]] if ip in previos else []) + (rtts.get(ip) or [])
+        # La pérdida se calcula sobre los ecos enviados de verdad: sin socket ICMP solo cuenta el del barrido.
+        enviados = (1 if ip in previos else 0) + ((intentos - 1 if ip in previos else intentos) if icmp_ok else 0)
+        if muestras:
+            resultado[ip] = {
+                "online": True,
+                "rtt_ms": round(sum(muestras) / len(muestras), 2),
+                "rtt_min_ms": round(min(muestras), 2),
+                "rtt_max_ms": round(max(muestras), 2),
+                "loss": round(100.0 * (1 - len(muestras) / enviados), 1),
+                "metodo": "icmp",
+            }
+        else:
+            sin_respuesta.append(ip)
+
+    tcp = tcp_lote(sin_respuesta, puertos_tcp, timeout=timeout_tcp) if sin_respuesta else {}
+    for ip in sin_respuesta:
+        rtt = tcp.get(ip)
+        resultado[ip] = {
+            "online": rtt is not None,
+            "rtt_ms": round(rtt, 2) if rtt is not None else None,
+            "rtt_min_ms": round(rtt, 2) if rtt is not None else None,
+            "rtt_max_ms": round(rtt, 2) if rtt is not None else None,
+            "loss": 100.0 if icmp_ok else None,
+            "metodo": "tcp" if rtt is not None else None,
+        }
+
+    return resultado
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from . import db
+from .bulk import upsert
+from .models import DispositivoEscaneo, DispositivoEscaneoResumen
+
+GRANULARIDADES = ("hora", "dia")
+
+_FORMATOS = {
+    "hora": "%Y-%m-%d %H:00:00",
+    "dia": "%Y-%m-%d 00:00:00",
+}
+
+TAM_BORRADO = 5000
+
+
+def _periodo_sql(granularidad: str, columna):
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == "sqlite":
+        return func.strftime(_FORMATOS[granularidad], columna)
+    if dialecto in ("mysql", "mariadb"):
+        return func.date_format(columna, _FORMATOS[granularidad])
+    return func.date_trunc("hour" if granularidad == "hora" else "day", columna)
+
+
+def _a_datetime(valor):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.strptime(str(valor)[:19], "%Y-%m-%d %H:%M:%S")
+
+
+def _marca(granularidad: str):
+    return db.session.execute(
+        select(func.max(DispositivoEscaneoResumen.periodo))
+        .where(DispositivoEscaneoResumen.granularidad == granularidad)
+    ).scalar()
+
+
+def consolidar(granularidad: str) -> int:
+    # Se recalcula desde el último periodo consolidado (que pudo quedar a medias) en adelante.
+    desde = _marca(granularidad)
+    e = DispositivoEscaneo
+    periodo = _periodo_sql(granularidad, e.fecha).label("periodo")
+
+    consulta = (
+        select(
+            e.dispositivo_id,
+            periodo,
+            func.count(e.id),
+            func.min(e.actividad_score), func.avg(e.actividad_score), func.max(e.actividad_score),
+            func.min(e.rtt_ms), func.avg(e.rtt_ms), func.max(e.rtt_ms),
+            func.min(e.packet_loss), func.avg(e.packet_loss), func.max(e.packet_loss),
+            func.coalesce(func.sum(e.consumo_upload_mb), 0.0),
+            func.coalesce(func.sum(e.consumo_download_mb), 0.0),
+            func.coalesce(func.sum(e.consumo_total_mb), 0.0),
+        )
+        .group_by(e.dispositivo_id, periodo)
+    )
+    if desde is not None:
+        consulta = consulta.where(e.fecha >= desde)
+
+    filas = [
+        {
+            "dispositivo_id": row[0],
+            "granularidad": granularidad,
+            "periodo": _a_datetime(row[1]),
+            "muestras": row[2],
+            "actividad_min": row[3], "actividad_avg": row[4], "actividad_max": row[5],
+            "rtt_min": row[6], "rtt_avg": row[7], "rtt_max": row[8],
+            "loss_min": row[9], "loss_avg": row[10], "loss_max": row[11],
+            "consumo_upload_mb": float(row[12]),
+            "consumo_download_mb": float(row[13]),
+            "consumo_total_mb": float(row[14]),
+        }
+        for row in db.session.execute(consulta)
+    ]
+    upsert(DispositivoEscaneoResumen.__table__, filas, ["dispositivo_id", "granularidad", "periodo"])
+    db.session.commit()
+    return len(filas)
+
+
+def _borrar_por_lotes(modelo, condicion) -> int:
+    total = 0
+    while True:
+        ids = select(modelo.id).where(condicion).limit(TAM_BORRADO).scalar_subquery()
+        borradas = db.session.execute(delete(modelo).where(modelo.id.in_(ids))).rowcount or 0
+        db.session.commit()
+        total += borradas
+        if borradas < TAM_BORRADO:
+            return total
+
+
+def aplicar_retencion(ahora: datetime, dias_crudos: float, dias_horarios: float, dias_diarios: float) -> dict:
+    borrados = {"crudos": 0, "hora": 0, "dia": 0}
+
+    if dias_crudos and dias_crudos > 0:
+        # Nunca se borran filas crudas que aún no estén cubiertas por ambos resúmenes.
+        marcas = [_marca(g) for g in GRANULARIDADES]
+        if all(m is not None for m in marcas):
+            limite = min([ahora - timedelta(days=dias_crudos)] + marcas)
+            borrados["crudos"] = _borrar_por_lotes(DispositivoEscaneo, DispositivoEscaneo.fecha < limite)
+
+    r = DispositivoEscaneoResumen
+    for granularidad, dias in (("hora", dias_horarios), ("dia", dias_diarios)):
+        if dias and dias > 0:
+            borrados[granularidad] = _borrar_por_lotes(
+                r, (r.granularidad == granularidad) & (r.periodo < ahora - timedelta(days=dias))
+            )
+
+    return borrados
+
+
+def mantener_historial(config, ahora: datetime = None) -> dict:
+    ahora = ahora or datetime.utcnow()
+    consolidados = {g: consolidar(g) for g in GRANULARIDADES}
+    borrados = aplicar_retencion(
+        ahora,
+        float(config.get("RETENCION_CRUDOS_DIAS", 30)),
+        float(config.get("RETENCION_HORARIOS_DIAS", 180)),
+        float(config.get("RETENCION_DIARIOS_DIAS", 0)),
+    )
+    return {"consolidados": consolidados, "borrados": borrados}
@@ -1,22 +1,31 @@
 from __future__ import annotations
 
-import platform
-import subprocess
-import re
-import os
-import csv
-import socket
-import pandas as pd
-from flask import send_file
-from io import BytesIO
-from datetime import datetime
-from functools import lru_cache
+import json
+import base64
+import hashlib
+import time
+from types import SimpleNamespace
+from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
-from flask import Blueprint, jsonify, redirect, render_template, request, url_for, abort
-from sqlalchemy import desc
+from flask import Blueprint, current_app, jsonify, redirect, render_template, request, stream_with_context, url_for, abort
+from sqlalchemy import and_, bindparam, desc, func, or_, select
 from . import db
-from .models import Dispositivo, Escaneo, EstadoDispositivoLog, DispositivoEscaneo
-from .scanner import escanear_red  
+from .bulk import TAM_LOTE_DEFAULT, insertar, trozos, upsert
+from .events import bus, publicar_al_confirmar, stream_sse
+from .host_context import ContextoEscaneo
+from .exports import CONJUNTOS as CONJUNTOS_EXPORTACION, FORMATOS as FORMATOS_EXPORTACION, exportar
+from .objetivos import MAX_HOSTS_SEGMENTO, TAM_SHARD_DEFAULT, resolver_segmentos
+from .oui_lookup import vendor_from_mac, vendors_from_macs
+from .models import (
+    Dispositivo, DispositivoEliminado, DispositivoEscaneo, DispositivoEscaneoResumen, Escaneo, EstadoDispositivoLog,
+)
+from .reachability import sondear_alcance
+from .rollups import mantener_historial
+from .scan_jobs import EscaneoCancelado, TrabajoEscaneo, iniciar_trabajo, obtener_trabajo, ultimo_trabajo
+from .scheduler import obtener_programador
+from .sync import siguiente_version, version_actual
+from .scanner import ICMP_RATE_DEFAULT, barrer_arp, escanear_red
+from .traffic_analyzer import obtener_analizador
 try:
     from .scanner_utils import clasificar_dispositivo  
 except Exception:
@@ -34,94 +43,35 @@ main = Blueprint("main", __name__)
 def _normalizar_mac(mac: str) -> str:
     return mac.strip().upper().replace("-", ":").replace(".", ":")
 
-def host_reachable(ip: str) -> bool:
-    online, _, _ = ping_stats(ip, count=1, timeout_ms=500)
-    if online:
-        return True
-
-    for port in (80, 443, 53, 22):
-        try:
-            with socket.create_connection((ip, port), timeout=0.6):
-                return True
-        except Exception:
-            continue
+def _respuesta_exportacion(conjunto: str, formato: str, nombre: str, **filtros):
+    if conjunto not in CONJUNTOS_EXPORTACION or formato not in FORMATOS_EXPORTACION:
+        abort(404)
+    return current_app.response_class(
+        stream_with_context(exportar(conjunto, formato, **filtros)),
+        mimetype=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}.{formato}"'},
+    )
 
-    return False
 
 @main.route("/informe/excel")
 def exportar_informe_excel():
-    dispositivos = Dispositivo.query.all()
-
-    data = []
-    for d in dispositivos:
-        data.append({
-            "Dirección IP": d.ip,
-            "Dirección MAC": d.mac or "No registrada",
-            "Fabricante": getattr(d, "fabricante", None) or "Desconocido",
-            "Hostname": getattr(d, "hostname", None) or "Desconocido",
-            "Fecha registro": d.fecha_registro.strftime("%d-%m-%Y %H:%M")
-            if getattr(d, "fecha_registro", None) else ""
-        })
-
-    df = pd.DataFrame(data)
-
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df.to_excel(writer, index=False, sheet_name="Dispositivos NetGuard")
-
-    output.seek(0)
-
-    return send_file(
-        output,
-        download_name="netguard_informe_dispositivos.xlsx",
-        as_attachment=True,
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
+    return _respuesta_exportacion("dispositivos", "xlsx", "netguard_informe_dispositivos")
 
-@lru_cache(maxsize=1)
-def cargar_oui_map() -> Dict[str, str]:
-    posibles_rutas = [
-        os.path.join(os.path.dirname(__file__), "oui.csv"),
-        os.path.join(os.path.dirname(__file__), "data", "oui.csv"),
-        os.path.join(os.getcwd(), "oui.csv"),
-    ]
 
-    ruta = next((p for p in posibles_rutas if os.path.exists(p)), None)
-    if not ruta:
-        return {}
+@main.route("/exportar/<conjunto>.<formato>")
+def exportar_conjunto(conjunto: str, formato: str):
+    return _respuesta_exportacion(conjunto, formato, f"netguard_{conjunto}")
 
-    mapa: Dict[str, str] = {}
-    with open(ruta, "r", encoding="utf-8", errors="ignore") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if not row:
-                continue
-            prefix = row[0].strip().upper()
-            vendor = (row[1].strip() if len(row) > 1 else "").strip()
-            if not prefix or not vendor:
-                continue
 
-            prefix = prefix.replace("-", "").replace(":", "").replace(".", "")
-            if len(prefix) < 6:
-                continue
-            prefix = prefix[:6]
-            oui = f"{prefix[0:2]}:{prefix[2:4]}:{prefix[4:6]}"
-            if oui not in mapa:
-                mapa[oui] = vendor
-
-    return mapa
+@main.route("/dispositivo/<int:dispositivo_id>/historial.<formato>")
+def exportar_historial_dispositivo(dispositivo_id: int, formato: str):
+    d = Dispositivo.query.get_or_404(dispositivo_id)
+    nombre = f"netguard_historial_{d.ip.replace('.', '_').replace(':', '_')}"
+    return _respuesta_exportacion("historial", formato, nombre, dispositivo_id=d.id)
 
 
 def fabricante_desde_mac(mac: Optional[str]) -> str:
-    if not mac:
-        return "Desconocido"
-    mac = _normalizar_mac(mac)
-    partes = mac.split(":")
-    if len(partes) < 3:
-        return "Desconocido"
-    oui = ":".join(partes[:3])
-    return cargar_oui_map().get(oui, "Desconocido")
+    return vendor_from_mac(mac) or "Desconocido"
 
 
 def _registrar_cambio_estado(dispositivo: Dispositivo, anterior: str, nuevo: str, motivo: str) -> None:
@@ -133,87 +83,305 @@ def _registrar_cambio_estado(dispositivo: Dispositivo, anterior: str, nuevo: str
         fecha_cambio=datetime.utcnow(),
     )
     db.session.add(log)
-
-
-def _calcular_stats(dispositivos: List[Dispositivo]) -> Dict[str, int]:
-    total = len(dispositivos)
-    vulnerables = sum(1 for d in dispositivos if (d.riesgo or "").lower() in ("alto", "medio"))
-    nuevos = sum(1 for d in dispositivos if (d.estado or "").lower() == "nuevo")
-    return {"total": total, "vulnerables": vulnerables, "nuevos": nuevos}
-
-
-def _dispositivo_to_dict(d: Dispositivo) -> Dict[str, Any]:
+    publicar_al_confirmar("cambios_estado", {"cambios": [{
+        "dispositivo_id": dispositivo.id,
+        "ip": dispositivo.ip,
+        "estado_anterior": log.estado_anterior,
+        "estado_nuevo": log.estado_nuevo,
+        "motivo": log.motivo,
+        "fecha": log.fecha_cambio.isoformat(),
+    }]})
+
+
+def _calcular_stats() -> Dict[str, Any]:
+    estado = func.lower(func.coalesce(Dispositivo.estado, "")).label("estado")
+    riesgo = func.lower(func.coalesce(Dispositivo.riesgo, "")).label("riesgo")
+    filas = db.session.execute(
+        select(estado, riesgo, func.count(Dispositivo.id)).group_by(estado, riesgo)
+    ).all()
+
+    por_estado: Dict[str, int] = {}
+    total = vulnerables = 0
+    for est, rie, n in filas:
+        total += n
+        por_estado[est] = por_estado.get(est, 0) + n
+        if rie in ("alto", "medio"):
+            vulnerables += n
+
+    return {"total": total, "vulnerables": vulnerables, "nuevos": por_estado.get("nuevo", 0), "por_estado": por_estado}
+
+
+def _dispositivo_to_dict(d) -> Dict[str, Any]:
     return {
         "id": d.id,
         "ip": d.ip,
         "mac": d.mac,
-        "fabricante": fabricante_desde_mac(d.mac),
+        "fabricante": d.fabricante or fabricante_desde_mac(d.mac),
         "nombre": d.nombre,
         "tipo": d.tipo,
         "riesgo": d.riesgo,
         "estado": d.estado,
-        "ultimo_escaneo": d.ultimo_escaneo.isoformat() if d.ultimo_escaneo else None,
+        "ultimo_escaneo": d.fecha_ultima_visto.isoformat() if d.fecha_ultima_visto else None,
     }
 
 
+COLUMNAS_LISTADO = (
+    Dispositivo.id, Dispositivo.ip, Dispositivo.mac, Dispositivo.nombre, Dispositivo.tipo,
+    Dispositivo.riesgo, Dispositivo.estado, Dispositivo.fabricante, Dispositivo.fecha_ultima_visto,
+)
+
+ORDENES_LISTADO = {
+    "ultimo_escaneo": Dispositivo.fecha_ultima_visto,
+    "ip": Dispositivo.ip,
+    "nombre": func.coalesce(Dispositivo.nombre, ""),
+    "tipo": func.coalesce(Dispositivo.tipo, ""),
+    "fabricante": func.coalesce(Dispositivo.fabricante, ""),
+    "estado": func.coalesce(Dispositivo.estado, ""),
+    "riesgo": func.coalesce(Dispositivo.riesgo, ""),
+}
+
+LIMITE_PAGINA_DEFAULT = 50
+LIMITE_PAGINA_MAX = 500
+
+
+def _codificar_cursor(valor, ident: int) -> str:
+    if isinstance(valor, datetime):
+        valor = {"dt": valor.isoformat()}
+    crudo = json.dumps([valor, ident], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def _decodificar_cursor(cursor: str):
+    crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    datos = json.loads(crudo)
+    if not isinstance(datos, list) or len(datos) != 2 or type(datos[1]) is not int:
+        raise ValueError("cursor inválido")
+    valor, ident = datos
+    if isinstance(valor, dict):
+        if not isinstance(valor.get("dt"), str):
+            raise ValueError("cursor inválido")
+        valor = datetime.fromisoformat(valor["dt"])
+    elif valor is not None and not isinstance(valor, (str, int, float)):
+        raise ValueError("cursor inválido")
+    return valor, ident
+
+
+def _despues_del_cursor(columna, valor, ident: int, direccion: str):
+    # NULL cuenta como el menor valor: va al final en orden descendente y al principio en ascendente.
+    if direccion == "desc":
+        if valor is None:
+            return and_(columna.is_(None), Dispositivo.id < ident)
+        return or_(columna < valor, and_(columna == valor, Dispositivo.id < ident), columna.is_(None))
+    if valor is None:
+        return or_(columna.is_not(None), and_(columna.is_(None), Dispositivo.id > ident))
+    return or_(columna > valor, and_(columna == valor, Dispositivo.id > ident))
+
+
+def _lista_param(nombre: str, args) -> List[str]:
+    return [v.strip().lower() for v in ",".join(args.getlist(nombre)).split(",") if v.strip()]
+
+
+def _limite_pagina(args) -> int:
+    limite = args.get("limite", LIMITE_PAGINA_DEFAULT, type=int)
+    return max(1, min(limite, LIMITE_PAGINA_MAX))
+
+
+def _filtros_listado(args) -> list:
+    # Los comparten el listado paginado y la sincronización delta del dashboard.
+    filtros = []
+    for nombre, col in (("estado", Dispositivo.estado), ("riesgo", Dispositivo.riesgo), ("tipo", Dispositivo.tipo)):
+        valores = _lista_param(nombre, args)
+        if valores:
+            filtros.append(func.lower(col).in_(valores))
+
+    fabricante = (args.get("fabricante") or "").strip()
+    if fabricante:
+        filtros.append(Dispositivo.fabricante.ilike(f"%{fabricante}%"))
+
+    visto_desde = args.get("visto_desde")
+    if visto_desde:
+        filtros.append(Dispositivo.fecha_ultima_visto >= datetime.fromisoformat(visto_desde))
+    return filtros
+
+
+def _consultar_dispositivos(args):
+    orden = (args.get("orden") or "ultimo_escaneo").lower()
+    if orden not in ORDENES_LISTADO:
+        raise ValueError(f"orden inválido: {orden}")
+    direccion = (args.get("dir") or ("desc" if orden == "ultimo_escaneo" else "asc")).lower()
+    if direccion not in ("asc", "desc"):
+        raise ValueError(f"dirección inválida: {direccion}")
+
+    limite = _limite_pagina(args)
+
+    columna = ORDENES_LISTADO[orden]
+    consulta = select(*COLUMNAS_LISTADO, columna.label("_orden")).where(*_filtros_listado(args))
+
+    cursor = args.get("cursor")
+    if cursor:
+        valor, ident = _decodificar_cursor(cursor)
+        consulta = consulta.where(_despues_del_cursor(columna, valor, ident, direccion))
+
+    if direccion == "desc":
+        consulta = consulta.order_by(columna.desc().nulls_last(), Dispositivo.id.desc())
+    else:
+        consulta = consulta.order_by(columna.asc().nulls_first(), Dispositivo.id.asc())
+
+    filas = db.session.execute(consulta.limit(limite + 1)).all()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = _codificar_cursor(filas[-1]._orden, filas[-1].id)
+
+    return filas, siguiente
+
+
 @main.route("/", methods=["GET"])
 def dashboard():
-    dispositivos = Dispositivo.query.order_by(desc(Dispositivo.ultimo_escaneo)).all()
-    stats = _calcular_stats(dispositivos)
+    try:
+        dispositivos, siguiente = _consultar_dispositivos(request.args)
+    except ValueError:
+        abort(400)
+    stats = _calcular_stats()
     ultimos_escaneos = Escaneo.query.order_by(desc(Escaneo.fecha)).limit(10).all()
-    hay_resultados = len(dispositivos) > 0
-
-    for d in dispositivos:
-        setattr(d, "fabricante", fabricante_desde_mac(d.mac))
+    hay_resultados = stats["total"] > 0
 
     return render_template(
         "dashboard.html",
         hay_resultados=hay_resultados,
-        dispositivos=dispositivos,
+        dispositivos=[_dispositivo_to_dict(d) for d in dispositivos],
+        siguiente=siguiente,
         stats=stats,
         ultimos_escaneos=ultimos_escaneos,
     )
 
 
+@main.route("/api/dispositivos", methods=["GET"])
+def api_dispositivos():
+    try:
+        dispositivos, siguiente = _consultar_dispositivos(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    return jsonify({
+        "ok": True,
+        "dispositivos": [_dispositivo_to_dict(d) for d in dispositivos],
+        "siguiente": siguiente,
+    })
+
+
+LIMITE_DELTA = 500
+
+
+def _ultimos_escaneos_dict() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": e.id,
+            "fecha": e.fecha.isoformat(),
+            "total_dispositivos": e.total_dispositivos,
+            "dispositivos_vulnerables": e.dispositivos_vulnerables,
+            "estado": e.estado or "completado",
+        }
+        for e in Escaneo.query.order_by(desc(Escaneo.fecha)).limit(10).all()
+    ]
+
+
+def _delta_dashboard(desde: int, version: int, filtros: list) -> Optional[Dict[str, Any]]:
+    cambiados = db.session.execute(
+        select(*COLUMNAS_LISTADO)
+        .where(Dispositivo.version > desde)
+        .order_by(Dispositivo.version, Dispositivo.id)
+        .limit(LIMITE_DELTA + 1)
+    ).all()
+    if len(cambiados) > LIMITE_DELTA:
+        return None
+
+    eliminados = db.session.execute(
+        select(DispositivoEliminado.dispositivo_id).where(DispositivoEliminado.version > desde)
+    ).scalars().all()
+    if filtros and cambiados:
+        # Lo que cambió y ya no cumple los filtros sale de la vista igual que lo borrado.
+        visibles = set(db.session.execute(
+            select(Dispositivo.id).where(Dispositivo.version > desde, *filtros)
+        ).scalars())
+        eliminados += [d.id for d in cambiados if d.id not in visibles]
+        cambiados = [d for d in cambiados if d.id in visibles]
+    hay_escaneos = db.session.execute(
+        select(Escaneo.id).where(Escaneo.version > desde).limit(1)
+    ).first() is not None
+
+    return {
+        "delta": True,
+        "cursor": str(version),
+        "stats": _calcular_stats(),
+        "dispositivos": [_dispositivo_to_dict(d) for d in cambiados],
+        "eliminados": eliminados,
+        "ultimos_escaneos": _ultimos_escaneos_dict() if hay_escaneos else None,
+    }
+
+
 @main.route("/api/dashboard-data", methods=["GET"])
 def api_dashboard_data():
-    dispositivos = Dispositivo.query.order_by(desc(Dispositivo.ultimo_escaneo)).all()
-    stats = _calcular_stats(dispositivos)
-    ultimos_escaneos = Escaneo.query.order_by(desc(Escaneo.fecha)).limit(10).all()
+    # El ETag identifica el estado (versión + filtros); "since" no cuenta, así un sondeo sin cambios responde 304.
+    version = version_actual()
+    filtros = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)) if k != "since")
+    etag = f"v{version}-{hashlib.blake2b(filtros.encode('utf-8'), digest_size=6).hexdigest()}"
+    if request.if_none_match.contains_weak(etag):
+        resp = current_app.response_class(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+
+    payload = None
+    since = request.args.get("since")
+    if since:
+        try:
+            desde = int(since)
+        except ValueError:
+            return jsonify({"ok": False, "error": f"cursor inválido: {since}"}), 400
+        if desde <= version:
+            try:
+                payload = _delta_dashboard(desde, version, _filtros_listado(request.args))
+            except ValueError as e:
+                return jsonify({"ok": False, "error": str(e)}), 400
 
-    return jsonify(
-        {
-            "stats": stats,
+    if payload is None:
+        try:
+            dispositivos, siguiente = _consultar_dispositivos(request.args)
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        payload = {
+            "delta": False,
+            "cursor": str(version),
+            "stats": _calcular_stats(),
             "dispositivos": [_dispositivo_to_dict(d) for d in dispositivos],
-            "ultimos_escaneos": [
-                {
-                    "id": e.id,
-                    "fecha": e.fecha.isoformat(),
-                    "total_dispositivos": e.total_dispositivos,
-                    "dispositivos_vulnerables": e.dispositivos_vulnerables,
-                }
-                for e in ultimos_escaneos
-            ],
+            "siguiente": siguiente,
+            "ultimos_escaneos": _ultimos_escaneos_dict(),
         }
-    )
+    payload["limite"] = _limite_pagina(request.args)
+
+    resp = jsonify(payload)
+    resp.set_etag(etag, weak=True)
+    return resp
 
 
 @main.route("/dispositivos", methods=["GET"])
 def listar_dispositivos():
-    dispositivos = Dispositivo.query.order_by(desc(Dispositivo.ultimo_escaneo)).all()
-    stats = _calcular_stats(dispositivos)
-    total_dispositivos = len(dispositivos)
-
-    for d in dispositivos:
-        setattr(d, "fabricante", fabricante_desde_mac(d.mac))
+    try:
+        dispositivos, siguiente = _consultar_dispositivos(request.args)
+    except ValueError:
+        abort(400)
+    por_estado = _calcular_stats()["por_estado"]
+    total_dispositivos = sum(por_estado.values())
 
     return render_template(
         "scan_results.html",
-        dispositivos=dispositivos,
+        dispositivos=[_dispositivo_to_dict(d) for d in dispositivos],
+        siguiente=siguiente,
         stats={
-            "seguro": sum(1 for d in dispositivos if (d.estado or "").lower() == "seguro"),
-            "nuevo": sum(1 for d in dispositivos if (d.estado or "").lower() == "nuevo"),
-            "sospechoso": sum(1 for d in dispositivos if (d.estado or "").lower() == "sospechoso"),
+            "seguro": por_estado.get("seguro", 0),
+            "nuevo": por_estado.get("nuevo", 0),
+            "sospechoso": por_estado.get("sospechoso", 0),
         },
         total_dispositivos=total_dispositivos,
     )
@@ -224,43 +392,6 @@ def resultado_escaneo():
     return redirect(url_for("main.listar_dispositivos"))
 
 
-def ping_stats(ip: str, count: int = 2, timeout_ms: int = 700):
-    is_win = platform.system().lower().startswith("win")
-    if is_win:
-        cmd = ["ping", "-n", str(count), "-w", str(timeout_ms), ip]
-    else:
-        cmd = ["ping", "-c", str(count), "-W", str(max(1, timeout_ms // 1000)), ip]
-
-    try:
-        out = subprocess.run(cmd, capture_output=True, text=True, timeout=6).stdout.lower()
-    except Exception:
-        return False, None, None
-
-    online = ("ttl=" in out) or ("bytes from" in out)
-
-    times = re.findall(r"time[=<]\s*([\d\.]+)\s*ms", out)
-    rtt = None
-    if times:
-        vals = []
-        for t in times:
-            try:
-                vals.append(float(t))
-            except Exception:
-                pass
-        if vals:
-            rtt = sum(vals) / len(vals)
-
-    loss = None
-    m = re.search(r"(\d+)\s*%\s*(loss|perdidos)", out)
-    if m:
-        try:
-            loss = float(m.group(1))
-        except Exception:
-            loss = None
-
-    return online, rtt, loss
-
-
 def calcular_actividad_score(online: bool, rtt_ms, loss_pct, puertos_abiertos: int) -> float:
     if not online:
         return 0.0
@@ -297,59 +428,164 @@ def calcular_actividad_score(online: bool, rtt_ms, loss_pct, puertos_abiertos: i
     return float(max(0.0, min(100.0, score)))
 
 
-def ejecutar_scan():
-    resultados = escanear_red()  
-    ahora = datetime.utcnow()
+def _planificar_incremental(presencia: Dict[str, str], ahora: datetime, ttl_horas: float):
+    # Por trozos, como _persistir_lote: una /16 no cabe en los parámetros de una sola consulta SQLite.
+    conocidos = {}
+    for bloque in trozos(presencia):
+        conocidos.update((d.ip, d) for d in Dispositivo.query.filter(Dispositivo.ip.in_(bloque)).all())
 
-    ips = [r.get("ip") for r in resultados if r.get("ip")]
-    existentes = {d.ip: d for d in Dispositivo.query.filter(Dispositivo.ip.in_(ips)).all()} if ips else {}
+    ultimos = {}
+    for ids in trozos([d.id for d in conocidos.values()]):
+        ultimo_profundo = (
+            db.session.query(
+                DispositivoEscaneo.dispositivo_id.label("dispositivo_id"),
+                func.max(DispositivoEscaneo.fecha).label("fecha"),
+            )
+            .filter(DispositivoEscaneo.dispositivo_id.in_(ids), DispositivoEscaneo.sondeo_completo.is_(True))
+            .group_by(DispositivoEscaneo.dispositivo_id)
+            .subquery()
+        )
+        filas = (
+            db.session.query(
+                DispositivoEscaneo.dispositivo_id,
+                DispositivoEscaneo.fecha,
+                DispositivoEscaneo.puertos_abiertos,
+            )
+            .join(
+                ultimo_profundo,
+                and_(
+                    DispositivoEscaneo.dispositivo_id == ultimo_profundo.c.dispositivo_id,
+                    DispositivoEscaneo.fecha == ultimo_profundo.c.fecha,
+                ),
+            )
+            .filter(DispositivoEscaneo.sondeo_completo.is_(True))
+            .all()
+        )
+        ultimos.update((dispositivo_id, (fecha, puertos)) for dispositivo_id, fecha, puertos in filas)
 
-    dispositivos_guardados: List[Dispositivo] = []
-    nuevos_count = 0
-    vulnerables_count = 0
+    limite = ahora - timedelta(hours=ttl_horas)
+    profundos: List[str] = []
+    superficiales: List[Dict[str, Any]] = []
 
-    for r in resultados:
-        ip = r.get("ip")
-        if not ip:
+    for ip, mac in presencia.items():
+        d = conocidos.get(ip)
+        if d is None:
+            profundos.append(ip)
+            continue
+        if mac and d.mac and _normalizar_mac(mac) != _normalizar_mac(d.mac):
+            profundos.append(ip)
+            continue
+        fecha, puertos = ultimos.get(d.id, (None, None))
+        if fecha is None or fecha < limite:
+            profundos.append(ip)
             continue
+        superficiales.append({"ip": ip, "mac": mac, "puertos": puertos or 0, "superficial": True})
 
+    return profundos, superficiales
+
+
+def _nombre_valido(nombre) -> bool:
+    return bool(nombre and str(nombre).strip() and str(nombre).strip().lower() not in ("desconocido", "unknown"))
+
+
+def _reubicar_por_mac(lote: List[Dict[str, Any]], previos: Dict[str, Any], columnas) -> None:
+    # Un dispositivo conocido por su MAC que aparece en otra IP (DHCP) se mueve de IP en vez de duplicarse.
+    tabla = Dispositivo.__table__
+    destino_por_mac = {_normalizar_mac(r["mac"]): r["ip"] for r in lote if r.get("mac")}
+    if not destino_por_mac:
+        return
+
+    variantes = set(destino_por_mac) | {m.lower() for m in destino_por_mac}
+    por_mac = {}
+    for row in db.session.execute(
+        select(*columnas).where(tabla.c.mac.in_(variantes)).order_by(tabla.c.fecha_ultima_visto)
+    ):
+        por_mac[_normalizar_mac(row.mac)] = row  # si hay duplicados antiguos, gana el visto más reciente
+
+    movimientos = {
+        row.id: (row, destino_por_mac[mac])
+        for mac, row in por_mac.items()
+        if row.ip != destino_por_mac[mac]
+    }
+    # Solo se mueve si la IP destino está libre o la deja otro dispositivo que también se mueve en este lote.
+    while True:
+        bloqueados = [
+            id_ for id_, (_row, ip) in movimientos.items()
+            if ip in previos and previos[ip].id not in movimientos
+        ]
+        if not bloqueados:
+            break
+        for id_ in bloqueados:
+            del movimientos[id_]
+    if not movimientos:
+        return
+
+    # En dos pasos para que los intercambios de IP no choquen con la restricción unique.
+    stmt = tabla.update().where(tabla.c.id == bindparam("_id")).values(ip=bindparam("_ip"))
+    db.session.execute(stmt, [{"_id": id_, "_ip": f"~mov~{id_}"} for id_ in movimientos])
+    db.session.execute(stmt, [{"_id": id_, "_ip": ip} for id_, (_row, ip) in movimientos.items()])
+
+    for row, _ip in movimientos.values():
+        # La IP que deja libre ya no es de este dispositivo: si aparece otro en ella, es nuevo.
+        if row.ip in previos and previos[row.ip].id == row.id:
+            del previos[row.ip]
+    for row, ip in movimientos.values():
+        previos[ip] = row
+    print(f"[INFO] {len(movimientos)} dispositivos cambiaron de IP (misma MAC)")
+
+
+def _persistir_lote(lote: List[Dict[str, Any]], alcance: Dict[str, Dict[str, Any]], ahora: datetime):
+    tabla = Dispositivo.__table__
+    ips = [r["ip"] for r in lote]
+    columnas = (tabla.c.id, tabla.c.ip, tabla.c.mac, tabla.c.nombre, tabla.c.tipo, tabla.c.riesgo, tabla.c.estado,
+                tabla.c.fabricante)
+    previos = {row.ip: row for row in db.session.execute(select(*columnas).where(tabla.c.ip.in_(ips)))}
+    _reubicar_por_mac(lote, previos, columnas)
+
+    version = siguiente_version()
+    fabricantes = vendors_from_macs(r.get("mac") for r in lote)
+    filas: List[Dict[str, Any]] = []
+    cambios: List[tuple] = []
+    metricas: Dict[str, Dict[str, Any]] = {}
+    nuevos_count = 0
+    vulnerables_count = 0
+
+    for r in lote:
+        ip = r["ip"]
         mac = r.get("mac")
         nombre = r.get("nombre")
         tipo = r.get("tipo")
-        riesgo = r.get("riesgo")  
+        riesgo = r.get("riesgo")
+        fabricante = r.get("fabricante") or fabricantes.get(mac)
 
-        previo = existentes.get(ip)
+        previo = previos.get(ip)
 
         if previo is None:
-            d = Dispositivo(
-                ip=ip,
-                mac=mac,
-                nombre=(nombre if (nombre and str(nombre).strip().lower() not in ("desconocido","unknown")) else "Desconocido"),
-                tipo=tipo,
-                riesgo=riesgo,
-                estado="nuevo",
-                ultimo_escaneo=ahora,
-            )
-            db.session.add(d)
-            db.session.flush()  
-            _registrar_cambio_estado(d, "desconocido", "nuevo", "dispositivo nuevo detectado")
+            fila = {
+                "ip": ip,
+                "mac": mac,
+                "nombre": nombre if _nombre_valido(nombre) else "Desconocido",
+                "tipo": tipo or "Desconocido",
+                "riesgo": riesgo or "Desconocido",
+                "estado": "nuevo",
+                "fabricante": fabricante,
+            }
+            cambios.append((ip, "desconocido", "nuevo", "dispositivo nuevo detectado"))
             nuevos_count += 1
         else:
-            d = previo
-            estado_anterior = (d.estado or "desconocido").lower()
-
-            if mac:
-                d.mac = mac
-            if nombre and str(nombre).strip() and str(nombre).strip().lower() not in ("desconocido", "unknown"):
-                d.nombre = nombre
-            if tipo:
-                d.tipo = tipo
-            if riesgo is not None:
-                d.riesgo = riesgo
-            d.ultimo_escaneo = ahora
+            estado_anterior = (previo.estado or "desconocido").lower()
+            fila = {
+                "ip": ip,
+                "mac": mac or previo.mac,
+                "nombre": nombre if _nombre_valido(nombre) else previo.nombre,
+                "tipo": tipo or previo.tipo,
+                "riesgo": riesgo if riesgo is not None else previo.riesgo,
+                "estado": estado_anterior,
+                "fabricante": fabricante or previo.fabricante,
+            }
 
             try:
-                estado_auto, motivo = clasificar_dispositivo(r, d)
+                estado_auto, motivo = clasificar_dispositivo(r, SimpleNamespace(id=previo.id, fecha_ultima_visto=ahora, **fila))
             except Exception:
                 estado_auto, motivo = (estado_anterior, "")
 
@@ -360,23 +596,28 @@ def ejecutar_scan():
                 estado_nuevo = (estado_auto or estado_anterior or "seguro").lower()
 
             if estado_nuevo != estado_anterior:
-                d.estado = estado_nuevo
-                _registrar_cambio_estado(d, estado_anterior, estado_nuevo, motivo or "clasificación automática")
+                fila["estado"] = estado_nuevo
+                cambios.append((ip, estado_anterior, estado_nuevo, motivo or "clasificación automática"))
+
+        fila["fecha_ultima_visto"] = ahora
+        fila["version"] = version
 
         try:
             puertos = r.get("puertos") or []
             puertos_count = len(puertos) if isinstance(puertos, list) else int(puertos or 0)
         except Exception:
             puertos_count = 0
-        online_ping, rtt_ms, loss_pct = ping_stats(ip)
-        online = host_reachable(ip)  
+        sonda = alcance.get(ip) or {}
+        online = bool(sonda.get("online"))
+        rtt_ms = sonda.get("rtt_ms")
+        loss_pct = sonda.get("loss")
 
         actividad = calcular_actividad_score(online, rtt_ms, loss_pct, puertos_count)
-        estado_actual = (d.estado or "desconocido").lower()
+        estado_actual = (fila["estado"] or "desconocido").lower()
 
         if estado_actual != "bloqueado":
             if online:
-                if (d.riesgo or "").lower() in ("alto", "medio"):
+                if (fila["riesgo"] or "").lower() in ("alto", "medio"):
                     estado_nuevo = "sospechoso"
                 else:
                     estado_nuevo = "seguro"
@@ -384,50 +625,275 @@ def ejecutar_scan():
                 estado_nuevo = "desconocido"
 
             if estado_nuevo != estado_actual:
-                d.estado = estado_nuevo
-                _registrar_cambio_estado(d, estado_actual, estado_nuevo, "estado por reachability (ping/tcp)")
-
-        db.session.add(
-            DispositivoEscaneo(
-                dispositivo_id=d.id,
-                fecha=ahora,
-                puertos_abiertos=puertos_count,
-                actividad_score=float(actividad),
-                rtt_ms=(float(rtt_ms) if rtt_ms is not None else None),
-                packet_loss=(float(loss_pct) if loss_pct is not None else None),
-                estado=(d.estado or "desconocido"),
-                riesgo=(d.riesgo or "Desconocido"),
-            )
-        )
+                fila["estado"] = estado_nuevo
+                cambios.append((ip, estado_actual, estado_nuevo, "estado por reachability (icmp/tcp)"))
+
+        metricas[ip] = {
+            "fecha": ahora,
+            "sondeo_completo": not r.get("superficial"),
+            "puertos_abiertos": puertos_count,
+            "actividad_score": float(actividad),
+            "rtt_ms": float(rtt_ms) if rtt_ms is not None else None,
+            "packet_loss": float(loss_pct) if loss_pct is not None else None,
+            "consumo_upload_mb": float(r.get("consumo_upload_mb") or 0.0),
+            "consumo_download_mb": float(r.get("consumo_download_mb") or 0.0),
+            "consumo_total_mb": float(r.get("consumo_total_mb") or 0.0),
+            "estado": fila["estado"] or "desconocido",
+            "riesgo": fila["riesgo"] or "Desconocido",
+        }
 
-        dispositivos_guardados.append(d)
-        if (d.riesgo or "").lower() in ("alto", "medio"):
+        filas.append(fila)
+        if (fila["riesgo"] or "").lower() in ("alto", "medio"):
             vulnerables_count += 1
 
+    upsert(tabla, filas, ["ip"])
+    ids = dict(db.session.execute(select(tabla.c.ip, tabla.c.id).where(tabla.c.ip.in_(ips))).all())
+
+    logs = [
+        {
+            "dispositivo_id": ids[ip],
+            "estado_anterior": anterior or "desconocido",
+            "estado_nuevo": nuevo or "desconocido",
+            "motivo": motivo or "",
+            "fecha_cambio": ahora,
+        }
+        for ip, anterior, nuevo, motivo in cambios
+    ]
+    insertar(EstadoDispositivoLog.__table__, logs)
+    insertar(DispositivoEscaneo.__table__, [
+        {"dispositivo_id": ids[ip], **m} for ip, m in metricas.items()
+    ])
+
+    # Un evento por lote y no por dispositivo, para no saturar las colas de los clientes en escaneos grandes.
+    nuevos = [
+        {"id": ids[f["ip"]], "ip": f["ip"], "mac": f["mac"], "nombre": f["nombre"],
+         "fabricante": f["fabricante"], "estado": f["estado"]}
+        for f in filas if f["ip"] not in previos
+    ]
+    if nuevos:
+        publicar_al_confirmar("dispositivos_nuevos", {"dispositivos": nuevos})
+    if logs:
+        ip_por_id = {v: k for k, v in ids.items()}
+        publicar_al_confirmar("cambios_estado", {"cambios": [
+            {
+                "dispositivo_id": l["dispositivo_id"],
+                "ip": ip_por_id[l["dispositivo_id"]],
+                "estado_anterior": l["estado_anterior"],
+                "estado_nuevo": l["estado_nuevo"],
+                "motivo": l["motivo"],
+                "fecha": ahora.isoformat(),
+            }
+            for l in logs
+        ]})
+
+    return len(filas), nuevos_count, vulnerables_count
+
+
+MODOS_ESCANEO = ("completo", "incremental")
+
+
+def _registrar_escaneo(ahora: datetime, modo: str, total: int, vulnerables: int, inicio: float, estado: str) -> Escaneo:
     esc = Escaneo(
         fecha=ahora,
-        total_dispositivos=len(dispositivos_guardados),
-        dispositivos_vulnerables=vulnerables_count,
+        tipo=modo,
+        estado=estado,
+        total_dispositivos=total,
+        dispositivos_vulnerables=vulnerables,
+        duracion_segundos=round(time.time() - inicio, 2),
     )
     db.session.add(esc)
     db.session.commit()
+    return esc
 
-    return jsonify(
-        {
-            "ok": True,
-            "scan": {
-                "fecha": esc.fecha.isoformat(),
-                "total_dispositivos": esc.total_dispositivos,
-                "dispositivos_vulnerables": esc.dispositivos_vulnerables,
-            },
-            "stats": _calcular_stats(Dispositivo.query.all()),
-        }
+
+def ejecutar_scan(trabajo: Optional[TrabajoEscaneo] = None, modo: str = "completo") -> Dict[str, Any]:
+    inicio = time.time()
+    ahora = datetime.utcnow()
+    superficiales: List[Dict[str, Any]] = []
+    objetivos = None
+
+    config = current_app.config
+    segmentos = resolver_segmentos(
+        config.get("SCAN_REDES"),
+        config.get("SCAN_INTERFACES"),
+        max_hosts=int(config.get("SCAN_MAX_HOSTS_RED", MAX_HOSTS_SEGMENTO)),
     )
+    tasa = float(config.get("SCAN_TASA_PPS", ICMP_RATE_DEFAULT))
+    tam_shard = int(config.get("SCAN_TAM_SHARD", TAM_SHARD_DEFAULT))
+    procesos = int(config.get("SCAN_PROCESOS", 1))
+    arp_rapido = bool(config.get("SCAN_ARP_RAPIDO", True))
+    contexto = ContextoEscaneo()
+
+    total_guardados = 0
+    nuevos_count = 0
+    vulnerables_count = 0
+    tam_lote = int(current_app.config.get("SCAN_LOTE_PERSISTENCIA", TAM_LOTE_DEFAULT))
+
+    estado_escaneo = "error"
+    try:
+        if modo == "incremental":
+            presencia = barrer_arp(segmentos, tasa=tasa, tam_shard=tam_shard, rapido=arp_rapido,
+                                   contexto=contexto) if segmentos else {}
+            ttl_horas = float(current_app.config.get("SCAN_INCREMENTAL_TTL_HORAS", 24))
+            objetivos, superficiales = _planificar_incremental(presencia, ahora, ttl_horas)
+            print(f"[INFO] Escaneo incremental: {len(presencia)} presentes, "
+                  f"{len(objetivos)} requieren sondeo completo")
+            if trabajo:
+                trabajo.progreso("Presencia", time.time() - inicio, len(presencia))
+                trabajo.comprobar_cancelacion()
+
+        resultados = escanear_red(
+            red=segmentos,
+            progreso=trabajo.progreso if trabajo else None,
+            cancelar=trabajo.evento_cancelar if trabajo else None,
+            objetivos=objetivos,
+            tasa=tasa,
+            tam_shard=tam_shard,
+            procesos=procesos,
+            arp_rapido=arp_rapido,
+            contexto=contexto,
+        ) if objetivos is None or objetivos else []
+        if trabajo:
+            trabajo.comprobar_cancelacion()
+
+        sondeos_completos = len(resultados)
+        vistos = {r.get("ip") for r in resultados}
+        resultados = list(resultados) + [r for r in superficiales if r["ip"] not in vistos]
+        # Dos MAC distintas en la misma IP salen como dos registros; la tabla guarda uno por IP: el último visto.
+        resultados = list({r["ip"]: r for r in resultados if r.get("ip")}.values())
+
+        ips = [r.get("ip") for r in resultados if r.get("ip")]
+
+        inicio_alcance = time.time()
+        alcance = sondear_alcance(ips, contexto=contexto)
+        if trabajo:
+            trabajo.progreso("Alcance", time.time() - inicio_alcance, len(ips))
+            trabajo.comprobar_cancelacion()
+
+        inicio_persistencia = time.time()
+        for lote in trozos((r for r in resultados if r.get("ip")), tam_lote):
+            if trabajo:
+                trabajo.comprobar_cancelacion()
+            guardados, nuevos, vulnerables = _persistir_lote(lote, alcance, ahora)
+            db.session.commit()
+
+            total_guardados += guardados
+            nuevos_count += nuevos
+            vulnerables_count += vulnerables
+            if trabajo:
+                trabajo.dispositivos_guardados = total_guardados
+        estado_escaneo = "completado"
+    except EscaneoCancelado:
+        estado_escaneo = "cancelado"
+        raise
+    finally:
+        # Cada trozo ya está confirmado: si se corta (en el descubrimiento o a medias de guardar), el escaneo queda
+        # registrado con lo guardado hasta entonces.
+        if estado_escaneo != "completado":
+            db.session.rollback()
+            try:
+                _registrar_escaneo(ahora, modo, total_guardados, vulnerables_count, inicio, estado_escaneo)
+            except Exception as e:
+                db.session.rollback()
+                print(f"[ERROR] No se pudo registrar el escaneo interrumpido: {e}")
+
+    if trabajo:
+        trabajo.progreso("Persistencia", time.time() - inicio_persistencia, total_guardados)
+
+    esc = _registrar_escaneo(ahora, modo, total_guardados, vulnerables_count, inicio, estado_escaneo)
+
+    inicio_mantenimiento = time.time()
+    try:
+        mantenimiento = mantener_historial(current_app.config, ahora)
+        print(f"[INFO] Historial consolidado: {mantenimiento}")
+    except Exception as e:
+        db.session.rollback()
+        print(f"[WARN] No se pudo consolidar el historial: {e}")
+    if trabajo:
+        trabajo.progreso("Consolidación", time.time() - inicio_mantenimiento)
+
+    return {
+        "ok": True,
+        "scan": {
+            "fecha": esc.fecha.isoformat(),
+            "total_dispositivos": esc.total_dispositivos,
+            "dispositivos_vulnerables": esc.dispositivos_vulnerables,
+            "tipo": esc.tipo,
+            "duracion_segundos": esc.duracion_segundos,
+            "sondeos_completos": sondeos_completos,
+            "sondeos_evitados": contexto.resumen()["evitados_total"],
+        },
+        "stats": _calcular_stats(),
+    }
 
 
 @main.route("/ejecutar-scan", methods=["POST"])
 def ejecutar_scan_alias():
-    return ejecutar_scan()
+    datos = request.get_json(silent=True) or {}
+    modo = (request.args.get("modo") or datos.get("modo") or "completo").lower()
+    if modo not in MODOS_ESCANEO:
+        return jsonify({"ok": False, "error": f"modo de escaneo inválido: {modo}"}), 400
+
+    trabajo, creado = iniciar_trabajo(current_app._get_current_object(), ejecutar_scan, tipo=modo, modo=modo)
+    if trabajo is None:
+        return jsonify({"ok": False, "en_curso": True, "error": "hay un escaneo en curso en otro proceso"}), 409
+    return (
+        jsonify({"ok": True, "en_curso": not creado, "job": trabajo.to_dict()}),
+        202,
+        {"Location": url_for("main.api_estado_scan", trabajo_id=trabajo.id)},
+    )
+
+
+@main.route("/api/scans/actual", methods=["GET"])
+def api_scan_actual():
+    trabajo = ultimo_trabajo()
+    return jsonify({"ok": True, "job": trabajo.to_dict() if trabajo else None})
+
+
+@main.route("/api/scans/<trabajo_id>", methods=["GET"])
+def api_estado_scan(trabajo_id: str):
+    trabajo = obtener_trabajo(trabajo_id)
+    if trabajo is None:
+        abort(404)
+    return jsonify({"ok": True, "job": trabajo.to_dict()})
+
+
+@main.route("/api/scans/<trabajo_id>/cancelar", methods=["POST"])
+def api_cancelar_scan(trabajo_id: str):
+    trabajo = obtener_trabajo(trabajo_id)
+    if trabajo is None:
+        abort(404)
+    if not trabajo.terminado:
+        trabajo.cancelar()
+    return jsonify({"ok": True, "job": trabajo.to_dict()}), 202
+
+
+@main.route("/api/eventos", methods=["GET"])
+def api_eventos():
+    ultimo = request.headers.get("Last-Event-ID") or request.args.get("ultimo_id")
+    try:
+        ultimo_id = int(ultimo) if ultimo else None
+    except ValueError:
+        ultimo_id = None
+
+    return current_app.response_class(
+        stream_with_context(stream_sse(ultimo_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@main.route("/api/eventos/estado", methods=["GET"])
+def api_eventos_estado():
+    return jsonify({"ok": True, **bus.estado()})
+
+
+@main.route("/api/programador", methods=["GET"])
+def api_programador():
+    programador = obtener_programador()
+    if programador is None:
+        return jsonify({"ok": True, "programador": {"activo": False}})
+    return jsonify({"ok": True, "programador": programador.estado()})
 
 
 @main.route("/historial", methods=["GET"])
@@ -448,7 +914,8 @@ def historial_escaneos():
 def detalle_dispositivo(dispositivo_id: int):
     d = Dispositivo.query.get_or_404(dispositivo_id)
 
-    traffic_data = []
+    analizador = obtener_analizador()
+    traffic_data = analizador.trafico_dispositivo(d.ip) if analizador else []
     puertos_info = []
 
     return render_template(
@@ -458,32 +925,76 @@ def detalle_dispositivo(dispositivo_id: int):
         puertos_info=puertos_info,
     )
 
+GRANULARIDADES_GRAFICO = {
+    "escaneo": (20, "%d-%m %H:%M"),
+    "hora": (48, "%d-%m %H:00"),
+    "dia": (30, "%d-%m-%Y"),
+}
+
+
 @main.route("/api/dispositivo/<int:dispositivo_id>/chart-data", methods=["GET"])
 def api_dispositivo_chart_data(dispositivo_id: int):
     d = Dispositivo.query.get_or_404(dispositivo_id)
 
-    logs = (
-        DispositivoEscaneo.query
-        .filter_by(dispositivo_id=d.id)
-        .order_by(desc(DispositivoEscaneo.fecha))
-        .limit(20)
-        .all()
-    )
-    logs = list(reversed(logs))  # cronológico
+    granularidad = (request.args.get("granularidad") or "escaneo").lower()
+    if granularidad not in GRANULARIDADES_GRAFICO:
+        return jsonify({"ok": False, "error": f"granularidad inválida: {granularidad}"}), 400
+    limite_defecto, formato = GRANULARIDADES_GRAFICO[granularidad]
+    limite = max(1, min(request.args.get("limite", limite_defecto, type=int), 500))
+
+    if granularidad == "escaneo":
+        logs = (
+            DispositivoEscaneo.query
+            .filter_by(dispositivo_id=d.id)
+            .order_by(desc(DispositivoEscaneo.fecha))
+            .limit(limite)
+            .all()
+        )
+        logs = list(reversed(logs))  # cronológico
 
-    labels = [l.fecha.strftime("%d-%m %H:%M") for l in logs]
-    actividad = [float(getattr(l, "actividad_score", 0.0) or 0.0) for l in logs]
+        labels = [l.fecha.strftime(formato) for l in logs]
+        actividad = [float(getattr(l, "actividad_score", 0.0) or 0.0) for l in logs]
+        extra = {}
+    else:
+        resumenes = (
+            DispositivoEscaneoResumen.query
+            .filter_by(dispositivo_id=d.id, granularidad=granularidad)
+            .order_by(desc(DispositivoEscaneoResumen.periodo))
+            .limit(limite)
+            .all()
+        )
+        resumenes = list(reversed(resumenes))
+
+        labels = [r.periodo.strftime(formato) for r in resumenes]
+        actividad = [round(float(r.actividad_avg or 0.0), 2) for r in resumenes]
+        extra = {
+            "actividad_min": [float(r.actividad_min or 0.0) for r in resumenes],
+            "actividad_max": [float(r.actividad_max or 0.0) for r in resumenes],
+            "rtt_avg": [r.rtt_avg for r in resumenes],
+            "packet_loss_avg": [r.loss_avg for r in resumenes],
+            "consumo_total_mb": [float(r.consumo_total_mb or 0.0) for r in resumenes],
+            "muestras": [r.muestras for r in resumenes],
+        }
 
     last = actividad[-1] if actividad else 0
 
     return jsonify({
         "ok": True,
+        "granularidad": granularidad,
         "labels": labels,
         "actividad_score": actividad,  
         "data": actividad,              
-        "last_value": last              
+        "last_value": last,
+        **extra,
     })
 
+@main.route("/api/trafico/resumen", methods=["GET"])
+def api_trafico_resumen():
+    analizador = obtener_analizador()
+    if analizador is None:
+        return jsonify({"ok": False, "error": "analizador de tráfico no iniciado"}), 503
+    return jsonify({"ok": True, **analizador.resumen()})
+
 @main.route("/dispositivo/<int:dispositivo_id>/renombrar", methods=["POST"])
 def renombrar_dispositivo(dispositivo_id: int):
     d = Dispositivo.query.get_or_404(dispositivo_id)
@@ -520,6 +1031,17 @@ def marcar_seguro_dispositivo(dispositivo_id: int):
     return redirect(url_for("main.detalle_dispositivo", dispositivo_id=d.id))
 
 
+@main.route("/dispositivo/<int:dispositivo_id>/eliminar", methods=["POST"])
+def eliminar_dispositivo(dispositivo_id: int):
+    d = Dispositivo.query.get_or_404(dispositivo_id)
+    for modelo in (EstadoDispositivoLog, DispositivoEscaneo, DispositivoEscaneoResumen):
+        modelo.query.filter_by(dispositivo_id=d.id).delete(synchronize_session=False)
+    # El borrado por ORM deja la lápida (DispositivoEliminado) que los clientes delta usan para quitarlo.
+    db.session.delete(d)
+    db.session.commit()
+    return redirect(url_for("main.listar_dispositivos"))
+
+
 @main.route("/favicon.ico")
 def favicon():
     return ("", 204)
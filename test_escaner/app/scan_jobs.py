@@ -0,0 +1,202 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .events import publicar
+from .models import BloqueoEscaneo
+
+MAX_TRABAJOS_HISTORIAL = 20
+BLOQUEO_TTL_MIN_DEFAULT = 30
+
+
+class EscaneoCancelado(Exception):
+    pass
+
+
+class TrabajoEscaneo:
+    def __init__(self, tipo: str = "completo"):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.estado = "pendiente"
+        self.creado = time.time()
+        self.iniciado = None
+        self.finalizado = None
+        self.etapa_actual = None
+        self.etapas: list[dict] = []
+        self.dispositivos_descubiertos = 0
+        self.dispositivos_guardados = 0
+        self.resultado = None
+        self.error = None
+        self.evento_cancelar = threading.Event()
+        self.ttl_bloqueo = None
+
+    @property
+    def cancelado(self) -> bool:
+        return self.evento_cancelar.is_set()
+
+    @property
+    def terminado(self) -> bool:
+        return self.estado in ("completado", "cancelado", "error")
+
+    def cancelar(self) -> None:
+        self.evento_cancelar.set()
+
+    def comprobar_cancelacion(self) -> None:
+        if self.cancelado:
+            raise EscaneoCancelado()
+
+    def progreso(self, etapa: str, duracion: float = None, dispositivos: int = None) -> None:
+        self.etapas.append({
+            "nombre": etapa,
+            "duracion_segundos": round(duracion, 2) if duracion is not None else None,
+            "dispositivos": dispositivos,
+        })
+        self.etapa_actual = etapa
+        if dispositivos is not None:
+            self.dispositivos_descubiertos = max(self.dispositivos_descubiertos, dispositivos)
+        if self.ttl_bloqueo is not None:
+            # Cada etapa renueva el bloqueo; si el proceso muere, caduca solo y otro puede escanear.
+            _renovar_bloqueo(self.id, self.ttl_bloqueo)
+        publicar("escaneo_progreso", {
+            "id": self.id,
+            "tipo": self.tipo,
+            "etapa": etapa,
+            "etapas": len(self.etapas),
+            "dispositivos_descubiertos": self.dispositivos_descubiertos,
+            "dispositivos_guardados": self.dispositivos_guardados,
+        })
+
+    def to_dict(self) -> dict:
+        fin = self.finalizado or time.time()
+        return {
+            "id": self.id,
+            "tipo": self.tipo,
+            "estado": self.estado,
+            "etapa_actual": self.etapa_actual,
+            "etapas": list(self.etapas),
+            "dispositivos_descubiertos": self.dispositivos_descubiertos,
+            "dispositivos_guardados": self.dispositivos_guardados,
+            "duracion_segundos": round(fin - self.iniciado, 2) if self.iniciado else None,
+            "cancelacion_solicitada": self.cancelado,
+            "resultado": self.resultado,
+            "error": self.error,
+        }
+
+
+_trabajos: "OrderedDict[str, TrabajoEscaneo]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _tomar_bloqueo(propietario: str, ttl: timedelta) -> bool:
+    # _lock solo ve este proceso; la fila de bloqueo la comparten el recargador, varios workers o varias réplicas.
+    t = BloqueoEscaneo.__table__
+    ahora = datetime.utcnow()
+    libre = or_(t.c.propietario.is_(None), t.c.expira < ahora)
+    try:
+        with db.engine.begin() as conn:
+            if conn.execute(t.update().where(t.c.id == 1, libre).values(propietario=propietario, expira=ahora + ttl)).rowcount:
+                return True
+            if conn.execute(select(t.c.id).where(t.c.id == 1)).first() is not None:
+                return False
+            conn.execute(t.insert().values(id=1, propietario=propietario, expira=ahora + ttl))
+            return True
+    except IntegrityError:
+        return False  # otro proceso creó la fila a la vez
+
+
+def _renovar_bloqueo(propietario: str, ttl: timedelta) -> None:
+    t = BloqueoEscaneo.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(t.update().where(t.c.id == 1, t.c.propietario == propietario)
+                         .values(expira=datetime.utcnow() + ttl))
+    except Exception as e:
+        print(f"[WARN] No se pudo renovar el bloqueo del escaneo {propietario}: {e}")
+
+
+def _soltar_bloqueo(propietario: str) -> None:
+    t = BloqueoEscaneo.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(t.update().where(t.c.id == 1, t.c.propietario == propietario)
+                         .values(propietario=None, expira=None))
+    except Exception as e:
+        print(f"[WARN] No se pudo liberar el bloqueo del escaneo {propietario}: {e}")
+
+
+def _ejecutar(app, trabajo: TrabajoEscaneo, funcion, kwargs) -> None:
+    with app.app_context():
+        trabajo.estado = "ejecutando"
+        trabajo.iniciado = time.time()
+        publicar("escaneo_iniciado", {"id": trabajo.id, "tipo": trabajo.tipo})
+        estado = "error"
+        try:
+            trabajo.resultado = funcion(trabajo, **kwargs)
+            estado = "completado"
+        except EscaneoCancelado:
+            db.session.rollback()
+            estado = "cancelado"
+            print(f"[INFO] Escaneo {trabajo.id} cancelado")
+        except Exception as e:
+            db.session.rollback()
+            trabajo.error = str(e)
+            print(f"[ERROR] Escaneo {trabajo.id} falló: {e}")
+        finally:
+            db.session.remove()
+            # El bloqueo se suelta antes de marcar el trabajo como terminado: quien lo vea acabado ya puede escanear.
+            if trabajo.ttl_bloqueo is not None:
+                _soltar_bloqueo(trabajo.id)
+            trabajo.finalizado = time.time()
+            trabajo.estado = estado
+            publicar("escaneo_finalizado", trabajo.to_dict())
+
+
+def trabajo_activo():
+    with _lock:
+        for trabajo in reversed(_trabajos.values()):
+            if not trabajo.terminado:
+                return trabajo
+    return None
+
+
+def iniciar_trabajo(app, funcion, tipo: str = "completo", **kwargs):
+    with _lock:
+        for trabajo in _trabajos.values():
+            if not trabajo.terminado:
+                return trabajo, False
+
+        trabajo = TrabajoEscaneo(tipo=tipo)
+        ttl = timedelta(minutes=float(app.config.get("SCAN_BLOQUEO_TTL_MIN", BLOQUEO_TTL_MIN_DEFAULT)))
+        with app.app_context():
+            if not _tomar_bloqueo(trabajo.id, ttl):
+                print("[INFO] Hay un escaneo en curso en otro proceso")
+                return None, False
+        trabajo.ttl_bloqueo = ttl
+        _trabajos[trabajo.id] = trabajo
+        while len(_trabajos) > MAX_TRABAJOS_HISTORIAL:
+            _trabajos.popitem(last=False)
+
+    hilo = threading.Thread(
+        target=_ejecutar,
+        args=(app, trabajo, funcion, kwargs),
+        name=f"escaneo-{trabajo.id[:8]}",
+        daemon=True,
+    )
+    hilo.start()
+    return trabajo, True
+
+
+def obtener_trabajo(trabajo_id: str):
+    with _lock:
+        return _trabajos.get(trabajo_id)
+
+
+def ultimo_trabajo():
+    with _lock:
+        return next(reversed(_trabajos.values()), None)
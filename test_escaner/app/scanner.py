@@ -1,38 +1,77 @@
+import hashlib
+import multiprocessing
+import os
 import socket
-
-from app.oui_lookup import vendor_from_mac
+import threading
+
+from app import arp_fast
+from app.dns_resolver import resolver_nombres
+from app.host_context import ContextoEscaneo
+from app.objetivos import (
+    TAM_SHARD_DEFAULT, ControlTasa, Segmento, Shard, como_shards, detectar_redes, filtro_bpf, interfaces_de, intercalar,
+    resolver_segmentos, total_hosts,
+)
+from app.observations import MotorFusion
+from app.oui_lookup import vendors_from_macs
 import ipaddress
+import itertools
+import random
 import time
 import select
 import subprocess
-from scapy.all import ARP, Ether, IP, ICMP, sr1, srp, TCP, sniff
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
 
 PUERTOS_CRITICOS = {23, 2323, 7547, 445, 21, 3389}  
 
-def medir_consumo_mb(ip: str, duration: float = 1.5):
-    up_bytes = 0
-    down_bytes = 0
+def medir_consumo_lote(ips, duration: float = 1.5, red_cidr=None, iface=None):
+    # scapy se importa dentro de cada sonda: cargarlo al importar el módulo retrasaba el arranque de la app.
+    from scapy.all import IP, sniff
+
+    up_bytes = dict.fromkeys(ips, 0)
+    down_bytes = dict.fromkeys(ips, 0)
+    if not up_bytes:
+        return {}
+
+    def contar(p):
+        if IP not in p:
+            return
+        try:
+            sz = len(p)
+        except Exception:
+            return
+        src = p[IP].src
+        dst = p[IP].dst
+        if src in up_bytes:
+            up_bytes[src] += sz
+        if dst in down_bytes:
+            down_bytes[dst] += sz
+
+    filtro = "ip"
+    if red_cidr:
+        segmentos = resolver_segmentos(red_cidr)
+        filtro = filtro_bpf(segmentos)
+        iface = iface or interfaces_de(segmentos)
+
     try:
-        pkts = sniff(filter=f"host {ip}", timeout=duration, store=True)
-        for p in pkts:
-            if IP in p:
-                try:
-                    sz = len(p)
-                except Exception:
-                    sz = 0
-                if p[IP].src == ip:
-                    up_bytes += sz
-                elif p[IP].dst == ip:
-                    down_bytes += sz
-    except Exception:
-        return (0.0, 0.0, 0.0)
+        sniff(filter=filtro, timeout=duration, store=False, prn=contar, iface=iface)
+    except Exception as e:
+        print(f"[WARN] No se pudo medir consumo: {e}")
+        return {ip: (0.0, 0.0, 0.0) for ip in up_bytes}
 
     mb = 1024.0 * 1024.0
-    up = round(up_bytes / mb, 3)
-    down = round(down_bytes / mb, 3)
-    total = round((up_bytes + down_bytes) / mb, 3)
-    return (up, down, total)
+    return {
+        ip: (
+            round(up_bytes[ip] / mb, 3),
+            round(down_bytes[ip] / mb, 3),
+            round((up_bytes[ip] + down_bytes[ip]) / mb, 3),
+        )
+        for ip in up_bytes
+    }
+
+
+def medir_consumo_mb(ip: str, duration: float = 1.5):
+    return medir_consumo_lote([ip], duration=duration, red_cidr=ip).get(ip, (0.0, 0.0, 0.0))
 
 
 def clasificar_dispositivo(ip_info, dispositivo_actual=None):
@@ -78,6 +117,12 @@ def obtener_red_local(prefijo_default=24):
         print("[ERROR] No se pudo obtener la IP local.")
         return None
 
+    # Prefijo real de la interfaz según la tabla de rutas; /24 solo si no se puede averiguar.
+    direccion = ipaddress.ip_address(ip_local)
+    for segmento in detectar_redes():
+        if direccion in segmento.red:
+            return str(segmento.red)
+
     try:
         iface = ipaddress.ip_interface(f"{ip_local}/{prefijo_default}")
         return str(iface.network)
@@ -104,39 +149,133 @@ def inferir_tipo_por_nombre(nombre: str) -> str:
         return "Computadora"
     return "Desconocido"
 
-def arp_scan(red_cidr, timeout=1, iface=None, max_hosts=256):
+ARP_RATE_DEFAULT = 500
+
+
+def arp_presencia(objetivo, timeout=1, iface=None, tasa=None, rapido=True):
+    if rapido and arp_fast.disponible():
+        hosts = Segmento(objetivo).hosts() if isinstance(objetivo, str) else objetivo
+        try:
+            return arp_fast.barrer(hosts, iface=iface, tasa=tasa, timeout=timeout)
+        except PermissionError as e:
+            arp_fast.desactivar(e)
+        except OSError as e:
+            print(f"[WARN] Motor ARP rápido falló en {iface or 'interfaz por defecto'}: {e}; se usa scapy")
+
+    from scapy.all import ARP, Ether, srp
+
+    if isinstance(objetivo, str):
+        red = ipaddress.ip_network(objetivo, strict=False)
+        pdst = f"{red.network_address}/{red.prefixlen}"
+    else:
+        pdst = [str(ip) for ip in objetivo]
+        if not pdst:
+            return {}
+
+    paquete = Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=pdst)
+    ans, _ = srp(paquete, timeout=timeout, iface=iface, inter=(1.0 / tasa) if tasa else 0, verbose=0)
+
+    respuestas = {}
+    for _, resp in ans:
+        respuestas.setdefault(resp[ARP].psrc, resp[Ether].src)
+    return respuestas
+
+
+def _tarea_arp(shard, timeout, iface, tasa, rapido):
+    # Corre en un proceso del pool: abre sus propios sockets y devuelve solo tuplas (ip, mac).
+    return list(arp_presencia(list(shard), timeout=timeout, iface=iface or shard.iface, tasa=tasa,
+                              rapido=rapido).items())
+
+
+def _tarea_icmp(shard, rate, timeout, max_duration):
+    return list(icmp_sweep(iter(shard), rate=rate, timeout=timeout, max_duration=max_duration).items())
+
+
+def _en_pool(pool, tarea, shards, parar, *args):
+    futuros = [pool.submit(tarea, shard, *args) for shard in intercalar(shards)]
     try:
-        red = ipaddress.ip_network(red_cidr, strict=False)
-    except Exception as e:
-        print(f"[ERROR] Red inválida para ARP: {e}")
-        return []
+        for futuro in as_completed(futuros):
+            if parar is not None and parar.is_set():
+                break
+            try:
+                yield from futuro.result()
+            except Exception as e:
+                print(f"[WARN] Error en un proceso de barrido: {e}")
+    finally:
+        for futuro in futuros:
+            futuro.cancel()
+
+
+def _sin_conocidos(shards, contexto, campo, sondeo, sabidos):
+    # Quita de cada shard las IPs cuyo `campo` ya está en el contexto; lo sabido se acumula en `sabidos`.
+    for shard in shards:
+        ya, pendientes = contexto.conocidos(shard, campo, sondeo)
+        sabidos.update(ya)
+        if len(pendientes) == len(shard):
+            yield shard
+        elif pendientes:
+            yield Shard(shard.segmento, ips=pendientes)
+
+
+def _resolver_nombres(ips, contexto=None):
+    if contexto is None:
+        return resolver_nombres(ips)
+    nombres, pendientes = contexto.conocidos(dict.fromkeys(ips), "nombre", "dns")
+    if pendientes:
+        nuevos = resolver_nombres(pendientes)
+        contexto.registrar("nombre", {ip: nuevos.get(ip) for ip in pendientes})
+        nombres.update(nuevos)
+    return nombres
+
+
+def barrer_arp(objetivo, timeout=1, iface=None, tasa=ARP_RATE_DEFAULT, tam_shard=TAM_SHARD_DEFAULT, segmentos=(),
+               parar=None, pool=None, rapido=True, contexto=None):
+    shards = como_shards(objetivo, tam_shard, segmentos)
+    sabidos = {}
+    if contexto is not None:
+        shards = _sin_conocidos(shards, contexto, "mac", "arp", sabidos)
+
+    if pool is not None:
+        respuestas = dict(_en_pool(pool, _tarea_arp, list(shards), parar, timeout, iface, tasa, rapido))
+    else:
+        # Recorre el objetivo por shards: nunca hay más de `tam_shard` direcciones en memoria a la vez.
+        respuestas = {}
+        for shard in shards:
+            if parar is not None and parar.is_set():
+                break
+            try:
+                respuestas.update(arp_presencia(list(shard), timeout=timeout, iface=iface or shard.iface, tasa=tasa,
+                                                rapido=rapido))
+            except Exception as e:
+                print(f"[WARN] Error en barrido ARP de {shard}: {e}")
+
+    if contexto is not None:
+        contexto.registrar("mac", respuestas)
+        respuestas.update(sabidos)
+    return respuestas
 
-    print(f"[INFO] ARP scan en {red_cidr}")
 
-    hosts = list(red.hosts())[:max_hosts]
-    if not hosts:
+def arp_scan(red_cidr, timeout=1, iface=None, tasa=ARP_RATE_DEFAULT, tam_shard=TAM_SHARD_DEFAULT, parar=None,
+             pool=None, rapido=True, contexto=None):
+    try:
+        n_hosts = total_hosts(red_cidr)
+    except ValueError as e:
+        print(f"[ERROR] Red inválida para ARP: {e}")
         return []
 
-    rango = f"{red.network_address}/{red.prefixlen}"
-    paquete = Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=rango)
+    print(f"[INFO] ARP scan en {red_cidr if isinstance(red_cidr, str) else f'{n_hosts} hosts'}")
 
-    ans, _ = srp(paquete, timeout=timeout, iface=iface, verbose=0)
+    if not n_hosts:
+        return []
 
     dispositivos = []
-    vistos = set()  
+    respuestas = barrer_arp(red_cidr, timeout=timeout, iface=iface, tasa=tasa, tam_shard=tam_shard, parar=parar,
+                            pool=pool, rapido=rapido, contexto=contexto)
 
-    for _, resp in ans:
-        ip = resp[ARP].psrc
-        mac = resp[Ether].src
-
-        if ip in vistos:
-            continue
-        vistos.add(ip)
+    nombres = _resolver_nombres(respuestas, contexto)
 
-        try:
-            nombre = socket.gethostbyaddr(ip)[0]
-        except Exception:
-            nombre = "Desconocido"
+    for ip, mac in respuestas.items():
+        nombre = nombres.get(ip) or "Desconocido"
 
         tipo = inferir_tipo_por_nombre(nombre)
 
@@ -150,65 +289,118 @@ def arp_scan(red_cidr, timeout=1, iface=None, max_hosts=256):
 
     return dispositivos
 
-def icmp_scan(red_cidr, timeout=0.5, max_duration=30, iface=None):
-    try:
-        red = ipaddress.ip_network(red_cidr, strict=False)
-    except Exception as e:
-        print(f"[ERROR] Red inválida para ICMP: {e}")
-        return []
+ICMP_RATE_DEFAULT = 200
 
-    print(f"[INFO] ICMP scan en {red_cidr}")
-    dispositivos = []
 
-    inicio_scan = time.time()  
+def icmp_sweep(hosts, rate=ICMP_RATE_DEFAULT, timeout=1.0, max_duration=None, parar=None):
+    from scapy.all import ICMP, IP, sr
 
-    for ip in red.hosts():        
-        if time.time() - inicio_scan > max_duration:
+    ident = random.randint(1, 0xFFFF)
+    bloque = max(1, int(rate or 256))
+    inter = (1.0 / rate) if rate else 0
+
+    rtts = {}
+    inicio = time.time()
+    hosts = iter(hosts)
+    seq = 0
+
+    while parar is None or not parar.is_set():
+        if max_duration is not None and time.time() - inicio > max_duration:
             print(f"[INFO] Tiempo máximo de {max_duration}s para ICMP alcanzado. "
                   f"Pasando al siguiente proceso.")
             break
 
-        ip_str = str(ip)
-        paquete = IP(dst=ip_str) / ICMP()
+        paquetes = []
+        for ip in itertools.islice(hosts, bloque):
+            paquetes.append(IP(dst=str(ip)) / ICMP(id=ident, seq=seq & 0xFFFF))
+            seq += 1
+        if not paquetes:
+            break
 
         try:
-            
-            respuesta = sr1(paquete, timeout=timeout, verbose=0)
-            if not respuesta:
+            ans, _ = sr(paquetes, timeout=timeout, inter=inter, verbose=0)
+        except Exception as e:
+            print(f"[WARN] Error en barrido ICMP: {e}")
+            break
+
+        for enviado, resp in ans:
+            if ICMP not in resp or resp[ICMP].type != 0 or resp[ICMP].id != ident:
                 continue
+            ip = resp[IP].src
+            if ip not in rtts:
+                rtts[ip] = round((resp.time - enviado.sent_time) * 1000.0, 2)
 
-            try:
-                nombre = socket.gethostbyaddr(ip_str)[0]
-            except Exception:
-                nombre = "Desconocido"
+    return rtts
 
-            mac = obtener_mac_por_arp(ip_str, timeout=0.7, iface=iface)
 
-            puertos_abiertos = escanear_puertos_basico(ip_str, timeout=0.3)
-            tipo = inferir_tipo_por_puertos(puertos_abiertos)  
+def seguimiento_hosts(dispositivos, iface=None, perfil_puertos="comunes", segmentos=(), contexto=None):
+    nombres = _resolver_nombres((d["ip"] for d in dispositivos), contexto)
 
-            dispositivos.append({
-                "ip": ip_str,
-                "mac": mac,
-                "nombre": nombre,
-                "tipo": tipo,
-                "puertos": puertos_abiertos,
-                "origen": "ICMP"
-            })
-        
-        except Exception:
-            
-            continue
+    # Una sola pasada ARP por shard en vez de una petición bloqueante por host.
+    sin_mac = [d["ip"] for d in dispositivos if not d.get("mac")]
+    macs = barrer_arp(sin_mac, timeout=0.7, iface=iface, segmentos=segmentos, contexto=contexto) if sin_mac else {}
 
+    for d in dispositivos:
+        d["nombre"] = nombres.get(d["ip"]) or "Desconocido"
+        if not d.get("mac"):
+            d["mac"] = macs.get(d["ip"])
+
+    iface = iface or interfaces_de(segmentos)
+    puertos = _puertos_con_contexto([d["ip"] for d in dispositivos], perfil_puertos, 0.5, iface, contexto)
+    for d in dispositivos:
+        d["puertos"] = puertos.get(d["ip"], [])
+        d["tipo"] = inferir_tipo_por_puertos(d["puertos"])
+
+    return dispositivos
+
+
+def icmp_scan(red_cidr, timeout=0.5, max_duration=30, iface=None, rate=ICMP_RATE_DEFAULT, seguimiento=True,
+              perfil_puertos="comunes", tam_shard=TAM_SHARD_DEFAULT, parar=None, pool=None, contexto=None):
+    try:
+        shards = list(como_shards(red_cidr, tam_shard))
+    except ValueError as e:
+        print(f"[ERROR] Red inválida para ICMP: {e}")
+        return []
+
+    n_hosts = sum(len(s) for s in shards)
+    print(f"[INFO] ICMP scan en {red_cidr if isinstance(red_cidr, str) else f'{n_hosts} hosts'}")
+
+    sabidos = {}
+    pendientes = list(_sin_conocidos(shards, contexto, "rtt_ms", "icmp", sabidos)) if contexto is not None else shards
+
+    if pool is not None:
+        rtts = dict(_en_pool(pool, _tarea_icmp, pendientes, parar, rate, timeout, max_duration))
+    else:
+        hosts = itertools.chain.from_iterable(pendientes)
+        rtts = icmp_sweep(hosts, rate=rate, timeout=timeout, max_duration=max_duration, parar=parar)
+
+    if contexto is not None:
+        contexto.registrar("rtt_ms", rtts)
+        rtts.update(sabidos)
+
+    dispositivos = [
+        {
+            "ip": ip,
+            "mac": None,
+            "nombre": "Desconocido",
+            "tipo": "Desconocido",
+            "puertos": [],
+            "rtt_ms": rtt,
+            "origen": "ICMP",
+        }
+        for ip, rtt in rtts.items()
+    ]
+
+    if seguimiento:
+        segmentos = list({id(s.segmento): s.segmento for s in shards if s.segmento is not None}.values())
+        seguimiento_hosts(dispositivos, iface=iface, perfil_puertos=perfil_puertos, segmentos=segmentos,
+                          contexto=contexto)
 
     return dispositivos
 
 def obtener_mac_por_arp(ip, timeout=1, iface=None):
     try:
-        paquete = Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=ip)
-        ans, _ = srp(paquete, timeout=timeout, iface=iface, verbose=0)
-        for _, respuesta in ans:
-            return respuesta[Ether].src
+        return arp_presencia([ip], timeout=timeout, iface=iface).get(str(ip))
     except Exception:
         pass
     return None
@@ -311,18 +503,117 @@ def upnp_scan(timeout=3):
 
 PUERTOS_COMUNES = [80, 443, 554, 8008, 8080, 23, 22, 445, 9100]
 
-def escanear_puertos_basico(ip, timeout=0.4):
-    abiertos = []
-    for port in PUERTOS_COMUNES:
-        pkt = IP(dst=ip) / TCP(dport=port, flags="S")
-        resp = sr1(pkt, timeout=timeout, verbose=0)
-        if resp and resp.haslayer(TCP):
-            flags = resp[TCP].flags
-            
-            if flags & 0x12 == 0x12:
-                abiertos.append(port)
+PUERTOS_TOP_100 = [
+    7, 9, 13, 21, 22, 23, 25, 26, 37, 53, 79, 80, 81, 88, 106, 110, 111, 113, 119, 135,
+    139, 143, 144, 179, 199, 389, 427, 443, 444, 445, 465, 513, 514, 515, 543, 544, 548,
+    554, 587, 631, 646, 873, 990, 993, 995, 1025, 1026, 1027, 1028, 1029, 1110, 1433,
+    1720, 1723, 1755, 1900, 2000, 2001, 2049, 2121, 2717, 3000, 3128, 3306, 3389, 3986,
+    4899, 5000, 5009, 5051, 5060, 5101, 5190, 5357, 5432, 5631, 5666, 5800, 5900, 6000,
+    6001, 6646, 7070, 8000, 8008, 8009, 8080, 8081, 8443, 8888, 9100, 9999, 10000, 32768,
+    49152, 49153, 49154, 49155, 49156, 49157,
+]
+
+PERFILES_PUERTOS = {
+    "comunes": PUERTOS_COMUNES,
+    "criticos": sorted(PUERTOS_CRITICOS),
+    "top100": PUERTOS_TOP_100,
+}
+
+SYN_RATE_DEFAULT = 1000
+
+_SYN_SECRETO = os.urandom(16)
+
+
+def resolver_puertos(perfil="comunes"):
+    if perfil is None:
+        return list(PUERTOS_COMUNES)
+    if isinstance(perfil, str):
+        if perfil not in PERFILES_PUERTOS:
+            raise ValueError(f"Perfil de puertos desconocido: {perfil}")
+        return list(PERFILES_PUERTOS[perfil])
+    return sorted({int(p) for p in perfil if 0 < int(p) < 65536})
+
+
+def _cookie_syn(ip, puerto, sport):
+    h = hashlib.blake2b(f"{ip}:{puerto}:{sport}".encode(), key=_SYN_SECRETO, digest_size=4)
+    return int.from_bytes(h.digest(), "big")
+
+
+def escanear_puertos_syn(hosts, puertos="comunes", rate=SYN_RATE_DEFAULT, timeout=1.0, iface=None):
+    from scapy.all import IP, TCP, AsyncSniffer, conf
+
+    hosts = [str(h) for h in hosts]
+    puertos = resolver_puertos(puertos)
+    abiertos = {ip: set() for ip in hosts}
+    if not hosts or not puertos:
+        return {ip: [] for ip in hosts}
+
+    sport = random.randint(40000, 60000)
+
+    def procesar(resp):
+        if IP not in resp or TCP not in resp:
+            return
+        ip = resp[IP].src
+        puerto = resp[TCP].sport
+        if ip not in abiertos:
+            return
+        if (resp[TCP].ack - 1) & 0xFFFFFFFF != _cookie_syn(ip, puerto, sport):
+            return
+        if resp[TCP].flags & 0x12 == 0x12:
+            abiertos[ip].add(puerto)
+
+    listo = threading.Event()
+    sniffer = AsyncSniffer(
+        filter=f"tcp and dst port {sport}",
+        prn=procesar,
+        store=False,
+        iface=iface,
+        started_callback=listo.set,
+    )
+    sniffer.start()
+    listo.wait(2.0)
+
+    intervalo = (1.0 / rate) if rate else 0
+    sock = conf.L3socket()
+    try:
+        inicio = time.time()
+        enviados = 0
+        for puerto in puertos:
+            for ip in hosts:
+                sock.send(IP(dst=ip) / TCP(sport=sport, dport=puerto, flags="S",
+                                           seq=_cookie_syn(ip, puerto, sport)))
+                enviados += 1
+                adelanto = inicio + enviados * intervalo - time.time()
+                if adelanto > 0:
+                    time.sleep(adelanto)
+        time.sleep(timeout)
+    except Exception as e:
+        print(f"[WARN] Error en escaneo SYN: {e}")
+    finally:
+        sock.close()
+        try:
+            sniffer.stop()
+        except Exception:
+            pass
+
+    return {ip: sorted(p) for ip, p in abiertos.items()}
+
+
+def _puertos_con_contexto(hosts, puertos, timeout, iface, contexto):
+    if contexto is None:
+        return escanear_puertos_syn(hosts, puertos, timeout=timeout, iface=iface)
+    lista = resolver_puertos(puertos)
+    abiertos, pendientes = contexto.conocidos(dict.fromkeys(hosts), "puertos", "puertos", puertos=lista)
+    if pendientes:
+        nuevos = escanear_puertos_syn(pendientes, lista, timeout=timeout, iface=iface)
+        contexto.registrar("puertos", {ip: {p: p in nuevos.get(ip, ()) for p in lista} for ip in pendientes})
+        abiertos.update(nuevos)
     return abiertos
 
+
+def escanear_puertos_basico(ip, timeout=0.4, puertos="comunes"):
+    return escanear_puertos_syn([str(ip)], puertos, timeout=timeout).get(str(ip), [])
+
 def inferir_tipo_por_puertos(open_ports):
     if 9100 in open_ports:
         return "Impresora"
@@ -368,34 +659,51 @@ def mdns_scan(timeout=2):
 
     return dispositivos
 
-def netbios_scan(red_cidr):
-    try:
-        red = ipaddress.ip_network(red_cidr, strict=False)
-    except Exception:
-        return []
+NETBIOS_RATE_DEFAULT = 200
 
-    dispositivos = []
 
-    for ip in red.hosts():
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.settimeout(0.3)
+def netbios_scan(red_cidr, timeout=0.3, tasa=NETBIOS_RATE_DEFAULT, tam_shard=TAM_SHARD_DEFAULT, parar=None):
+    try:
+        shards = list(como_shards(red_cidr, tam_shard))
+    except ValueError:
+        return []
 
-        mensaje = b"\x80" + b"\x00" * 49  
+    dispositivos = {}
+    mensaje = b"\x80" + b"\x00" * 49
+    control = ControlTasa(tasa)
 
-        try:
-            sock.sendto(mensaje, (str(ip), 137))
-            data, addr = sock.recvfrom(1024)
+    # Un único socket: se envía a ritmo controlado y las respuestas se recogen mientras tanto.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
 
-            dispositivos.append({
-                "ip": addr[0],
-                "mac": None,
-                "nombre": "NetBIOS device"
-            })
+    def recoger(espera):
+        fin = time.time() + espera
+        while True:
+            ready, _, _ = select.select([sock], [], [], max(0.0, fin - time.time()))
+            if not ready:
+                return
+            try:
+                _data, addr = sock.recvfrom(1024)
+            except OSError:
+                continue
+            dispositivos.setdefault(addr[0], {"ip": addr[0], "mac": None, "nombre": "NetBIOS device"})
 
-        except Exception:
-            pass
+    try:
+        for shard in shards:
+            if parar is not None and parar.is_set():
+                break
+            for ip in shard:
+                control.esperar()
+                try:
+                    sock.sendto(mensaje, (ip, 137))
+                except OSError:
+                    pass
+            recoger(0)
+        recoger(timeout)
+    finally:
+        sock.close()
 
-    return dispositivos
+    return list(dispositivos.values())
 
 def analizar_dispositivo(ip):
     analisis = {}
@@ -440,100 +748,154 @@ def analizar_dispositivo(ip):
 
     return analisis
 
-def escanear_red():
-    red = obtener_red_local()
-    if not red:
-        return []
-
-    print(f"[INFO] Escaneando red: {red}")
+ETAPA_DEADLINE_DEFAULT = 90.0
 
-    arp = arp_scan(red)
-    icmp = icmp_scan(red, timeout=0.5, max_duration=30)
-    upnp = upnp_scan()
-    mdns = mdns_scan()
-    nb = netbios_scan(red)
 
-    dispositivos = fusionar_por_ip(arp, icmp, upnp, mdns, nb)
+def _cronometrar(nombre, funcion):
+    inicio = time.time()
+    try:
+        resultado = funcion() or []
+    except Exception as e:
+        print(f"[WARN] Etapa {nombre} falló: {e}")
+        resultado = []
+    return resultado, time.time() - inicio
 
-    print(f"[INFO] Dispositivos fusionados: {len(dispositivos)}")
 
-    return dispositivos
+def _crear_pool(procesos, n_shards):
+    # Un proceso por núcleo (o los indicados), nunca más que shards haya. Con 1 se barre en este proceso.
+    procesos = min(procesos or os.cpu_count() or 1, n_shards)
+    if procesos <= 1:
+        return None, 1
+    # Nunca fork: este proceso tiene hilos (Flask, programador, bus SSE) y un hijo podría heredar un lock tomado.
+    metodo = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context(metodo)), procesos
 
-if __name__ == "__main__":
-    dispositivos = escanear_red()
-    for d in dispositivos:
-        print(d)
 
-def fusionar_por_ip(*listas):
-    fusion = {}
+def _solo_objetivos(funcion, objetivos):
+    permitidos = set(objetivos)
+    return lambda: [d for d in (funcion() or []) if d.get("ip") in permitidos]
 
-    def mejor_nombre(actual, nuevo):
-        if not actual or actual == "Desconocido":
-            return nuevo
-        if nuevo and nuevo != "Desconocido" and len(nuevo) > len(actual):
-            return nuevo
-        return actual
 
-    def mejor_tipo(actual, nuevo):
-        if not actual or actual == "Desconocido":
-            return nuevo
-        if nuevo and nuevo != "Desconocido" and len(nuevo) > len(actual):
-            return nuevo
-        return actual
+def escanear_red(red=None, deadline=None, max_workers=5, progreso=None, cancelar=None, objetivos=None,
+                 interfaces=None, tasa=ICMP_RATE_DEFAULT, tam_shard=TAM_SHARD_DEFAULT, procesos=1, arp_rapido=True,
+                 contexto=None):
+    red = resolver_segmentos(red, interfaces)
+    if not red:
+        return []
 
-    for lista in listas:
-        if not lista:
-            continue
+    if objetivos is not None:
+        objetivos = [str(ip) for ip in objetivos]
+        if not objetivos:
+            return []
+        destino = list(como_shards(objetivos, tam_shard, red))
+        print(f"[INFO] Escaneando {len(objetivos)} hosts de las redes {', '.join(map(str, red))}")
+    else:
+        destino = red
+        print(f"[INFO] Escaneando redes: {', '.join(f'{s} ({len(s)} hosts)' for s in red)}")
+
+    # El presupuesto crece con el tamaño: a `tasa` paquetes/s una /16 no cabe en los 90 s de una /24.
+    n_hosts = total_hosts(destino)
+    barrido = 1.5 * n_hosts / tasa if tasa else 0
+    if deadline is None:
+        deadline = ETAPA_DEADLINE_DEFAULT + barrido
+    parar = threading.Event()
+    contexto = contexto if contexto is not None else ContextoEscaneo()
+
+    procesos_pool, procesos = _crear_pool(procesos, sum(1 for _ in como_shards(destino, tam_shard)))
+    tasa_barrido = tasa
+    if procesos_pool is not None and tasa:
+        # Los procesos que comparten interfaz se reparten su tasa para no superar la configurada en el cable.
+        n_ifaces = len({s.iface for s in red})
+        tasa_barrido = min(tasa, tasa * n_ifaces / procesos)
+        print(f"[INFO] Barrido ARP/ICMP repartido en {procesos} procesos ({tasa_barrido:.0f} paquetes/s cada uno)")
+
+    etapas = {
+        "ARP": lambda: arp_scan(destino, tasa=tasa_barrido, tam_shard=tam_shard, parar=parar, pool=procesos_pool,
+                                rapido=arp_rapido, contexto=contexto),
+        "ICMP": lambda: icmp_scan(destino, timeout=0.5, max_duration=30 + barrido, rate=tasa_barrido,
+                                  tam_shard=tam_shard, parar=parar, pool=procesos_pool, contexto=contexto),
+        "UPnP": upnp_scan,
+        "mDNS": mdns_scan,
+        "NetBIOS": lambda: netbios_scan(destino, tasa=tasa, tam_shard=tam_shard, parar=parar),
+    }
+    if objetivos is not None:
+        etapas["UPnP"] = _solo_objetivos(upnp_scan, objetivos)
+        etapas["mDNS"] = _solo_objetivos(mdns_scan, objetivos)
+
+    fusion = MotorFusion()
+    duraciones = {}
+    inicio = time.time()
+    limite = inicio + deadline
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="descubrimiento")
+    futuros = {pool.submit(_cronometrar, nombre, fn): nombre for nombre, fn in etapas.items()}
+    pendientes = set(futuros)
+    try:
+        while pendientes:
+            if cancelar is not None and cancelar.is_set():
+                print("[INFO] Escaneo cancelado. Se descartan las etapas en curso.")
+                return []
+
+            restante = limite - time.time()
+            if restante <= 0:
+                print(f"[WARN] Deadline de {deadline}s alcanzado. Etapas sin terminar: "
+                      f"{', '.join(futuros[f] for f in pendientes)}")
+                break
 
-        for d in lista:
-            ip = d.get("ip")
-            if not ip:
-                continue
+            hechos, pendientes = wait(pendientes, timeout=min(restante, 0.5), return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                nombre = futuros[futuro]
+                lista, duracion = futuro.result()
+                duraciones[nombre] = duracion
+                fusion.agregar_dicts(lista)
 
-            if ip not in fusion:
-                fusion[ip] = {
-                    "ip": ip,
-                    "mac": d.get("mac"),
-                    "nombre": d.get("nombre") or "Desconocido",
-                    "tipo": d.get("tipo") or "Desconocido",
-                    "puertos": d.get("puertos") or [],
-                    "origenes": [d.get("origen", "desconocido")],
-                }
-                continue
+                print(f"[INFO] Etapa {nombre}: {len(lista)} dispositivos en {duracion:.2f}s")
+                if progreso:
+                    progreso(nombre, duracion, len(fusion))
+    finally:
+        parar.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        if procesos_pool is not None:
+            procesos_pool.shutdown(wait=False, cancel_futures=True)
 
-            f = fusion[ip]
+    dispositivos = _completar_fusion(fusion, red=red)
 
-            if not f["mac"] and d.get("mac"):
-                f["mac"] = d["mac"]
+    print(f"[INFO] Dispositivos fusionados: {len(dispositivos)} "
+          f"en {time.time() - inicio:.2f}s "
+          f"({', '.join(f'{n}={d:.1f}s' for n, d in duraciones.items())})")
+    resumen = contexto.resumen()
+    if resumen["evitados_total"]:
+        print(f"[INFO] Sondeos evitados por el contexto del escaneo: {resumen['evitados']}")
 
-            f["nombre"] = mejor_nombre(f["nombre"], d.get("nombre"))
+    return dispositivos
 
-            f["tipo"] = mejor_tipo(f["tipo"], d.get("tipo"))
+def _completar_fusion(fusion, red=None):
+    consumos = medir_consumo_lote(fusion.ips(), duration=1.2, red_cidr=red)
+    fabricantes = vendors_from_macs(o.mac for o in fusion)
 
-            if d.get("puertos"):
-                for p in d["puertos"]:
-                    if p not in f["puertos"]:
-                        f["puertos"].append(p)
+    for o in fusion:
+        o.consumo_upload_mb, o.consumo_download_mb, o.consumo_total_mb = consumos.get(o.ip, (0.0, 0.0, 0.0))
 
-            nuevo_origen = d.get("origen", "desconocido")
-            if nuevo_origen not in f["origenes"]:
-                f["origenes"].append(nuevo_origen)
+        vendor = fabricantes.get(o.mac)
+        if vendor:
+            o.fabricante = vendor
+            if (o.nombre or "").strip().lower() in ("", "desconocido"):
+                o.nombre = vendor
+            if (o.tipo or "").strip().lower() in ("", "desconocido"):
+                o.tipo = inferir_tipo_por_nombre(o.nombre)
 
+    return fusion.resultados()
 
-    for ip, f in fusion.items():
-        up_mb, down_mb, total_mb = medir_consumo_mb(ip, duration=1.2)
-        f['consumo_upload_mb'] = up_mb
-        f['consumo_download_mb'] = down_mb
-        f['consumo_total_mb'] = total_mb
 
-        mac = f.get("mac") or ""
-        vendor = vendor_from_mac(mac) if mac else None
-        if vendor:
-            f["fabricante"] = vendor
-            if (f.get("nombre") or "").strip().lower() in ("", "desconocido"):
-                f["nombre"] = vendor
-            if (f.get("tipo") or "").strip().lower() in ("", "desconocido"):
-                f["tipo"] = inferir_tipo_por_nombre(f.get("nombre"))
+def fusionar_por_ip(*listas, red=None, por_mac=True):
+    # Con por_mac, una misma MAC vista en varias IPs (renovación DHCP) se fusiona en un solo dispositivo.
+    fusion = MotorFusion(por_mac=por_mac)
+    for lista in listas:
+        fusion.agregar_dicts(lista)
+    return _completar_fusion(fusion, red=red)
 
 
-    return list(fusion.values())
+if __name__ == "__main__":
+    dispositivos = escanear_red()
+    for d in dispositivos:
+        print(d)
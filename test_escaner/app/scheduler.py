@@ -0,0 +1,99 @@
+import random
+import threading
+import time
+
+from .scan_jobs import iniciar_trabajo, trabajo_activo
+
+
+class ProgramadorEscaneos:
+    def __init__(self, app, funcion, intervalos: dict, jitter: float = 0.1):
+        self.app = app
+        self.funcion = funcion
+        self.intervalos = {modo: float(s) for modo, s in intervalos.items() if s and float(s) > 0}
+        self.jitter = max(0.0, min(float(jitter), 0.5))
+        self.proximos: dict = {}
+        self.ultimos: dict = {}
+        self.omitidos = 0
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def _siguiente(self, modo: str, desde: float) -> float:
+        intervalo = self.intervalos[modo]
+        return desde + intervalo * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def iniciar(self) -> None:
+        if self._hilo is not None or not self.intervalos:
+            return
+        ahora = time.time()
+        self.proximos = {modo: self._siguiente(modo, ahora) for modo in self.intervalos}
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="programador-escaneos", daemon=True)
+        self._hilo.start()
+        print(f"[INFO] Programador de escaneos iniciado ({', '.join(f'{m}={s:.0f}s' for m, s in self.intervalos.items())})")
+
+    def detener(self) -> None:
+        self._parar.set()
+        self._hilo = None
+
+    def _bucle(self) -> None:
+        while not self._parar.is_set():
+            espera = max(0.0, min(self.proximos.values()) - time.time())
+            if self._parar.wait(min(espera, 60.0)):
+                return
+            self.tick()
+
+    def tick(self) -> None:
+        ahora = time.time()
+        vencidos = [modo for modo, t in self.proximos.items() if t <= ahora]
+        if not vencidos:
+            return
+
+        # Un escaneo completo cubre al incremental: si ambos vencen juntos se ejecuta solo el completo.
+        modo = "completo" if "completo" in vencidos else vencidos[0]
+
+        # Las ejecuciones perdidas no se recuperan: se reprograman a partir de ahora.
+        for m in vencidos:
+            self.proximos[m] = self._siguiente(m, ahora)
+
+        if trabajo_activo() is not None:
+            self.omitidos += 1
+            print(f"[INFO] Escaneo programado '{modo}' omitido: hay un escaneo en curso")
+            return
+
+        trabajo, creado = iniciar_trabajo(self.app, self.funcion, tipo=modo, modo=modo)
+        if creado:
+            self.ultimos[modo] = {"trabajo_id": trabajo.id, "inicio": ahora}
+            print(f"[INFO] Escaneo programado '{modo}' iniciado ({trabajo.id})")
+        else:
+            self.omitidos += 1
+
+    def estado(self) -> dict:
+        return {
+            "activo": self._hilo is not None,
+            "intervalos_segundos": dict(self.intervalos),
+            "jitter": self.jitter,
+            "proximos": {m: t for m, t in self.proximos.items()},
+            "ultimos": dict(self.ultimos),
+            "omitidos": self.omitidos,
+        }
+
+
+programador = None
+
+
+def iniciar_programador(app, funcion):
+    global programador
+    if programador is not None:
+        return programador
+
+    intervalos = {
+        "incremental": app.config.get("SCAN_INCREMENTAL_INTERVALO_MIN", 0) * 60,
+        "completo": app.config.get("SCAN_COMPLETO_INTERVALO_MIN", 0) * 60,
+    }
+    programador = ProgramadorEscaneos(app, funcion, intervalos, jitter=app.config.get("SCAN_JITTER", 0.1))
+    programador.iniciar()
+    return programador
+
+
+def obtener_programador():
+    return programador
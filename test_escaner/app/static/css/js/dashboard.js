@@ -1,5 +1,6 @@
 document.addEventListener("DOMContentLoaded", () => {
   const btnScan = document.getElementById("btn-escanear");
+  const btnCancelar = document.getElementById("btn-cancelar-escaneo");
 
   const estadoVacio = document.getElementById("estado-vacio");
   const estadoResultado = document.getElementById("estado-resultado");
@@ -13,6 +14,7 @@ document.addEventListener("DOMContentLoaded", () => {
   const progresoBarra = document.getElementById("progreso-barra");
 
   const tablaBody = document.getElementById("tabla-dispositivos-body");
+  const btnCargarMas = document.getElementById("btn-cargar-mas");
   const historialBody = document.getElementById("tabla-historial-body");
 
   function badgeEstado(estado) {
@@ -38,30 +40,48 @@ document.addEventListener("DOMContentLoaded", () => {
       .replaceAll("'", "&#039;");
   }
 
-  function renderDispositivos(dispositivos) {
+  let siguienteCursor = btnCargarMas ? (btnCargarMas.dataset.siguiente || null) : null;
+
+  function setSiguiente(cursor) {
+    siguienteCursor = cursor || null;
+    if (btnCargarMas) btnCargarMas.classList.toggle("hidden", !siguienteCursor);
+  }
+
+  function filaDispositivo(d) {
+    const fabricante = d.fabricante || "Desconocido";
+    const nombre = d.nombre || "Desconocido";
+    const mac = d.mac || "MAC desconocida";
+
+    const tr = document.createElement("tr");
+    tr.dataset.id = d.id;
+    tr.innerHTML = `
+      <td class="px-6 py-3 text-sm text-gray-200">${escapeHtml(d.ip)}</td>
+      <td class="px-6 py-3 text-sm text-gray-200">${escapeHtml(mac)}</td>
+      <td class="px-6 py-3 text-sm text-gray-200 max-w-[180px] truncate" title="${escapeHtml(fabricante)}">${escapeHtml(fabricante)}</td>
+      <td class="px-6 py-3 text-sm text-gray-200">${escapeHtml(nombre)}</td>
+      <td class="px-6 py-3 text-sm">${badgeEstado(d.estado)}</td>
+      <td class="px-6 py-3 text-sm">
+        <a href="/dispositivo/${d.id}"
+           class="inline-flex items-center rounded-lg bg-primary px-3 py-1 text-xs font-semibold text-white hover:bg-primary/90">
+          Ver detalle
+        </a>
+      </td>
+    `;
+    return tr;
+  }
+
+  function quitarFila(id) {
+    const tr = tablaBody ? tablaBody.querySelector(`tr[data-id="${id}"]`) : null;
+    if (tr) tr.remove();
+  }
+
+  function renderDispositivos(dispositivos, anexar = false) {
     if (!tablaBody) return;
-    tablaBody.innerHTML = "";
+    if (!anexar) tablaBody.innerHTML = "";
 
     dispositivos.forEach((d) => {
-      const fabricante = d.fabricante || "Desconocido";
-      const nombre = d.nombre || "Desconocido";
-      const mac = d.mac || "MAC desconocida";
-
-      const tr = document.createElement("tr");
-      tr.innerHTML = `
-        <td class="px-6 py-3 text-sm text-gray-200">${escapeHtml(d.ip)}</td>
-        <td class="px-6 py-3 text-sm text-gray-200">${escapeHtml(mac)}</td>
-        <td class="px-6 py-3 text-sm text-gray-200 max-w-[180px] truncate" title="${escapeHtml(fabricante)}">${escapeHtml(fabricante)}</td>
-        <td class="px-6 py-3 text-sm text-gray-200">${escapeHtml(nombre)}</td>
-        <td class="px-6 py-3 text-sm">${badgeEstado(d.estado)}</td>
-        <td class="px-6 py-3 text-sm">
-          <a href="/dispositivo/${d.id}"
-             class="inline-flex items-center rounded-lg bg-primary px-3 py-1 text-xs font-semibold text-white hover:bg-primary/90">
-            Ver detalle
-          </a>
-        </td>
-      `;
-      tablaBody.appendChild(tr);
+      quitarFila(d.id);
+      tablaBody.appendChild(filaDispositivo(d));
     });
   }
 
@@ -83,37 +103,188 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   }
 
-  async function refreshDashboard() {
-    const res = await fetch("/api/dashboard-data", { headers: { "Accept": "application/json" } });
-    if (!res.ok) throw new Error("No se pudo cargar /api/dashboard-data");
+  let cursorSync = null;
+  let etagSync = null;
 
-    const data = await res.json();
+  // Los filtros de la página (estado, riesgo, tipo...) acompañan a cada petición del listado.
+  function conFiltros(ruta, extra = {}) {
+    const params = new URLSearchParams(window.location.search);
+    params.delete("cursor");
+    params.delete("since");
+    Object.entries(extra).forEach(([k, v]) => params.set(k, v));
+    const qs = params.toString();
+    return qs ? `${ruta}?${qs}` : ruta;
+  }
 
-    const hay = (data.dispositivos || []).length > 0;
+  function renderStats(stats) {
+    const hay = (stats?.total ?? 0) > 0;
     if (estadoVacio) estadoVacio.classList.toggle("hidden", hay);
     if (estadoResultado) estadoResultado.classList.toggle("hidden", !hay);
 
-    if (statTotal) statTotal.textContent = data.stats?.total ?? 0;
-    if (statVulnerables) statVulnerables.textContent = data.stats?.vulnerables ?? 0;
-    if (statNuevos) statNuevos.textContent = data.stats?.nuevos ?? 0;
+    if (statTotal) statTotal.textContent = stats?.total ?? 0;
+    if (statVulnerables) statVulnerables.textContent = stats?.vulnerables ?? 0;
+    if (statNuevos) statNuevos.textContent = stats?.nuevos ?? 0;
+    return hay;
+  }
+
+  function aplicarCompleto(data) {
+    const hay = renderStats(data.stats);
 
     if (progresoTexto) progresoTexto.textContent = hay ? "Escaneo completado." : "Preparando escaneo...";
     if (progresoPorcentaje) progresoPorcentaje.textContent = hay ? "100%" : "0%";
     if (progresoBarra) progresoBarra.style.width = hay ? "100%" : "0%";
 
     renderDispositivos(data.dispositivos || []);
+    setSiguiente(data.siguiente);
     renderHistorial(data.ultimos_escaneos || []);
   }
 
+  function aplicarDelta(data) {
+    renderStats(data.stats);
+
+    // Llegan ordenados por versión: el último cambio queda arriba, igual que el orden por último escaneo.
+    if (tablaBody) {
+      const maximo = Math.max(data.limite || 0, tablaBody.rows.length);
+      (data.dispositivos || []).forEach((d) => {
+        quitarFila(d.id);
+        tablaBody.prepend(filaDispositivo(d));
+      });
+      (data.eliminados || []).forEach(quitarFila);
+      while (tablaBody.rows.length > maximo) tablaBody.lastElementChild.remove();
+    }
+    if (data.ultimos_escaneos) renderHistorial(data.ultimos_escaneos);
+  }
+
+  async function sincronizar() {
+    const url = cursorSync ? conFiltros("/api/dashboard-data", { since: cursorSync }) : conFiltros("/api/dashboard-data");
+    const headers = { "Accept": "application/json" };
+    if (etagSync) headers["If-None-Match"] = etagSync;
+
+    const res = await fetch(url, { headers, cache: "no-store" });
+    if (res.status === 304) return;
+    if (!res.ok) throw new Error("No se pudo cargar /api/dashboard-data");
+
+    const data = await res.json();
+    if (data.delta) {
+      aplicarDelta(data);
+    } else {
+      aplicarCompleto(data);
+    }
+    cursorSync = data.cursor;
+    etagSync = res.headers.get("ETag");
+  }
+
+  async function refreshDashboard() {
+    cursorSync = null;
+    etagSync = null;
+    await sincronizar();
+  }
+
+  async function cargarMas() {
+    if (!siguienteCursor) return;
+    btnCargarMas.disabled = true;
+    try {
+      const res = await fetch(conFiltros("/api/dispositivos", { cursor: siguienteCursor }), { headers: { "Accept": "application/json" } });
+      if (!res.ok) throw new Error("No se pudo cargar /api/dispositivos");
+      const data = await res.json();
+      renderDispositivos(data.dispositivos || [], true);
+      setSiguiente(data.siguiente);
+    } catch (e) {
+      console.error(e);
+    } finally {
+      btnCargarMas.disabled = false;
+    }
+  }
+
+  const ETAPAS_TOTALES = 8;
+  let trabajoActual = null;
+
+  function setProgreso(texto, porcentaje) {
+    if (progresoTexto) progresoTexto.textContent = texto;
+    if (progresoPorcentaje) progresoPorcentaje.textContent = `${porcentaje}%`;
+    if (progresoBarra) progresoBarra.style.width = `${porcentaje}%`;
+  }
+
+  function setEscaneando(activo) {
+    if (btnScan) {
+      btnScan.disabled = activo;
+      btnScan.classList.toggle("opacity-60", activo);
+      btnScan.classList.toggle("cursor-not-allowed", activo);
+    }
+    if (btnCancelar) btnCancelar.classList.toggle("hidden", !activo);
+  }
+
+  function renderProgreso(job) {
+    const etapas = job.etapas || [];
+    if (job.estado === "completado") {
+      setProgreso("Escaneo completado.", 100);
+      return;
+    }
+    const porcentaje = Math.min(95, Math.round((etapas.length / ETAPAS_TOTALES) * 90) + 5);
+    const etapa = job.etapa_actual ? `última etapa: ${job.etapa_actual}` : "iniciando";
+    let texto = `Escaneando red (${etapa}) · ${job.dispositivos_descubiertos || 0} dispositivos detectados`;
+    if (job.dispositivos_guardados) texto += ` · ${job.dispositivos_guardados} guardados`;
+    if (job.cancelacion_solicitada) texto = "Cancelando escaneo...";
+    setProgreso(texto, porcentaje);
+  }
+
+  let avisoTrabajo = null;
+
+  function esperarAvisoTrabajo(ms) {
+    // Con SSE conectado el progreso llega por eventos; el sondeo queda como respaldo lento.
+    return new Promise((resolve) => {
+      const t = setTimeout(() => { avisoTrabajo = null; resolve(); }, ms);
+      avisoTrabajo = () => { clearTimeout(t); avisoTrabajo = null; resolve(); };
+    });
+  }
+
+  function avisarTrabajo(ev) {
+    const datos = JSON.parse(ev.data);
+    if (datos.id === trabajoActual && avisoTrabajo) avisoTrabajo();
+  }
+
+  async function seguirTrabajo(jobId) {
+    trabajoActual = jobId;
+    setEscaneando(true);
+
+    try {
+      while (true) {
+        const res = await fetch(`/api/scans/${jobId}`, { headers: { "Accept": "application/json" } });
+        if (!res.ok) throw new Error("No se pudo consultar el estado del escaneo");
+        const { job } = await res.json();
+
+        renderProgreso(job);
+
+        if (job.estado === "completado") {
+          await sincronizar();
+          setProgreso("Escaneo completado.", 100);
+          break;
+        }
+        if (job.estado === "cancelado") {
+          setProgreso("Escaneo cancelado.", 0);
+          break;
+        }
+        if (job.estado === "error") {
+          throw new Error(job.error || "Error ejecutando escaneo");
+        }
+
+        await esperarAvisoTrabajo(eventosConectados ? 5000 : 1000);
+      }
+    } catch (e) {
+      console.error(e);
+      alert("Error al ejecutar escaneo. Revisa la consola/terminal para más detalles.");
+      setProgreso("Error al escanear.", 0);
+    } finally {
+      trabajoActual = null;
+      setEscaneando(false);
+    }
+  }
+
   async function ejecutarScan() {
     if (!btnScan) return;
 
-    btnScan.disabled = true;
-    btnScan.classList.add("opacity-60", "cursor-not-allowed");
-
-    if (progresoTexto) progresoTexto.textContent = "Escaneando red...";
-    if (progresoPorcentaje) progresoPorcentaje.textContent = "0%";
-    if (progresoBarra) progresoBarra.style.width = "25%";
+    setEscaneando(true);
+    setProgreso("Escaneando red...", 0);
 
     try {
       const res = await fetch("/ejecutar-scan", {
@@ -127,26 +298,78 @@ document.addEventListener("DOMContentLoaded", () => {
         throw new Error(txt || "Error ejecutando escaneo");
       }
 
-      if (progresoBarra) progresoBarra.style.width = "80%";
-      await refreshDashboard();
-      if (progresoBarra) progresoBarra.style.width = "100%";
-      if (progresoPorcentaje) progresoPorcentaje.textContent = "100%";
-      if (progresoTexto) progresoTexto.textContent = "Escaneo completado.";
+      const data = await res.json();
+      await seguirTrabajo(data.job.id);
     } catch (e) {
       console.error(e);
       alert("Error al ejecutar escaneo. Revisa la consola/terminal para más detalles.");
-      if (progresoTexto) progresoTexto.textContent = "Error al escanear.";
-      if (progresoPorcentaje) progresoPorcentaje.textContent = "0%";
-      if (progresoBarra) progresoBarra.style.width = "0%";
-    } finally {
-      btnScan.disabled = false;
-      btnScan.classList.remove("opacity-60", "cursor-not-allowed");
+      setProgreso("Error al escanear.", 0);
+      setEscaneando(false);
+    }
+  }
+
+  async function cancelarScan() {
+    if (!trabajoActual) return;
+    try {
+      await fetch(`/api/scans/${trabajoActual}/cancelar`, { method: "POST" });
+    } catch (e) {
+      console.error(e);
+    }
+  }
+
+  async function reanudarTrabajoEnCurso() {
+    const res = await fetch("/api/scans/actual", { headers: { "Accept": "application/json" } });
+    if (!res.ok) return;
+    const { job } = await res.json();
+    if (job && (job.estado === "ejecutando" || job.estado === "pendiente")) {
+      seguirTrabajo(job.id);
     }
   }
 
   if (btnScan) btnScan.addEventListener("click", ejecutarScan);
+  if (btnCancelar) btnCancelar.addEventListener("click", cancelarScan);
+  if (btnCargarMas) btnCargarMas.addEventListener("click", cargarMas);
+
+  let eventosConectados = false;
+  let sincronizacionPendiente = null;
+
+  function sincronizarPronto() {
+    // Agrupa ráfagas de eventos (un escaneo grande emite uno por lote) en una sola sincronización.
+    if (sincronizacionPendiente) return;
+    sincronizacionPendiente = setTimeout(() => {
+      sincronizacionPendiente = null;
+      sincronizar().catch(() => {});
+    }, 300);
+  }
+
+  function conectarEventos() {
+    if (!window.EventSource) return;
+    const fuente = new EventSource("/api/eventos");
+
+    fuente.onopen = () => { eventosConectados = true; };
+    fuente.onerror = () => { eventosConectados = false; };
+
+    fuente.addEventListener("dispositivos_nuevos", sincronizarPronto);
+    fuente.addEventListener("cambios_estado", sincronizarPronto);
+    fuente.addEventListener("escaneo_iniciado", (ev) => {
+      const datos = JSON.parse(ev.data);
+      const iniciandoAqui = btnScan && btnScan.disabled;
+      if (!trabajoActual && !iniciandoAqui) seguirTrabajo(datos.id);
+    });
+    fuente.addEventListener("escaneo_progreso", avisarTrabajo);
+    fuente.addEventListener("escaneo_finalizado", (ev) => {
+      avisarTrabajo(ev);
+      sincronizarPronto();
+    });
+  }
 
   refreshDashboard().catch(() => {
   });
+  conectarEventos();
+  setInterval(() => {
+    if (!trabajoActual && !eventosConectados) sincronizar().catch(() => {});
+  }, 10000);
+  reanudarTrabajoEnCurso().catch(() => {
+  });
 });
 
@@ -0,0 +1,53 @@
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import ContadorVersion, Dispositivo, DispositivoEliminado, Escaneo
+
+_VERSIONADOS = (Dispositivo, Escaneo)
+
+
+def sembrar_contador_versiones() -> None:
+    # La fila del contador se crea tras create_all() y no en el primer uso, donde dos escritores a la vez chocarían.
+    t = ContadorVersion.__table__
+    try:
+        with db.engine.begin() as conn:
+            if conn.execute(select(t.c.id).where(t.c.id == 1)).first() is None:
+                conn.execute(t.insert().values(id=1, valor=0))
+    except IntegrityError:
+        pass  # otro proceso la creó a la vez
+
+
+def siguiente_version(sesion=None) -> int:
+    # El UPDATE bloquea la fila del contador hasta el commit, así las versiones quedan en orden de commit.
+    sesion = sesion or db.session
+    t = ContadorVersion.__table__
+    res = sesion.execute(t.update().where(t.c.id == 1).values(valor=t.c.valor + 1))
+    if not res.rowcount:
+        raise RuntimeError("contador de versiones sin inicializar (llama a sembrar_contador_versiones tras create_all)")
+    return sesion.execute(select(t.c.valor).where(t.c.id == 1)).scalar_one()
+
+
+def version_actual() -> int:
+    t = ContadorVersion.__table__
+    return db.session.execute(select(t.c.valor).where(t.c.id == 1)).scalar() or 0
+
+
+@event.listens_for(db.session, "before_flush")
+def _sellar_versiones(sesion, _contexto, _instancias):
+    cambiados = [
+        o for o in chain(sesion.new, sesion.dirty)
+        if isinstance(o, _VERSIONADOS) and (o in sesion.new or sesion.is_modified(o))
+    ]
+    borrados = [o for o in sesion.deleted if isinstance(o, Dispositivo)]
+    if not cambiados and not borrados:
+        return
+
+    version = siguiente_version(sesion)
+    for o in cambiados:
+        o.version = version
+    for d in borrados:
+        sesion.add(DispositivoEliminado(dispositivo_id=d.id, ip=d.ip, version=version, fecha=datetime.utcnow()))
@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .objetivos import filtro_bpf, interfaces_de, resolver_segmentos
+
+PROTOCOLOS = {1: "ICMP", 6: "TCP", 17: "UDP"}
+
+
+class Flujo:
+    __slots__ = ("bytes", "paquetes", "primero", "ultimo")
+
+    def __init__(self, ahora: float):
+        self.bytes = 0
+        self.paquetes = 0
+        self.primero = ahora
+        self.ultimo = ahora
+
+
+class TablaFlujos:
+    def __init__(self, max_flujos: int = 50000, idle_timeout: float = 120.0):
+        self.max_flujos = max_flujos
+        self.idle_timeout = idle_timeout
+        self._flujos: "OrderedDict[tuple, Flujo]" = OrderedDict()
+        self.expulsados = 0
+
+    def registrar(self, clave: tuple, tam: int, ahora: float) -> None:
+        flujo = self._flujos.get(clave)
+        if flujo is None:
+            if len(self._flujos) >= self.max_flujos:
+                self._flujos.popitem(last=False)
+                self.expulsados += 1
+            flujo = Flujo(ahora)
+            self._flujos[clave] = flujo
+        else:
+            self._flujos.move_to_end(clave)
+        flujo.bytes += tam
+        flujo.paquetes += 1
+        flujo.ultimo = ahora
+
+    def expulsar_inactivos(self, ahora: float) -> int:
+        limite = ahora - self.idle_timeout
+        n = 0
+        while self._flujos:
+            clave, flujo = next(iter(self._flujos.items()))
+            if flujo.ultimo >= limite:
+                break
+            del self._flujos[clave]
+            n += 1
+        self.expulsados += n
+        return n
+
+    def items(self):
+        return list(self._flujos.items())
+
+    def __len__(self) -> int:
+        return len(self._flujos)
+
+
+class SpaceSaving:
+    def __init__(self, k: int = 64):
+        self.k = k
+        self._contadores: dict = {}
+
+    def agregar(self, clave, peso: int = 1) -> None:
+        if clave in self._contadores:
+            self._contadores[clave][0] += peso
+            return
+        if len(self._contadores) < self.k:
+            self._contadores[clave] = [peso, 0]
+            return
+        minimo = min(self._contadores, key=lambda c: self._contadores[c][0])
+        valor, _ = self._contadores.pop(minimo)
+        self._contadores[clave] = [valor + peso, valor]
+
+    def top(self, n: int = 10) -> list:
+        orden = sorted(self._contadores.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [{"clave": c, "bytes": v, "error": e} for c, (v, e) in orden[:n]]
+
+    def reiniciar(self) -> None:
+        self._contadores.clear()
+
+
+class AnalizadorTrafico:
+    def __init__(self, red_cidr=None, iface=None, max_flujos=50000, idle_timeout=120.0,
+                 k_top=64, intervalo_rollup=60.0, max_rollups=60, interfaces=None):
+        self.red_cidr = red_cidr
+        self.iface = iface
+        self.interfaces = interfaces
+        self.segmentos = []
+        self.flujos = TablaFlujos(max_flujos=max_flujos, idle_timeout=idle_timeout)
+        self.talkers = SpaceSaving(k_top)
+        self.protocolos = SpaceSaving(k_top)
+        self.intervalo_rollup = intervalo_rollup
+        self.rollups = deque(maxlen=max_rollups)
+
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._sniffer = None
+        self._capas = None
+        self._hilo_rollup = None
+        self._inicio_ventana = time.time()
+        self._bytes_ventana = 0
+        self._paquetes_ventana = 0
+
+    def _filtro(self):
+        return filtro_bpf(self.segmentos)
+
+    def iniciar(self) -> None:
+        if self._sniffer is not None:
+            return
+        # scapy tarda ~1 s en importarse: solo se carga cuando el analizador arranca de verdad.
+        from scapy.all import AsyncSniffer, IP, TCP, UDP
+
+        self._capas = (IP, TCP, UDP)
+        self.segmentos = resolver_segmentos(self.red_cidr, self.interfaces)
+        self._parar.clear()
+        self._sniffer = AsyncSniffer(filter=self._filtro(), prn=self._procesar, store=False,
+                                     iface=self.iface or interfaces_de(self.segmentos))
+        self._sniffer.start()
+        self._hilo_rollup = threading.Thread(target=self._bucle_rollup, name="trafico-rollup", daemon=True)
+        self._hilo_rollup.start()
+        print(f"[INFO] Analizador de tráfico iniciado ({self._filtro()})")
+
+    def detener(self) -> None:
+        self._parar.set()
+        if self._sniffer is not None:
+            try:
+                self._sniffer.stop()
+            except Exception:
+                pass
+            self._sniffer = None
+
+    def activo(self) -> bool:
+        return self._sniffer is not None and bool(getattr(self._sniffer, "running", False))
+
+    def _procesar(self, pkt) -> None:
+        IP, TCP, UDP = self._capas
+        if IP not in pkt:
+            return
+        ip = pkt[IP]
+        proto = PROTOCOLOS.get(ip.proto, str(ip.proto))
+        sport = dport = 0
+        if TCP in pkt:
+            sport, dport = pkt[TCP].sport, pkt[TCP].dport
+        elif UDP in pkt:
+            sport, dport = pkt[UDP].sport, pkt[UDP].dport
+
+        tam = len(pkt)
+        servicio = f"{proto}/{min(sport, dport)}" if sport and dport else proto
+
+        with self._lock:
+            self.flujos.registrar((ip.src, ip.dst, proto, sport, dport), tam, time.time())
+            self.talkers.agregar(ip.src, tam)
+            self.protocolos.agregar(servicio, tam)
+            self._bytes_ventana += tam
+            self._paquetes_ventana += 1
+
+    def _bucle_rollup(self) -> None:
+        while not self._parar.wait(self.intervalo_rollup):
+            self.consolidar()
+
+    def consolidar(self) -> dict:
+        ahora = time.time()
+        with self._lock:
+            expulsados = self.flujos.expulsar_inactivos(ahora)
+            rollup = {
+                "inicio": self._inicio_ventana,
+                "fin": ahora,
+                "bytes": self._bytes_ventana,
+                "paquetes": self._paquetes_ventana,
+                "flujos_activos": len(self.flujos),
+                "flujos_expulsados": expulsados,
+                "top_talkers": self.talkers.top(10),
+                "top_protocolos": self.protocolos.top(10),
+            }
+            self.talkers.reiniciar()
+            self.protocolos.reiniciar()
+            self._inicio_ventana = ahora
+            self._bytes_ventana = 0
+            self._paquetes_ventana = 0
+        self.rollups.append(rollup)
+        return rollup
+
+    def resumen(self) -> dict:
+        with self._lock:
+            return {
+                "activo": self.activo(),
+                "flujos_activos": len(self.flujos),
+                "flujos_expulsados": self.flujos.expulsados,
+                "top_talkers": self.talkers.top(10),
+                "top_protocolos": self.protocolos.top(10),
+                "rollups": list(self.rollups),
+            }
+
+    def trafico_dispositivo(self, ip: str, limite: int = 20) -> list:
+        with self._lock:
+            flujos = [(k, f.bytes, f.paquetes, f.primero, f.ultimo)
+                      for k, f in self.flujos.items() if k[0] == ip or k[1] == ip]
+
+        flujos.sort(key=lambda x: x[1], reverse=True)
+        return [
+            {
+                "direccion": "salida" if src == ip else "entrada",
+                "origen": f"{src}:{sport}" if sport else src,
+                "destino": f"{dst}:{dport}" if dport else dst,
+                "protocolo": proto,
+                "bytes": nbytes,
+                "paquetes": npaq,
+                "primero": time.strftime("%d-%m-%Y %H:%M:%S", time.localtime(primero)),
+                "ultimo": time.strftime("%d-%m-%Y %H:%M:%S", time.localtime(ultimo)),
+            }
+            for (src, dst, proto, sport, dport), nbytes, npaq, primero, ultimo in flujos[:limite]
+        ]
+
+
+analizador = None
+
+
+def _arrancar(a: AnalizadorTrafico) -> None:
+    try:
+        a.iniciar()
+    except Exception as e:
+        print(f"[WARN] No se pudo iniciar el analizador de tráfico: {e}")
+
+
+def iniciar_analizador(red_cidr=None, iface=None, en_segundo_plano=False, **opciones):
+    global analizador
+    if analizador is None:
+        analizador = AnalizadorTrafico(red_cidr=red_cidr, iface=iface, **opciones)
+    if en_segundo_plano:
+        threading.Thread(target=_arrancar, args=(analizador,), name="trafico-arranque", daemon=True).start()
+    else:
+        _arrancar(analizador)
+    return analizador
+
+
+def obtener_analizador():
+    return analizador
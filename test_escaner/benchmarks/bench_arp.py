@@ -0,0 +1,104 @@
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import arp_fast
+from app.objetivos import Segmento
+
+N_HOSTS = 10_000
+
+# Barrido real opcional (requiere root): BENCH_ARP_RED=192.168.1.0/24 [BENCH_ARP_IFACE=eth0] [BENCH_ARP_TASA=0]
+RED = os.environ.get("BENCH_ARP_RED")
+IFACE = os.environ.get("BENCH_ARP_IFACE") or None
+TASA = float(os.environ.get("BENCH_ARP_TASA", 0) or 0)
+
+MAC_LOCAL = b"\x02\x00\x00\x00\x00\x01"
+IP_LOCAL = socket.inet_aton("10.0.0.1")
+
+
+def _ips(n):
+    return [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(1, n + 1)]
+
+
+def _respuesta(ip: str) -> bytes:
+    # Trama ARP reply tal como llegaría del host `ip`.
+    return arp_fast._TRAMA.pack(
+        MAC_LOCAL, b"\x02\xaa\xbb\xcc\xdd\xee", arp_fast.ETH_P_ARP,
+        1, 0x0800, 6, 4, 2,
+        b"\x02\xaa\xbb\xcc\xdd\xee", socket.inet_aton(ip), MAC_LOCAL, IP_LOCAL,
+    )
+
+
+def _cpu_scapy(ips, respuestas):
+    from scapy.all import ARP, Ether
+
+    inicio = time.process_time()
+    for ip, raw in zip(ips, respuestas):
+        bytes(Ether(dst="ff:ff:ff:ff:ff:ff", src="02:00:00:00:00:01") / ARP(pdst=ip, psrc="10.0.0.1",
+                                                                           hwsrc="02:00:00:00:00:01"))
+        pkt = Ether(raw)
+        _ = (pkt[ARP].psrc, pkt[Ether].src)
+    return time.process_time() - inicio
+
+
+def _cpu_raw(ips, respuestas):
+    trama = bytearray(arp_fast._TRAMA.pack(b"\xff" * 6, MAC_LOCAL, arp_fast.ETH_P_ARP, 1, 0x0800, 6, 4, 1,
+                                           MAC_LOCAL, IP_LOCAL, b"\x00" * 6, b"\x00" * 4))
+    inicio = time.process_time()
+    for ip, raw in zip(ips, respuestas):
+        trama[arp_fast._OFFSET_TPA:arp_fast._OFFSET_TPA + 4] = socket.inet_aton(ip)
+        bytes(trama)
+        campos = arp_fast._TRAMA.unpack_from(raw)
+        _ = (socket.inet_ntoa(campos[9]), campos[8].hex(":"))
+    return time.process_time() - inicio
+
+
+def _barrido_scapy(hosts):
+    from scapy.all import ARP, Ether, srp
+
+    ans, _ = srp(Ether(dst="ff:ff:ff:ff:ff:ff") / ARP(pdst=hosts), timeout=1, iface=IFACE,
+                 inter=(1.0 / TASA) if TASA else 0, verbose=0)
+    return {r[ARP].psrc: r[Ether].src for _, r in ans}
+
+
+def _barrido_raw(hosts):
+    return arp_fast.barrer(hosts, iface=IFACE, tasa=TASA or None, timeout=1.0)
+
+
+def _medir_barrido(nombre, funcion, hosts):
+    cpu, reloj = time.process_time(), time.perf_counter()
+    respuestas = funcion(hosts)
+    cpu, reloj = time.process_time() - cpu, time.perf_counter() - reloj
+    envio = max(reloj - 1.0, 1e-6)  # descuenta la espera final de 1 s por respuestas
+    print(f"{nombre:>6}: {len(respuestas):5d} respuestas  {reloj:6.2f} s  ~{len(hosts) / envio:9.0f} paquetes/s  "
+          f"{cpu / len(hosts) * 1e6:8.1f} µs CPU/host")
+
+
+def main():
+    ips = _ips(N_HOSTS)
+    respuestas = [_respuesta(ip) for ip in ips]
+
+    print(f"CPU por host (construir petición + diseccionar respuesta), {N_HOSTS} hosts:")
+    t_scapy = _cpu_scapy(ips, respuestas)
+    t_raw = _cpu_raw(ips, respuestas)
+    print(f"  scapy: {t_scapy / N_HOSTS * 1e6:8.1f} µs/host")
+    print(f"    raw: {t_raw / N_HOSTS * 1e6:8.1f} µs/host  ({t_scapy / t_raw:.0f}x)")
+
+    if not RED:
+        print("Barrido real omitido (define BENCH_ARP_RED para medirlo).")
+        return
+    if not arp_fast.disponible():
+        print("Barrido real omitido: AF_PACKET no disponible en esta plataforma.")
+        return
+
+    hosts = list(Segmento(RED).hosts())
+    print(f"Barrido real de {RED} ({len(hosts)} hosts, tasa {'sin límite' if not TASA else f'{TASA:.0f}/s'}):")
+    _medir_barrido("scapy", _barrido_scapy, hosts)
+    _medir_barrido("raw", _barrido_raw, hosts)
+
+
+if __name__ == "__main__":
+    main()
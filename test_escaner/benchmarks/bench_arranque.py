@@ -0,0 +1,80 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPETICIONES = 5
+
+# Módulos pesados que no deben cargarse solo por arrancar la app: se importan cuando una función los necesita.
+PROHIBIDOS = ("scapy", "pandas", "openpyxl")
+ESPERA_HILOS_S = 1.0
+
+# Límites opcionales (en ms y MiB); se pueden ajustar por entorno para usar el benchmark como guarda en CI.
+LIMITE_IMPORT_MS = float(os.environ.get("BENCH_LIMITE_IMPORT_MS", 0) or 0)
+LIMITE_PRIMERA_MS = float(os.environ.get("BENCH_LIMITE_PRIMERA_MS", 0) or 0)
+LIMITE_RSS_MB = float(os.environ.get("BENCH_LIMITE_RSS_MB", 0) or 0)
+
+_HIJO = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+from app import create_app
+app = create_app()
+t1 = time.perf_counter()
+with app.test_client() as cliente:
+    estado = cliente.get("/api/dashboard-data").status_code
+t2 = time.perf_counter()
+# Margen para que un hilo de arranque en segundo plano (p. ej. el analizador) haga sus imports antes de comprobar.
+time.sleep(%r)
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000.0,
+    "primera_ms": (t2 - t1) * 1000.0,
+    "estado": estado,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    "cargados": sorted(m for m in %r if m in sys.modules),
+}))
+""" % (ESPERA_HILOS_S, PROHIBIDOS)
+
+
+def _medir(directorio: str) -> dict:
+    entorno = dict(os.environ)
+    entorno.setdefault("IOT_MONITOR_SQLALCHEMY_DATABASE_URI", f"sqlite:///{os.path.join(directorio, 'bench.db')}")
+    entorno["PYTHONPATH"] = RAIZ + os.pathsep + entorno.get("PYTHONPATH", "")
+    salida = subprocess.run(
+        [sys.executable, "-c", _HIJO], cwd=directorio, env=entorno, capture_output=True, text=True, check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    directorio = tempfile.mkdtemp(prefix="bench_arranque_")
+    _medir(directorio)  # calienta la caché de bytecode y crea el esquema
+    muestras = [_medir(directorio) for _ in range(REPETICIONES)]
+
+    import_ms = statistics.median(m["import_ms"] for m in muestras)
+    primera_ms = statistics.median(m["primera_ms"] for m in muestras)
+    rss_mb = statistics.median(m["rss_mb"] for m in muestras)
+    cargados = sorted({c for m in muestras for c in m["cargados"]})
+
+    print(f"import + create_app: {import_ms:8.1f} ms (mediana de {REPETICIONES})")
+    print(f"primera petición:    {primera_ms:8.1f} ms (HTTP {muestras[-1]['estado']})")
+    print(f"RSS máximo:          {rss_mb:8.1f} MiB")
+
+    fallos = []
+    if cargados:
+        fallos.append(f"módulos pesados cargados al arrancar: {', '.join(cargados)}")
+    if LIMITE_IMPORT_MS and import_ms > LIMITE_IMPORT_MS:
+        fallos.append(f"import {import_ms:.1f} ms > {LIMITE_IMPORT_MS:.1f} ms")
+    if LIMITE_PRIMERA_MS and primera_ms > LIMITE_PRIMERA_MS:
+        fallos.append(f"primera petición {primera_ms:.1f} ms > {LIMITE_PRIMERA_MS:.1f} ms")
+    if LIMITE_RSS_MB and rss_mb > LIMITE_RSS_MB:
+        fallos.append(f"RSS {rss_mb:.1f} MiB > {LIMITE_RSS_MB:.1f} MiB")
+    for fallo in fallos:
+        print(f"[ERROR] {fallo}")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.observations import MotorFusion
+
+N_OBSERVACIONES = int(os.environ.get("BENCH_FUSION_N", 10_000))
+REPETICIONES = 20
+
+PUERTOS = [22, 23, 53, 80, 443, 554, 1883, 8080, 8443]
+CAMBIOS_DHCP = 0.01  # fracción de MACs que ARP vuelve a ver en otra IP durante el escaneo
+
+
+def _etapas(n):
+    # Reparto aproximado de un escaneo real: ARP ve casi todo, ICMP algo menos y el resto son minoritarios.
+    rnd = random.Random(1)
+    hosts = max(1, n // 2)
+    ip = [f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}" for i in range(1, hosts + 1)]
+    mac = [f"02:00:00:{(i >> 16) & 255:02x}:{(i >> 8) & 255:02x}:{i & 255:02x}" for i in range(1, hosts + 1)]
+    cuotas = {"ARP": 0.50, "ICMP": 0.30, "UPnP": 0.08, "mDNS": 0.07, "NetBIOS": 0.05}
+
+    etapas = {}
+    for origen, cuota in cuotas.items():
+        lista = []
+        for i in rnd.sample(range(hosts), min(hosts, int(n * cuota))):
+            d = {"ip": ip[i], "origen": origen, "nombre": "Desconocido", "tipo": "Desconocido"}
+            if origen == "ARP":
+                d["mac"] = mac[i]
+                if rnd.random() < CAMBIOS_DHCP:
+                    lista.append({"ip": f"10.255.{(i >> 8) & 255}.{i & 255}", "origen": origen, "mac": mac[i]})
+            elif origen == "ICMP":
+                d["rtt_ms"] = rnd.uniform(0.5, 20)
+                d["puertos"] = rnd.sample(PUERTOS, rnd.randint(0, 3))
+            else:
+                d["nombre"] = f"{origen.lower()}-{i}"
+                d["tipo"] = "Dispositivo IoT"
+            lista.append(d)
+        etapas[origen] = lista
+    return list(etapas.values())
+
+
+def _mejor_valor(actual, nuevo):
+    if not actual or actual == "Desconocido":
+        return nuevo
+    if nuevo and nuevo != "Desconocido" and len(nuevo) > len(actual):
+        return nuevo
+    return actual
+
+
+def _fusion_dicts(listas):
+    # Referencia: fusión anterior, un dict por IP con listas de puertos y orígenes.
+    fusion = {}
+    for lista in listas:
+        for d in lista:
+            ip = d.get("ip")
+            if ip not in fusion:
+                fusion[ip] = {
+                    "ip": ip,
+                    "mac": d.get("mac"),
+                    "nombre": d.get("nombre") or "Desconocido",
+                    "tipo": d.get("tipo") or "Desconocido",
+                    "puertos": list(d.get("puertos") or []),
+                    "origenes": [d.get("origen", "desconocido")],
+                    "rtt_ms": d.get("rtt_ms"),
+                }
+                continue
+            f = fusion[ip]
+            if not f["mac"] and d.get("mac"):
+                f["mac"] = d["mac"]
+            if f.get("rtt_ms") is None and d.get("rtt_ms") is not None:
+                f["rtt_ms"] = d["rtt_ms"]
+            f["nombre"] = _mejor_valor(f["nombre"], d.get("nombre"))
+            f["tipo"] = _mejor_valor(f["tipo"], d.get("tipo"))
+            for p in d.get("puertos") or []:
+                if p not in f["puertos"]:
+                    f["puertos"].append(p)
+            if d.get("origen", "desconocido") not in f["origenes"]:
+                f["origenes"].append(d.get("origen", "desconocido"))
+    return fusion
+
+
+def _fusion_motor(listas, por_mac=True):
+    motor = MotorFusion(por_mac=por_mac)
+    for lista in listas:
+        motor.agregar_dicts(lista)
+    return motor
+
+
+def _fusion_motor_ip(listas):
+    return _fusion_motor(listas, por_mac=False)
+
+
+def _medir(nombre, funcion, listas):
+    tiempos = []
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        funcion(listas)
+        tiempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    resultado = funcion(listas)
+    retenida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{nombre:>7}: {len(resultado):6d} dispositivos  {min(tiempos) * 1000:7.1f} ms  "
+          f"retenido {retenida / 1024:8.0f} KiB  pico {pico / 1024:8.0f} KiB")
+    return min(tiempos), retenida
+
+
+def main():
+    listas = _etapas(N_OBSERVACIONES)
+    total = sum(len(l) for l in listas)
+    print(f"Fusión de {total} observaciones en {len(listas)} etapas (mejor de {REPETICIONES}):")
+    t_dicts, m_dicts = _medir("dicts", _fusion_dicts, listas)
+    t_ip, m_ip = _medir("ip", _fusion_motor_ip, listas)
+    t_mac, m_mac = _medir("ip+mac", _fusion_motor, listas)
+    print(f"dicts/motor por IP:  tiempo {t_dicts / t_ip:.2f}x  memoria {m_dicts / max(m_ip, 1):.2f}x")
+    print(f"dicts/motor con MAC: tiempo {t_dicts / t_mac:.2f}x  memoria {m_dicts / max(m_mac, 1):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
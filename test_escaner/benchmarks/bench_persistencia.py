@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmp = tempfile.mkdtemp(prefix="bench_persistencia_")
+os.environ.setdefault("IOT_MONITOR_SQLALCHEMY_DATABASE_URI", f"sqlite:///{os.path.join(_tmp, 'bench.db')}")
+os.environ.setdefault("IOT_MONITOR_TRAFFIC_ANALYZER_ENABLED", "false")
+
+from app import create_app, db
+from app import routes
+from app.models import Dispositivo, DispositivoEscaneo, EstadoDispositivoLog
+from app.scan_jobs import TrabajoEscaneo
+from app.sync import sembrar_contador_versiones
+
+TAMANOS = (1_000, 10_000)
+
+
+def _resultados(n: int, pasada: int):
+    return [
+        {
+            "ip": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            "mac": f"02:00:{(i >> 24) & 255:02x}:{(i >> 16) & 255:02x}:{(i >> 8) & 255:02x}:{i & 255:02x}",
+            "nombre": f"host-{i}",
+            "tipo": "Cámara" if i % 7 == 0 else "Desconocido",
+            "riesgo": "Alto" if i % 11 == 0 else None,
+            "puertos": [80, 443] if (i + pasada) % 3 == 0 else [22],
+            "consumo_total_mb": 0.5,
+        }
+        for i in range(n)
+    ]
+
+
+def _pasada(app, n: int, pasada: int) -> float:
+    resultados = _resultados(n, pasada)
+    routes.escanear_red = lambda **kwargs: resultados
+    routes.sondear_alcance = lambda ips, **kwargs: {ip: {"online": True, "rtt_ms": 2.0, "loss": 0.0} for ip in ips}
+
+    trabajo = TrabajoEscaneo()
+    with app.app_context():
+        routes.ejecutar_scan(trabajo)
+    return next(e["duracion_segundos"] for e in trabajo.etapas if e["nombre"] == "Persistencia")
+
+
+def main():
+    app = create_app()
+    print(f"{'dispositivos':>12} {'pasada':>10} {'segundos':>9} {'disp/s':>10}")
+
+    for n in TAMANOS:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            sembrar_contador_versiones()
+
+        for pasada, etiqueta in ((0, "insercion"), (1, "update")):
+            duracion = max(_pasada(app, n, pasada), 1e-3)
+            with app.app_context():
+                filas = (
+                    db.session.query(Dispositivo).count()
+                    + db.session.query(DispositivoEscaneo).count()
+                    + db.session.query(EstadoDispositivoLog).count()
+                )
+            print(f"{n:>12} {etiqueta:>10} {duracion:>9.2f} {n / duracion:>10.0f}  ({filas} filas en total)")
+
+
+if __name__ == "__main__":
+    t0 = time.time()
+    main()
+    print(f"[INFO] Benchmark completado en {time.time() - t0:.1f}s")
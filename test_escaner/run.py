@@ -1,6 +1,10 @@
-from app import create_app
+from werkzeug.serving import is_running_from_reloader
 
-app = create_app()
+from app import create_app
 
+# Los procesos del pool de escaneo (forkserver/spawn) reimportan este módulo: solo aquí se crea la app.
 if __name__ == "__main__":
+    # Con debug=True el proceso padre solo vigila ficheros y relanza al hijo, que es el que sirve: el analizador
+    # y el programador arrancan solo en el hijo para no tener dos escaneando a la vez.
+    app = create_app(servicios=is_running_from_reloader())
     app.run(host='0.0.0.0', port=5000, debug=True)
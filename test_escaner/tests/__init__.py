@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app import create_app, db
+
+
+class PruebaConApp(unittest.TestCase):
+    # Aplicación con una base SQLite temporal por prueba y sin servicios en segundo plano.
+    config = {}
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+
+        entorno = {
+            "IOT_MONITOR_SQLALCHEMY_DATABASE_URI": f"sqlite:///{directorio.name}/prueba.db",
+            "IOT_MONITOR_TRAFFIC_ANALYZER_ENABLED": "false",
+            "IOT_MONITOR_SCAN_PROGRAMADO_ACTIVO": "false",
+        }
+        entorno.update({f"IOT_MONITOR_{k}": v for k, v in self.config.items()})
+        with mock.patch.dict(os.environ, entorno):
+            self.app = create_app()
+
+        contexto = self.app.app_context()
+        contexto.push()
+        self.addCleanup(contexto.pop)
+        self.addCleanup(db.engine.dispose)
+        self.addCleanup(db.session.remove)
+        self.cliente = self.app.test_client()
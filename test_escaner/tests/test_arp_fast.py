@@ -0,0 +1,89 @@
+import socket
+import unittest
+from unittest import mock
+
+from app import arp_fast
+
+MAC_LOCAL = bytes.fromhex("020000000001")
+IP_LOCAL = socket.inet_aton("10.0.0.1")
+MAC_REMOTA = bytes.fromhex("02aabbccddee")
+
+
+def _trama(op, sha, spa, tha=MAC_LOCAL, tpa=IP_LOCAL, tipo=arp_fast.ETH_P_ARP):
+    return arp_fast._TRAMA.pack(tha, sha, tipo, 1, 0x0800, 6, 4, op, sha, socket.inet_aton(spa), tha, tpa)
+
+
+class SocketFalso:
+    # Guarda lo enviado y entrega las respuestas preparadas; sin datos, recv se comporta como no bloqueante.
+    def __init__(self, *_args):
+        self.enviadas = []
+        self.respuestas = []
+
+    def bind(self, direccion):
+        self.direccion = direccion
+
+    def setblocking(self, _bloqueante):
+        pass
+
+    def send(self, trama):
+        self.enviadas.append(bytes(trama))
+
+    def recv(self, _tam):
+        if not self.respuestas:
+            raise BlockingIOError
+        return self.respuestas.pop(0)
+
+    def close(self):
+        pass
+
+
+class MotorArpRapido(unittest.TestCase):
+    def setUp(self):
+        self.sock = SocketFalso()
+        for objetivo, valor in (
+            ("_mac_interfaz", lambda iface: MAC_LOCAL),
+            ("_ip_interfaz", lambda iface: IP_LOCAL),
+        ):
+            parche = mock.patch.object(arp_fast, objetivo, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        for parche in (
+            mock.patch.object(arp_fast.socket, "socket", lambda *a: self.sock),
+            mock.patch.object(arp_fast.select, "select", lambda *a: ([], [], [])),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_plantilla_es_una_peticion_arp_broadcast(self):
+        motor = arp_fast.MotorArp("eth0")
+        campos = arp_fast._TRAMA.unpack(bytes(motor.plantilla))
+
+        self.assertEqual(len(motor.plantilla), 42)
+        self.assertEqual(self.sock.direccion, ("eth0", arp_fast.ETH_P_ARP))
+        self.assertEqual(campos[:3], (b"\xff" * 6, MAC_LOCAL, arp_fast.ETH_P_ARP))
+        self.assertEqual(campos[3:8], (1, 0x0800, 6, 4, 1))
+        self.assertEqual(campos[8:10], (MAC_LOCAL, IP_LOCAL))
+
+    def test_cada_envio_solo_cambia_la_ip_destino(self):
+        motor = arp_fast.MotorArp("eth0")
+        motor.barrer(["10.0.0.5", "10.0.0.6"], timeout=0)
+
+        self.assertEqual(len(self.sock.enviadas), 2)
+        for trama, ip in zip(self.sock.enviadas, ("10.0.0.5", "10.0.0.6")):
+            self.assertEqual(trama[arp_fast._OFFSET_TPA:arp_fast._OFFSET_TPA + 4], socket.inet_aton(ip))
+            self.assertEqual(trama[:arp_fast._OFFSET_TPA], bytes(motor.plantilla[:arp_fast._OFFSET_TPA]))
+
+    def test_solo_se_aceptan_respuestas_a_ips_preguntadas(self):
+        self.sock.respuestas = [
+            b"\x00" * 20,                                      # trama truncada
+            _trama(1, MAC_REMOTA, "10.0.0.5"),                 # petición, no respuesta
+            _trama(2, MAC_REMOTA, "10.0.0.5", tipo=0x0800),    # otro ethertype
+            _trama(2, MAC_REMOTA, "10.0.0.99"),                # IP no preguntada
+            _trama(2, MAC_REMOTA, "10.0.0.5"),
+            _trama(2, bytes.fromhex("02aabbccdd00"), "10.0.0.5"),  # duplicada: gana la primera
+        ]
+        motor = arp_fast.MotorArp("eth0")
+
+        respuestas = motor.barrer(["10.0.0.5", "10.0.0.6"], timeout=0)
+
+        self.assertEqual(respuestas, {"10.0.0.5": "02:aa:bb:cc:dd:ee"})
@@ -0,0 +1,57 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app.dns_resolver import ResolverInverso
+
+
+def _gethostbyaddr_lento(esperas: dict, llamadas: list):
+    def consultar(ip):
+        llamadas.append(ip)
+        time.sleep(esperas.get(ip, 0))
+        return (f"host-{ip.rsplit('.', 1)[1]}.lan", [], [ip])
+    return consultar
+
+
+class ResolverInversoTimeout(unittest.TestCase):
+    def _resolver(self, esperas, **opciones):
+        llamadas = []
+        parche = mock.patch("socket.gethostbyaddr", _gethostbyaddr_lento(esperas, llamadas))
+        parche.start()
+        self.addCleanup(parche.stop)
+        return ResolverInverso(**opciones), llamadas
+
+    def test_el_timeout_cuenta_por_consulta_y_no_por_lote(self):
+        ips = [f"10.0.0.{i}" for i in range(1, 5)]
+        resolver, _ = self._resolver({ip: 0.2 for ip in ips}, max_workers=2, timeout=0.5)
+
+        resultado = resolver.resolver(ips)
+
+        self.assertEqual(resultado, {ip: f"host-{ip.rsplit('.', 1)[1]}.lan" for ip in ips})
+
+    def test_una_consulta_colgada_se_abandona_y_queda_en_cache_negativa(self):
+        resolver, llamadas = self._resolver({"10.0.0.1": 2.0}, max_workers=4, timeout=0.2)
+
+        inicio = time.monotonic()
+        resultado = resolver.resolver(["10.0.0.1", "10.0.0.2"])
+        duracion = time.monotonic() - inicio
+
+        self.assertEqual(resultado, {"10.0.0.1": None, "10.0.0.2": "host-2.lan"})
+        self.assertLess(duracion, 1.0)
+        self.assertEqual(resolver.resolver(["10.0.0.1"]), {"10.0.0.1": None})
+        self.assertEqual(llamadas.count("10.0.0.1"), 1)
+
+    def test_llamadas_concurrentes_comparten_la_consulta_en_curso(self):
+        resolver, llamadas = self._resolver({"10.0.0.1": 0.2}, max_workers=4, timeout=1.0)
+        resultados = []
+
+        hilos = [threading.Thread(target=lambda: resultados.append(resolver.resolver(["10.0.0.1"])))
+                 for _ in range(3)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        self.assertEqual(resultados, [{"10.0.0.1": "host-1.lan"}] * 3)
+        self.assertEqual(llamadas, ["10.0.0.1"])
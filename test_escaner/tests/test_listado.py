@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Dispositivo
+
+from . import PruebaConApp
+
+
+def _cursor(datos) -> str:
+    return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode().rstrip("=")
+
+
+class PaginacionPorCursor(PruebaConApp):
+    def setUp(self):
+        super().setUp()
+        base = datetime(2024, 1, 1)
+        fechas = [base, base, None, base + timedelta(hours=1), None, base - timedelta(days=1), base, None]
+        for i, fecha in enumerate(fechas, start=1):
+            db.session.add(Dispositivo(ip=f"10.0.0.{i}", nombre=f"host-{i}", fecha_ultima_visto=fecha or base))
+        db.session.flush()
+        # El modelo pone fecha por defecto; los NULL (filas antiguas o importadas) se fuerzan a mano.
+        nulas = [f"10.0.0.{i}" for i, fecha in enumerate(fechas, start=1) if fecha is None]
+        db.session.execute(
+            Dispositivo.__table__.update().where(Dispositivo.ip.in_(nulas)).values(fecha_ultima_visto=None)
+        )
+        db.session.commit()
+        self.total = len(fechas)
+
+    def _recorrer(self, **params):
+        vistos, cursor = [], None
+        for _ in range(self.total + 1):
+            consulta = dict(params, limite=3, **({"cursor": cursor} if cursor else {}))
+            respuesta = self.cliente.get("/api/dispositivos", query_string=consulta)
+            self.assertEqual(respuesta.status_code, 200)
+            datos = respuesta.get_json()
+            vistos += [d["ip"] for d in datos["dispositivos"]]
+            cursor = datos["siguiente"]
+            if not cursor:
+                return vistos
+        self.fail("la paginación no termina")
+
+    def test_recorre_todo_sin_repetir_con_fechas_nulas(self):
+        for direccion in ("desc", "asc"):
+            with self.subTest(direccion=direccion):
+                vistos = self._recorrer(orden="ultimo_escaneo", dir=direccion)
+                self.assertEqual(len(vistos), self.total)
+                self.assertEqual(len(set(vistos)), self.total)
+
+    def test_nulos_al_final_en_descendente_y_al_principio_en_ascendente(self):
+        nulos = {"10.0.0.3", "10.0.0.5", "10.0.0.8"}
+        self.assertEqual(set(self._recorrer(orden="ultimo_escaneo", dir="desc")[-3:]), nulos)
+        self.assertEqual(set(self._recorrer(orden="ultimo_escaneo", dir="asc")[:3]), nulos)
+
+    def test_orden_por_columna_de_texto(self):
+        vistos = self._recorrer(orden="ip", dir="asc")
+        self.assertEqual(vistos, sorted(vistos))
+        self.assertEqual(len(vistos), self.total)
+
+    def test_cursor_malformado_devuelve_400(self):
+        for cursor in ("NQ", "%%%", _cursor([1, 2, 3]), _cursor([{"dt": 5}, 1]), _cursor(["x", "1"]),
+                       _cursor({"a": 1})):
+            with self.subTest(cursor=cursor):
+                respuesta = self.cliente.get("/api/dispositivos", query_string={"cursor": cursor})
+                self.assertEqual(respuesta.status_code, 400)
@@ -0,0 +1,86 @@
+import time
+import unittest
+
+from app.objetivos import ControlTasa, Segmento, Shard, como_shards, intercalar, resolver_segmentos, total_hosts
+
+
+class SegmentosYShards(unittest.TestCase):
+    def test_hosts_excluyen_red_y_broadcast(self):
+        s = Segmento("192.168.1.0/24")
+        hosts = list(s.hosts())
+        self.assertEqual(len(s), 254)
+        self.assertEqual((hosts[0], hosts[-1]), ("192.168.1.1", "192.168.1.254"))
+        self.assertTrue(s.contiene("192.168.1.254"))
+        self.assertFalse(s.contiene("192.168.1.255"))
+        self.assertFalse(s.contiene("no-es-una-ip"))
+
+    def test_redes_punto_a_punto_y_host_unico(self):
+        self.assertEqual(list(Segmento("10.0.0.0/31").hosts()), ["10.0.0.0", "10.0.0.1"])
+        self.assertEqual(list(Segmento("10.0.0.7/32").hosts()), ["10.0.0.7"])
+
+    def test_shards_alineados_sin_huecos_ni_solapes(self):
+        s = Segmento("10.0.0.0/16")
+        shards = list(s.shards(1024))
+
+        self.assertEqual(len(shards), 64)
+        self.assertEqual(str(shards[0]), "10.0.0.1-10.0.3.255")
+        self.assertEqual(str(shards[1]), "10.0.4.0-10.0.7.255")
+        self.assertEqual(str(shards[-1]), "10.0.252.0-10.0.255.254")
+        self.assertEqual(sum(len(sh) for sh in shards), len(s))
+        for anterior, siguiente in zip(shards, shards[1:]):
+            self.assertEqual(anterior.fin, siguiente.inicio)
+
+    def test_max_hosts_recorta_el_segmento(self):
+        s = Segmento("10.0.0.0/8", max_hosts=4096)
+        self.assertEqual(len(s), 4096)
+        self.assertEqual(list(s.hosts())[-1], "10.0.16.0")
+
+    def test_como_shards_mezcla_cidr_ips_sueltas_y_shards(self):
+        lan = Segmento("192.168.1.0/24", iface="eth1")
+        propio = Shard(ips=["172.16.0.1"])
+        shards = list(como_shards(["10.0.0.0/30", propio, "192.168.1.10", "192.168.1.11", "8.8.8.8"],
+                                  tam=256, segmentos=[lan]))
+
+        self.assertIs(shards[1], propio)
+        self.assertEqual(list(shards[0]), ["10.0.0.1", "10.0.0.2"])
+        por_iface = {sh.iface: list(sh) for sh in shards[2:]}
+        self.assertEqual(por_iface, {"eth1": ["192.168.1.10", "192.168.1.11"], None: ["8.8.8.8"]})
+
+    def test_ips_sueltas_se_parten_por_tamano(self):
+        ips = [f"10.0.0.{i}" for i in range(1, 11)]
+        self.assertEqual([len(sh) for sh in como_shards(ips, tam=4)], [4, 4, 2])
+        self.assertEqual(total_hosts(ips), 10)
+
+    def test_intercalar_reparte_entre_segmentos(self):
+        a = list(Segmento("10.0.0.0/22").shards(256))
+        b = list(Segmento("10.1.0.0/23").shards(256))
+        orden = intercalar(a + b)
+        self.assertEqual(orden, [a[0], b[0], a[1], b[1], a[2], a[3]])
+
+    def test_resolver_segmentos_con_interfaz_y_redes_invalidas(self):
+        segmentos = resolver_segmentos("10.0.0.0/24@eth1, no-es-red, 10.1.0.0/24")
+        self.assertEqual([str(s) for s in segmentos], ["10.0.0.0/24@eth1", "10.1.0.0/24"])
+
+
+class LimiteDeTasa(unittest.TestCase):
+    def test_sin_tasa_no_espera(self):
+        control = ControlTasa(0)
+        inicio = time.monotonic()
+        for _ in range(10_000):
+            control.esperar()
+        self.assertLess(time.monotonic() - inicio, 0.5)
+
+    def test_rafaga_inicial_y_luego_la_tasa_media(self):
+        control = ControlTasa(500, rafaga=10)
+
+        inicio = time.monotonic()
+        for _ in range(10):
+            control.esperar()
+        self.assertLess(time.monotonic() - inicio, 0.05)
+
+        inicio = time.monotonic()
+        for _ in range(100):
+            control.esperar()
+        duracion = time.monotonic() - inicio
+        self.assertGreaterEqual(duracion, 0.18)
+        self.assertLess(duracion, 1.0)
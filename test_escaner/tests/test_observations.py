@@ -0,0 +1,103 @@
+import unittest
+
+from app.observations import MotorFusion, Observacion, clave_mac
+
+
+class FusionDeObservaciones(unittest.TestCase):
+    def test_misma_ip_se_funde_en_un_registro(self):
+        motor = MotorFusion()
+        motor.agregar_dicts([
+            {"ip": "10.0.0.5", "origen": "ICMP", "rtt_ms": 3.0},
+            {"ip": "10.0.0.5", "origen": "UPnP", "nombre": "tv", "puertos": [80]},
+            {"ip": "10.0.0.5", "origen": "mDNS", "nombre": "tv-salon", "puertos": [443, 80]},
+        ])
+
+        self.assertEqual(len(motor), 1)
+        r = motor.resultados()[0]
+        self.assertEqual(r["nombre"], "tv-salon")
+        self.assertEqual(r["puertos"], [80, 443])
+        self.assertEqual(r["origenes"], ["ICMP", "UPnP", "mDNS"])
+        self.assertEqual(r["rtt_ms"], 3.0)
+
+    def test_la_misma_mac_en_otra_ip_queda_como_alias(self):
+        motor = MotorFusion()
+        motor.agregar_dicts([
+            {"ip": "10.0.0.5", "mac": "AA:BB:CC:00:00:01", "origen": "ARP"},
+            {"ip": "10.0.0.9", "mac": "aa-bb-cc-00-00-01", "origen": "ARP", "nombre": "movil"},
+            {"ip": "10.0.0.9", "origen": "ICMP"},
+        ])
+
+        self.assertEqual(motor.ips(), ["10.0.0.5"])
+        self.assertEqual(motor.resultados()[0]["nombre"], "movil")
+        self.assertEqual(motor.resultados()[0]["origenes"], ["ARP", "ICMP"])
+
+    def test_lo_visto_sin_mac_se_absorbe_al_aparecer_la_mac(self):
+        motor = MotorFusion()
+        motor.agregar(Observacion("10.0.0.5", mac="aa:bb:cc:00:00:01", origenes=1))
+        motor.agregar_dicts([{"ip": "10.0.0.9", "origen": "UPnP", "nombre": "camara", "puertos": [554]}])
+        self.assertEqual(len(motor), 2)
+
+        motor.agregar_dicts([{"ip": "10.0.0.9", "mac": "aa:bb:cc:00:00:01", "origen": "ARP"}])
+
+        self.assertEqual(len(motor), 1)
+        r = motor.resultados()[0]
+        self.assertEqual((r["ip"], r["nombre"], r["puertos"]), ("10.0.0.5", "camara", [554]))
+        motor.agregar_dicts([{"ip": "10.0.0.9", "origen": "ICMP"}])
+        self.assertEqual(len(motor), 1)
+
+    def test_una_ip_con_otra_mac_no_se_funde(self):
+        motor = MotorFusion()
+        motor.agregar_dicts([
+            {"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:01", "origen": "ARP", "nombre": "a"},
+            {"ip": "10.0.0.6", "mac": "aa:bb:cc:00:00:02", "origen": "ARP", "nombre": "b"},
+            {"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:02", "origen": "ARP"},
+        ])
+
+        self.assertEqual(sorted(motor.ips()), ["10.0.0.5", "10.0.0.6"])
+        por_ip = {r["ip"]: r for r in motor.resultados()}
+        self.assertEqual(por_ip["10.0.0.5"]["mac"], "aa:bb:cc:00:00:01")
+        self.assertEqual(por_ip["10.0.0.5"]["nombre"], "a")
+
+    def test_una_mac_nueva_en_una_ip_con_otra_mac_es_otro_registro(self):
+        motor = MotorFusion()
+        motor.agregar_dicts([
+            {"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:01", "origen": "ARP", "nombre": "viejo", "puertos": [22]},
+            {"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:02", "origen": "ARP", "nombre": "nuevo-equipo"},
+            {"ip": "10.0.0.5", "origen": "UPnP", "puertos": [80]},
+        ])
+
+        self.assertEqual(len(motor), 2)
+        viejo, nuevo = motor.resultados()
+        self.assertEqual((viejo["mac"], viejo["nombre"], viejo["puertos"]), ("aa:bb:cc:00:00:01", "viejo", [22]))
+        self.assertEqual((nuevo["mac"], nuevo["nombre"], nuevo["puertos"]), ("aa:bb:cc:00:00:02", "nuevo-equipo", [80]))
+
+        motor.agregar(Observacion("10.0.0.9", mac="AA:BB:CC:00:00:02", origenes=1))
+        self.assertEqual(len(motor), 2)
+
+    def test_sin_por_mac_la_identidad_es_la_ip(self):
+        motor = MotorFusion(por_mac=False)
+        motor.agregar_dicts([
+            {"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:01", "origen": "ARP"},
+            {"ip": "10.0.0.9", "mac": "aa:bb:cc:00:00:01", "origen": "ARP"},
+        ])
+        self.assertEqual(sorted(motor.ips()), ["10.0.0.5", "10.0.0.9"])
+
+    def test_agregar_y_agregar_dicts_dan_lo_mismo(self):
+        entradas = [
+            {"ip": "10.0.0.5", "origen": "ICMP"},
+            {"ip": "10.0.0.9", "mac": "AA:BB:CC:00:00:01", "origen": "ARP"},
+            {"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:01", "origen": "ARP", "tipo": "router"},
+        ]
+        rapido, lento = MotorFusion(), MotorFusion()
+        rapido.agregar_dicts(entradas)
+        for d in entradas:
+            lento.agregar(Observacion.desde_dict(d))
+        self.assertEqual(rapido.resultados(), lento.resultados())
+
+    def test_to_dict_y_clave_mac(self):
+        d = Observacion("10.0.0.5").to_dict()
+        self.assertEqual((d["nombre"], d["tipo"], d["puertos"], d["origenes"]), ("Desconocido", "Desconocido", [], []))
+        self.assertNotIn("fabricante", d)
+        self.assertEqual(clave_mac(" AA-BB-CC-00-00-01 "), "aa:bb:cc:00:00:01")
+        self.assertEqual(clave_mac("aa:bb:cc:00:00:01"), "aa:bb:cc:00:00:01")
+        self.assertIsNone(clave_mac(""))
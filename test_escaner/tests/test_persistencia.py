@@ -0,0 +1,262 @@
+import sqlite3
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import event
+
+from app import db, routes
+from app.events import bus
+from app.models import Dispositivo, DispositivoEscaneo, Escaneo, EstadoDispositivoLog
+from app.routes import _persistir_lote, _planificar_incremental
+from app.scan_jobs import EscaneoCancelado, TrabajoEscaneo
+
+from . import PruebaConApp
+
+
+def _persistir(lote, alcance=None):
+    resultado = _persistir_lote(lote, alcance or {}, datetime.utcnow())
+    db.session.commit()
+    return resultado
+
+
+def _por_ip():
+    return {d.ip: d for d in Dispositivo.query.all()}
+
+
+class ReubicacionPorMac(PruebaConApp):
+    def setUp(self):
+        super().setUp()
+        _persistir([{"ip": "10.0.0.1", "mac": "aa:bb:cc:00:00:01", "nombre": "camara-lobby"}])
+        camara = Dispositivo.query.filter_by(ip="10.0.0.1").one()
+        camara.estado = "bloqueado"
+        db.session.commit()
+        self.id_camara = camara.id
+
+    def test_misma_mac_en_otra_ip_mueve_el_dispositivo(self):
+        guardados, nuevos, _ = _persistir([{"ip": "10.0.0.5", "mac": "AA:BB:CC:00:00:01"}])
+
+        self.assertEqual((guardados, nuevos), (1, 0))
+        dispositivos = _por_ip()
+        self.assertEqual(set(dispositivos), {"10.0.0.5"})
+        movido = dispositivos["10.0.0.5"]
+        self.assertEqual(movido.id, self.id_camara)
+        self.assertEqual(movido.nombre, "camara-lobby")
+        self.assertEqual(movido.estado, "bloqueado")
+
+    def test_intercambio_de_ips(self):
+        _persistir([{"ip": "10.0.0.2", "mac": "aa:bb:cc:00:00:02"}])
+        _persistir([
+            {"ip": "10.0.0.2", "mac": "aa:bb:cc:00:00:01"},
+            {"ip": "10.0.0.1", "mac": "aa:bb:cc:00:00:02"},
+        ])
+
+        dispositivos = _por_ip()
+        self.assertEqual(len(dispositivos), 2)
+        self.assertEqual(dispositivos["10.0.0.2"].id, self.id_camara)
+        self.assertEqual(dispositivos["10.0.0.1"].mac, "aa:bb:cc:00:00:02")
+
+    def test_dispositivo_nuevo_en_la_ip_que_queda_libre(self):
+        suscripcion = bus.suscribir()
+        self.addCleanup(bus.cancelar, suscripcion)
+
+        _, nuevos, _ = _persistir([
+            {"ip": "10.0.0.5", "mac": "aa:bb:cc:00:00:01"},
+            {"ip": "10.0.0.1", "mac": "aa:bb:cc:00:00:99"},
+        ])
+
+        self.assertEqual(nuevos, 1)
+        dispositivos = _por_ip()
+        self.assertEqual(dispositivos["10.0.0.5"].id, self.id_camara)
+        self.assertEqual(dispositivos["10.0.0.5"].estado, "bloqueado")
+
+        recien_llegado = dispositivos["10.0.0.1"]
+        self.assertNotEqual(recien_llegado.id, self.id_camara)
+        self.assertEqual(recien_llegado.mac, "aa:bb:cc:00:00:99")
+        self.assertEqual(recien_llegado.nombre, "Desconocido")
+        self.assertNotEqual(recien_llegado.estado, "bloqueado")
+
+        logs = EstadoDispositivoLog.query.filter_by(dispositivo_id=recien_llegado.id).all()
+        self.assertIn("nuevo", [l.estado_nuevo for l in logs])
+
+        eventos = []
+        while not suscripcion.cola.empty():
+            eventos.append(suscripcion.cola.get_nowait())
+        nuevos_eventos = [datos for _id, tipo, datos, _ts in eventos if tipo == "dispositivos_nuevos"]
+        self.assertEqual([d["ip"] for e in nuevos_eventos for d in e["dispositivos"]], ["10.0.0.1"])
+
+
+class PersistenciaPorLotes(PruebaConApp):
+    def test_inserta_dispositivos_nuevos(self):
+        guardados, nuevos, vulnerables = _persistir(
+            [{"ip": "10.0.0.1", "mac": "aa:bb:cc:00:00:01", "nombre": "nas", "riesgo": "Alto"},
+             {"ip": "10.0.0.2"}],
+            {"10.0.0.1": {"online": True, "rtt_ms": 1.0, "loss": 0.0}},
+        )
+
+        self.assertEqual((guardados, nuevos, vulnerables), (2, 2, 1))
+        dispositivos = _por_ip()
+        self.assertEqual(dispositivos["10.0.0.1"].nombre, "nas")
+        self.assertEqual(dispositivos["10.0.0.1"].estado, "sospechoso")
+        self.assertEqual(dispositivos["10.0.0.2"].nombre, "Desconocido")
+        self.assertEqual(DispositivoEscaneo.query.count(), 2)
+
+    def test_actualiza_conservando_lo_que_no_llega(self):
+        _persistir([{"ip": "10.0.0.1", "mac": "aa:bb:cc:00:00:01", "nombre": "nas", "tipo": "NAS"}])
+        guardados, nuevos, _ = _persistir([{"ip": "10.0.0.1", "nombre": "Desconocido"}])
+
+        self.assertEqual((guardados, nuevos), (1, 0))
+        d = Dispositivo.query.one()
+        self.assertEqual((d.mac, d.nombre, d.tipo), ("aa:bb:cc:00:00:01", "nas", "NAS"))
+
+    def test_cambio_de_estado_queda_registrado(self):
+        _persistir([{"ip": "10.0.0.1"}], {"10.0.0.1": {"online": True, "rtt_ms": 1.0, "loss": 0.0}})
+        d = Dispositivo.query.one()
+        self.assertEqual(d.estado, "seguro")
+
+        _persistir([{"ip": "10.0.0.1"}], {"10.0.0.1": {"online": False}})
+
+        db.session.refresh(d)
+        self.assertEqual(d.estado, "desconocido")
+        ultimo = EstadoDispositivoLog.query.order_by(EstadoDispositivoLog.id.desc()).first()
+        self.assertEqual((ultimo.estado_anterior, ultimo.estado_nuevo), ("seguro", "desconocido"))
+
+    def test_bloqueado_no_cambia_por_alcance(self):
+        _persistir([{"ip": "10.0.0.1"}])
+        d = Dispositivo.query.one()
+        d.estado = "bloqueado"
+        db.session.commit()
+
+        _persistir([{"ip": "10.0.0.1", "riesgo": "Alto"}], {"10.0.0.1": {"online": True, "rtt_ms": 1.0}})
+
+        db.session.refresh(d)
+        self.assertEqual(d.estado, "bloqueado")
+
+
+class EscaneoPorTrozos(PruebaConApp):
+    config = {"SCAN_LOTE_PERSISTENCIA": "2"}
+    resultados = [{"ip": f"10.0.1.{i}", "mac": f"aa:bb:cc:00:01:{i:02x}"} for i in range(1, 6)]
+
+    def setUp(self):
+        super().setUp()
+        for nombre, valor in (
+            ("resolver_segmentos", lambda *a, **k: []),
+            ("escanear_red", lambda **k: list(self.resultados)),
+            ("sondear_alcance", lambda ips, **k: {}),
+        ):
+            parche = mock.patch.object(routes, nombre, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def _interrumpir_tras_primer_trozo(self, accion):
+        original = routes._persistir_lote
+        llamadas = []
+
+        def persistir(*args):
+            llamadas.append(1)
+            if len(llamadas) == 2:
+                accion()
+            return original(*args)
+
+        parche = mock.patch.object(routes, "_persistir_lote", persistir)
+        parche.start()
+        self.addCleanup(parche.stop)
+        return llamadas
+
+    def test_todos_los_trozos_se_guardan(self):
+        resultado = routes.ejecutar_scan(TrabajoEscaneo())
+
+        self.assertEqual(resultado["scan"]["total_dispositivos"], 5)
+        self.assertEqual(Dispositivo.query.count(), 5)
+        self.assertEqual(Escaneo.query.one().estado, "completado")
+
+    def test_dos_macs_en_la_misma_ip_guardan_un_solo_dispositivo(self):
+        self.resultados = [
+            {"ip": "10.0.1.1", "mac": "aa:bb:cc:00:01:01", "nombre": "viejo"},
+            {"ip": "10.0.1.1", "mac": "aa:bb:cc:00:01:99", "nombre": "nuevo"},
+        ]
+
+        resultado = routes.ejecutar_scan(TrabajoEscaneo())
+
+        self.assertEqual(resultado["scan"]["total_dispositivos"], 1)
+        d = Dispositivo.query.one()
+        self.assertEqual((d.ip, d.mac, d.nombre), ("10.0.1.1", "aa:bb:cc:00:01:99", "nuevo"))
+
+    def test_cancelacion_entre_trozos_registra_el_escaneo_parcial(self):
+        trabajo = TrabajoEscaneo()
+        llamadas = []
+        original = routes._persistir_lote
+
+        def persistir(*args):
+            llamadas.append(1)
+            resultado = original(*args)
+            trabajo.cancelar()
+            return resultado
+
+        with mock.patch.object(routes, "_persistir_lote", persistir):
+            with self.assertRaises(EscaneoCancelado):
+                routes.ejecutar_scan(trabajo)
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(Dispositivo.query.count(), 2)
+        esc = Escaneo.query.one()
+        self.assertEqual((esc.estado, esc.total_dispositivos), ("cancelado", 2))
+
+    def test_error_a_mitad_registra_el_escaneo_parcial(self):
+        def fallar():
+            raise RuntimeError("disco lleno")
+
+        self._interrumpir_tras_primer_trozo(fallar)
+        with self.assertRaises(RuntimeError):
+            routes.ejecutar_scan(TrabajoEscaneo())
+
+        self.assertEqual(Dispositivo.query.count(), 2)
+        esc = Escaneo.query.one()
+        self.assertEqual((esc.estado, esc.total_dispositivos), ("error", 2))
+
+    def test_cancelacion_durante_el_descubrimiento_queda_registrada(self):
+        trabajo = TrabajoEscaneo()
+
+        def escanear(**kwargs):
+            trabajo.cancelar()
+            return list(self.resultados)
+
+        with mock.patch.object(routes, "escanear_red", escanear):
+            with self.assertRaises(EscaneoCancelado):
+                routes.ejecutar_scan(trabajo)
+
+        self.assertEqual(Dispositivo.query.count(), 0)
+        esc = Escaneo.query.one()
+        self.assertEqual((esc.estado, esc.total_dispositivos), ("cancelado", 0))
+
+    def test_fallo_en_la_presencia_incremental_queda_registrado(self):
+        def barrer(*args, **kwargs):
+            raise OSError("sin permisos para sockets raw")
+
+        with mock.patch.object(routes, "resolver_segmentos", lambda *a, **k: ["10.0.1.0/24"]), \
+                mock.patch.object(routes, "barrer_arp", barrer):
+            with self.assertRaises(OSError):
+                routes.ejecutar_scan(TrabajoEscaneo(), modo="incremental")
+
+        esc = Escaneo.query.one()
+        self.assertEqual((esc.estado, esc.tipo, esc.total_dispositivos), ("error", "incremental", 0))
+
+
+class PlanIncremental(PruebaConApp):
+    def setUp(self):
+        super().setUp()
+        # Como una SQLite compilada con el límite clásico de 999 parámetros por consulta.
+        event.listen(db.engine, "connect",
+                     lambda conexion, _registro: conexion.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999))
+        db.session.remove()
+        db.engine.dispose()
+
+    def test_una_presencia_enorme_se_consulta_por_trozos(self):
+        conocidos = [{"ip": f"10.0.{i}.1", "mac": f"aa:bb:cc:00:{i:02x}:01"} for i in range(0, 250, 50)]
+        _persistir(conocidos)
+        presencia = {f"10.0.{i >> 8}.{i & 255}": None for i in range(1, 5000)}
+        presencia.update({d["ip"]: d["mac"] for d in conocidos})
+
+        profundos, superficiales = _planificar_incremental(presencia, datetime.utcnow(), ttl_horas=24)
+
+        self.assertEqual(sorted(s["ip"] for s in superficiales), sorted(d["ip"] for d in conocidos))
+        self.assertEqual(len(profundos), len(presencia) - len(conocidos))
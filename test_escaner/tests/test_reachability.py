@@ -0,0 +1,36 @@
+import unittest
+from unittest import mock
+
+from app import reachability
+from app.host_context import ContextoEscaneo
+
+
+def _contexto_con_rtt(ip, rtt):
+    contexto = ContextoEscaneo()
+    contexto.registrar("rtt_ms", {ip: rtt})
+    return contexto
+
+
+class PerdidaSobreEnviados(unittest.TestCase):
+    def test_sin_socket_icmp_el_eco_del_barrido_no_cuenta_como_perdida(self):
+        with mock.patch.object(reachability, "_abrir_socket_icmp", return_value=(None, False)):
+            resultado = reachability.sondear_alcance(["10.0.0.1"], intentos=3,
+                                                     contexto=_contexto_con_rtt("10.0.0.1", 2.0))
+
+        self.assertTrue(resultado["10.0.0.1"]["online"])
+        self.assertEqual(resultado["10.0.0.1"]["loss"], 0.0)
+
+    def test_el_eco_del_barrido_cuenta_como_primer_intento(self):
+        with mock.patch.object(reachability, "ping_lote", return_value=({"10.0.0.1": []}, True)) as ping:
+            resultado = reachability.sondear_alcance(["10.0.0.1"], intentos=2,
+                                                     contexto=_contexto_con_rtt("10.0.0.1", 2.0))
+
+        self.assertEqual(ping.call_args.kwargs["intentos_por_ip"], {"10.0.0.1": 1})
+        self.assertEqual(resultado["10.0.0.1"]["loss"], 50.0)
+
+    def test_sin_contexto_se_usan_todos_los_intentos(self):
+        with mock.patch.object(reachability, "ping_lote", return_value=({"10.0.0.1": [1.0, 3.0]}, True)):
+            resultado = reachability.sondear_alcance(["10.0.0.1"], intentos=2)
+
+        self.assertEqual(resultado["10.0.0.1"]["loss"], 0.0)
+        self.assertEqual(resultado["10.0.0.1"]["rtt_ms"], 2.0)
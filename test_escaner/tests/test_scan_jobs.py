@@ -0,0 +1,64 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import BloqueoEscaneo
+from app.scan_jobs import iniciar_trabajo
+
+from . import PruebaConApp
+
+
+def _esperar(trabajo, limite=5.0):
+    fin = time.monotonic() + limite
+    while not trabajo.terminado and time.monotonic() < fin:
+        time.sleep(0.01)
+
+
+class BloqueoEntreProcesos(PruebaConApp):
+    def _bloqueo_ajeno(self, expira):
+        db.session.add(BloqueoEscaneo(id=1, propietario="otro-proceso", expira=expira))
+        db.session.commit()
+
+    def _iniciar(self, funcion=lambda trabajo, **kwargs: None):
+        return iniciar_trabajo(self.app, funcion, tipo="completo")
+
+    def test_un_bloqueo_vigente_de_otro_proceso_impide_empezar(self):
+        self._bloqueo_ajeno(datetime.utcnow() + timedelta(minutes=10))
+
+        trabajo, creado = self._iniciar()
+        self.assertIsNone(trabajo)
+        self.assertFalse(creado)
+
+        respuesta = self.cliente.post("/ejecutar-scan", json={"modo": "completo"})
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertTrue(respuesta.get_json()["en_curso"])
+
+    def test_un_bloqueo_caducado_se_reutiliza_y_se_libera_al_terminar(self):
+        self._bloqueo_ajeno(datetime.utcnow() - timedelta(minutes=1))
+        dentro = {}
+        seguir = threading.Event()
+
+        def funcion(trabajo, **kwargs):
+            with self.app.app_context():
+                dentro["propietario"] = db.session.get(BloqueoEscaneo, 1).propietario
+            seguir.wait(5)
+
+        trabajo, creado = self._iniciar(funcion)
+        self.assertTrue(creado)
+        self.assertEqual(self._iniciar(), (trabajo, False))
+        seguir.set()
+        _esperar(trabajo)
+
+        self.assertEqual(trabajo.estado, "completado")
+        self.assertEqual(dentro["propietario"], trabajo.id)
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(BloqueoEscaneo, 1).propietario)
+
+    def test_el_trabajo_crea_la_fila_si_no_existe(self):
+        trabajo, creado = self._iniciar()
+        self.assertTrue(creado)
+        _esperar(trabajo)
+
+        self.assertEqual(trabajo.estado, "completado")
+        self.assertIsNone(db.session.get(BloqueoEscaneo, 1).propietario)
@@ -0,0 +1,102 @@
+from datetime import datetime
+
+from app import db
+from app.models import ContadorVersion, Dispositivo, DispositivoEscaneo, EstadoDispositivoLog
+from app.routes import _persistir_lote
+from app.sync import sembrar_contador_versiones, version_actual
+
+from . import PruebaConApp
+
+
+class SincronizacionDelta(PruebaConApp):
+    def _dashboard(self, **params):
+        respuesta = self.cliente.get("/api/dashboard-data", query_string=params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.get_json()
+
+    def _persistir(self, lote):
+        _persistir_lote(lote, {}, datetime.utcnow())
+        db.session.commit()
+
+    def test_el_contador_se_crea_al_arrancar(self):
+        self.assertEqual(db.session.get(ContadorVersion, 1).valor, 0)
+        self.assertEqual(version_actual(), 0)
+
+    def test_recrear_las_tablas_y_sembrar_deja_el_contador_listo(self):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        sembrar_contador_versiones()
+        sembrar_contador_versiones()
+
+        self._persistir([{"ip": "10.0.0.1"}])
+        self.assertEqual(version_actual(), 1)
+
+    def test_delta_solo_trae_lo_cambiado(self):
+        self._persistir([{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}])
+        cursor = self._dashboard()["cursor"]
+
+        d = Dispositivo.query.filter_by(ip="10.0.0.2").one()
+        d.nombre = "impresora"
+        db.session.commit()
+
+        datos = self._dashboard(since=cursor)
+        self.assertTrue(datos["delta"])
+        self.assertEqual([x["ip"] for x in datos["dispositivos"]], ["10.0.0.2"])
+        self.assertEqual(datos["eliminados"], [])
+        self.assertGreater(int(datos["cursor"]), int(cursor))
+
+    def test_borrar_un_dispositivo_llega_como_eliminado(self):
+        self._persistir([{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}])
+        d = Dispositivo.query.filter_by(ip="10.0.0.1").one()
+        ident = d.id
+        cursor = self._dashboard()["cursor"]
+
+        respuesta = self.cliente.post(f"/dispositivo/{ident}/eliminar")
+
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertIsNone(db.session.get(Dispositivo, ident))
+        self.assertEqual(EstadoDispositivoLog.query.filter_by(dispositivo_id=ident).count(), 0)
+        self.assertEqual(DispositivoEscaneo.query.filter_by(dispositivo_id=ident).count(), 0)
+
+        datos = self._dashboard(since=cursor)
+        self.assertTrue(datos["delta"])
+        self.assertEqual(datos["eliminados"], [ident])
+        self.assertEqual(datos["dispositivos"], [])
+
+    def test_delta_respeta_los_filtros_de_la_vista(self):
+        self._persistir([{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}, {"ip": "10.0.0.3"}])
+        por_ip = {d.ip: d for d in Dispositivo.query.all()}
+        por_ip["10.0.0.1"].estado = "bloqueado"
+        db.session.commit()
+        inicial = self._dashboard(estado="bloqueado")
+        self.assertEqual([x["ip"] for x in inicial["dispositivos"]], ["10.0.0.1"])
+
+        por_ip["10.0.0.1"].estado = "seguro"
+        por_ip["10.0.0.2"].estado = "bloqueado"
+        por_ip["10.0.0.3"].nombre = "otro"
+        db.session.commit()
+
+        datos = self._dashboard(estado="bloqueado", since=inicial["cursor"])
+        self.assertTrue(datos["delta"])
+        self.assertEqual([x["ip"] for x in datos["dispositivos"]], ["10.0.0.2"])
+        self.assertEqual(sorted(datos["eliminados"]), sorted([por_ip["10.0.0.1"].id, por_ip["10.0.0.3"].id]))
+        self.assertEqual(datos["limite"], 50)
+
+    def test_delta_con_filtro_invalido_responde_400(self):
+        self._persistir([{"ip": "10.0.0.1"}])
+        cursor = self._dashboard()["cursor"]
+        respuesta = self.cliente.get("/api/dashboard-data", query_string={"since": cursor, "visto_desde": "ayer"})
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_sin_cambios_responde_304(self):
+        self._persistir([{"ip": "10.0.0.1"}])
+        primera = self.cliente.get("/api/dashboard-data")
+        etag = primera.headers["ETag"]
+
+        segunda = self.cliente.get("/api/dashboard-data", headers={"If-None-Match": etag})
+        self.assertEqual(segunda.status_code, 304)
+
+        self._persistir([{"ip": "10.0.0.2"}])
+        tercera = self.cliente.get("/api/dashboard-data", headers={"If-None-Match": etag})
+        self.assertEqual(tercera.status_code, 200)